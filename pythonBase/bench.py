@@ -0,0 +1,459 @@
+"""
+Benchmark headless del gioco (nessuna finestra: SDL_VIDEODRIVER=dummy).
+
+Modalità:
+- render: vecchio draw_grid (un Rect e due draw per tile) contro la mappa
+  pre-renderizzata a chunk, a schermo intero e con i soli dirty rect
+- path: inseguimento con il vecchio passo greedy, con una BFS per nemico e con
+  il campo di flusso condiviso (tempo per decisione e nemici che arrivano al player)
+- contact: danno da contatto con hypot su tutti i nemici contro la griglia di
+  occupazione (solo le 9 celle attorno al player), da 4 a 10.000 nemici
+- entities: movimento e animazione oggetto per oggetto (vecchio AnimatedActor)
+  contro le colonne di entities.py, con numpy e con il ciclo Python
+
+Esempio (dalla cartella pythonBase/):
+    python bench.py --mode render --size 200 --frames 300
+    python bench.py --mode path --path-size 256 --enemies 1000
+    python bench.py --mode contact --counts 4,100,1000,10000
+    python bench.py --mode entities --entity-counts 10,1000,100000
+    python bench.py --output risultati.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import deque
+from math import hypot
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame  # noqa: E402
+from pgzero.screen import Screen  # noqa: E402
+
+from entities import EntityStore  # noqa: E402
+from entities import np as numpy_module  # noqa: E402
+from occupancy import OccupancyGrid  # noqa: E402
+from pathfinding import FlowField  # noqa: E402
+from tilemap import BORDER_COLOR, FLOOR_COLOR, WALL_COLOR, DirtyRects, TileMap  # noqa: E402
+
+TILE = 64
+VIEW = (640, 512)  # stessa finestra di main.py
+
+
+def make_level(cols, rows, seed=0, walls=0.2):
+    """Mappa casuale (riproducibile) con il bordo di muri, nello stesso formato di LEVEL."""
+    rng = random.Random(seed)
+    level = []
+    for gy in range(rows):
+        if gy in (0, rows - 1):
+            level.append("#" * cols)
+            continue
+        inner = "".join("#" if rng.random() < walls else "." for _ in range(cols - 2))
+        level.append("#" + inner + "#")
+    return level
+
+
+def summarize(frames, wall, cpu, calls):
+    return {
+        "frames": frames,
+        "fps": round(frames / wall, 1) if wall else None,
+        "cpu_ms_per_frame": round(cpu / frames * 1000, 3) if frames else None,
+        "blits_or_draws_per_frame": round(calls / frames, 1) if frames else None,
+    }
+
+
+# --- render ---
+
+def _old_draw_grid(screen, level, camera, cull):
+    """Il draw_grid originale; con cull=True solo le tile visibili."""
+    rows, cols = len(level), len(level[0])
+    cam_x, cam_y = camera
+    gx0, gy0, gx1, gy1 = 0, 0, cols, rows
+    if cull:
+        gx0, gy0 = cam_x // TILE, cam_y // TILE
+        gx1 = min(cols, (cam_x + VIEW[0]) // TILE + 1)
+        gy1 = min(rows, (cam_y + VIEW[1]) // TILE + 1)
+    calls = 0
+    for gy in range(gy0, gy1):
+        for gx in range(gx0, gx1):
+            r = pygame.Rect(gx * TILE - cam_x, gy * TILE - cam_y, TILE, TILE)
+            if level[gy][gx] == "#":
+                screen.draw.filled_rect(r, WALL_COLOR)
+            else:
+                screen.draw.filled_rect(r, FLOOR_COLOR)
+            screen.draw.rect(r, BORDER_COLOR)
+            calls += 2
+    return calls
+
+
+def _actors(n, rng):
+    return [[rng.uniform(0, VIEW[0]), rng.uniform(0, VIEW[1]), rng.uniform(-3, 3), rng.uniform(-3, 3)]
+            for _ in range(n)]
+
+
+def _move_and_draw(screen, actors, dirty):
+    for a in actors:
+        a[0] = (a[0] + a[2]) % VIEW[0]
+        a[1] = (a[1] + a[3]) % VIEW[1]
+        screen.draw.filled_circle((a[0], a[1]), 20, "white")
+        screen.draw.circle((a[0], a[1]), 20, "black")
+        if dirty is not None:
+            r = pygame.Rect(0, 0, TILE, TILE)
+            r.center = (int(a[0]), int(a[1]))
+            dirty.add(r)
+
+
+def run_render(size, frames, n_actors, seed):
+    level = make_level(size, size, seed)
+    surface = pygame.display.set_mode(VIEW)
+    screen = Screen(surface)
+    # vista al centro della mappa
+    camera = ((size * TILE - VIEW[0]) // 2, (size * TILE - VIEW[1]) // 2)
+    rng = random.Random(seed)
+
+    def old(cull):
+        def frame(actors):
+            screen.clear()
+            calls = _old_draw_grid(screen, level, camera, cull)
+            _move_and_draw(screen, actors, None)
+            return calls
+        return frame
+
+    tilemap = TileMap(level, TILE)
+    dirty = DirtyRects()
+
+    def baked(full):
+        def frame(actors):
+            if full:
+                dirty.invalidate()
+            calls = dirty.restore(tilemap, surface, camera)
+            _move_and_draw(screen, actors, dirty)
+            return calls
+        return frame
+
+    renderers = {
+        "per_tile_all": old(False),  # main.py prima: tutte le tile, anche fuori schermo
+        "per_tile_visible": old(True),
+        "baked_full": baked(True),
+        "baked_dirty": baked(False),
+    }
+    results = {}
+    for name, frame in renderers.items():
+        actors = _actors(n_actors, rng)
+        frame(actors)  # warm-up (e cottura dei chunk visibili)
+        calls = 0
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        for _ in range(frames):
+            calls += frame(actors)
+            pygame.display.flip()
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        results[name] = summarize(frames, wall, cpu, calls)
+        print(f"{name:18} {results[name]}", flush=True)
+    return results
+
+
+# --- path ---
+
+def _greedy_step(gx, gy, px, py, rng):
+    """Il vecchio Enemy.update: un passo su un solo asse verso il player."""
+    dx = 1 if px > gx else -1 if px < gx else 0
+    dy = 1 if py > gy else -1 if py < gy else 0
+    if dx != 0 and dy != 0:
+        if rng.randint(0, 1) == 0:
+            dy = 0
+        else:
+            dx = 0
+    return dx, dy
+
+
+def _bfs_step(level, gx, gy, px, py):
+    """Pathfinding per nemico: BFS dal nemico fino al player, primo passo del percorso."""
+    rows, cols = len(level), len(level[0])
+    first = {(gx, gy): None}
+    queue = deque([(gx, gy)])
+    while queue:
+        x, y = queue.popleft()
+        if (x, y) == (px, py):
+            break
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < cols and 0 <= ny < rows and level[ny][nx] != "#" and (nx, ny) not in first:
+                first[(nx, ny)] = first[(x, y)] or (dx, dy)
+                queue.append((nx, ny))
+    return first.get((px, py))
+
+
+def _walk(level, start, steps, rng):
+    """Percorso casuale del player (solo celle libere), per ricalcolare il campo più volte."""
+    x, y = start
+    path = []
+    while len(path) < steps:
+        dx, dy = rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+        if level[y + dy][x + dx] != "#":
+            x, y = x + dx, y + dy
+            path.append((x, y))
+    return path
+
+
+def _chase(level, enemies, player, rounds, step_for):
+    """Muove tutti i nemici `rounds` volte verso il player fermo; ritorna quanti lo raggiungono."""
+    enemies = [list(e) for e in enemies]
+    px, py = player
+    for _ in range(rounds):
+        for e in enemies:
+            step = step_for(e[0], e[1])
+            if step and level[e[1] + step[1]][e[0] + step[0]] != "#":
+                e[0] += step[0]
+                e[1] += step[1]
+    return sum(1 for x, y in enemies if abs(x - px) + abs(y - py) <= 1)
+
+
+def run_path(size, n_enemies, seed, max_dist, recomputes=20, naive_sample=10):
+    rng = random.Random(seed)
+    level = make_level(size, size, seed)
+    free = [(gx, gy) for gy in range(size) for gx in range(size) if level[gy][gx] != "#"]
+    player = free[len(free) // 2]
+    enemies = rng.sample(free, n_enemies)
+    walk = _walk(level, player, recomputes, rng)
+    results = {}
+
+    for name, limit in (("field_full", None), (f"field_max_{max_dist}", max_dist)):
+        start = time.perf_counter()
+        flow = FlowField(level, max_dist=limit)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        for cell in walk:
+            flow.update(*cell)
+        per_update = (time.perf_counter() - start) / len(walk)
+        flow.update(*player)
+        start = time.perf_counter()
+        steps = [flow.next_step(gx, gy) for gx, gy in enemies]
+        lookup = time.perf_counter() - start
+        results[name] = {
+            "build_ms": round(build * 1000, 2),
+            "update_ms": round(per_update * 1000, 2),
+            "next_step_all_enemies_ms": round(lookup * 1000, 3),
+            "enemies_with_step": sum(1 for s in steps if s is not None),
+        }
+
+    # BFS per nemico: misurata su un campione e riportata a n_enemies
+    start = time.perf_counter()
+    for gx, gy in enemies[:naive_sample]:
+        _bfs_step(level, gx, gy, *player)
+    per_enemy = (time.perf_counter() - start) / naive_sample
+    results["bfs_per_enemy"] = {
+        "per_enemy_ms": round(per_enemy * 1000, 2),
+        "all_enemies_ms_estimated": round(per_enemy * n_enemies * 1000, 1),
+    }
+    start = time.perf_counter()
+    for gx, gy in enemies:
+        _greedy_step(gx, gy, *player, rng)
+    results["greedy"] = {"next_step_all_enemies_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    # qualità: nemici entro 1 cella dal player dopo 2*size passi (sempre in inseguimento)
+    rounds = 2 * size
+    flow = FlowField(level)
+    flow.update(*player)
+    results["greedy"]["reached"] = _chase(
+        level, enemies, player, rounds, lambda gx, gy: _greedy_step(gx, gy, *player, rng))
+    reachable = [e for e in enemies if flow.distance(*e) is not None]
+    results["field_full"]["reached"] = _chase(level, enemies, player, rounds, flow.next_step)
+    results["field_full"]["reachable"] = len(reachable)
+
+    for name, row in results.items():
+        print(f"{name:18} {row}", flush=True)
+    return results
+
+
+# --- contact ---
+
+class _Body:
+    """Quanto serve alla griglia e al danno da contatto di un AnimatedActor."""
+
+    solid = True
+
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def run_contact(size, counts, seed, frames=2000, contact=28):
+    rng = random.Random(seed)
+    level = make_level(size, size, seed)
+    free = [(gx, gy) for gy in range(size) for gx in range(size) if level[gy][gx] != "#"]
+    center = free[len(free) // 2]
+    player = _Body(center[0] * TILE + TILE // 2, center[1] * TILE + TILE // 2)
+    player.solid = False
+    results = {}
+    for n in counts:
+        cells = rng.sample(free, n)
+        grid = OccupancyGrid()
+        enemies = []
+        for gx, gy in cells:
+            e = _Body(gx * TILE + rng.randint(0, TILE - 1), gy * TILE + rng.randint(0, TILE - 1))
+            enemies.append(e)
+            grid.add(e, (gx, gy))
+        grid.add(player, center)
+        # un nemico a contatto, per verificare che i due metodi trovino gli stessi colpi
+        e = _Body(player.x + 20, player.y + 5)
+        enemies.append(e)
+        grid.add(e, center)
+
+        def old():
+            return sum(1 for e in enemies if hypot(e.x - player.x, e.y - player.y) < contact)
+
+        def new():
+            pcx, pcy = int(player.x // TILE), int(player.y // TILE)
+            return sum(1 for e in grid.near(pcx, pcy)
+                       if e is not player and hypot(e.x - player.x, e.y - player.y) < contact)
+
+        row = {}
+        for name, check in (("hypot_all", old), ("grid_near", new)):
+            hits = check()
+            start = time.perf_counter()
+            for _ in range(frames):
+                check()
+            row[f"{name}_us"] = round((time.perf_counter() - start) / frames * 1e6, 2)
+            row[f"{name}_hits"] = hits
+
+        # manutenzione della griglia: prenotazione + rilascio di un passo
+        moves = [(e, c, (c[0] + 1, c[1])) for e, c in zip(enemies, cells)][:1000]
+        start = time.perf_counter()
+        for e, a, b in moves:
+            if not grid.is_occupied(*b):
+                grid.add(e, b)
+                grid.remove(e, a)
+                grid.add(e, a)
+                grid.remove(e, b)
+        row["move_us"] = round((time.perf_counter() - start) / len(moves) * 1e6, 3)
+        results[n] = row
+        print(f"{n:>6} nemici  {row}", flush=True)
+    return results
+
+
+# --- entities ---
+
+class _OldActor:
+    """Movimento e animazione del vecchio AnimatedActor, un oggetto per attore."""
+
+    def __init__(self, x, y, tx, ty, speed, frames):
+        self.x, self.y, self.tx, self.ty, self.speed = x, y, tx, ty, speed
+        self.moving = True
+        self.frames = frames
+        self.frame_index = 0
+
+    def update_motion(self, dt):
+        if not self.moving:
+            return
+        vx, vy = self.tx - self.x, self.ty - self.y
+        dist = hypot(vx, vy)
+        step = self.speed * dt
+        if dist <= step:
+            self.x, self.y = self.tx, self.ty
+            self.moving = False
+        else:
+            self.x += (vx / dist) * step
+            self.y += (vy / dist) * step
+
+    def step_animation(self):
+        self.frame_index = (self.frame_index + 1) % self.frames
+
+
+def run_entities(counts, seed, budget=400000, dt=1 / 60):
+    """Tutti in movimento verso destinazioni lontane: nessuno arriva durante la misura."""
+    rng = random.Random(seed)
+    results = {}
+    for n in counts:
+        # stesso lavoro totale per ogni n (almeno 5 frame)
+        frames = max(5, budget // n)
+        spots = [(rng.uniform(0, 1000), rng.uniform(0, 1000), rng.uniform(-1, 1)) for _ in range(n)]
+
+        def old_world():
+            actors = [_OldActor(x, y, x + 1e6 * d, y + 1e6, 180, 4) for x, y, d in spots]
+
+            def motion():
+                for a in actors:
+                    a.update_motion(dt)
+
+            def animation():
+                for a in actors:
+                    a.step_animation()
+            return motion, animation
+
+        def store_world(use_numpy):
+            store = EntityStore(n, use_numpy=use_numpy)
+            for x, y, d in spots:
+                i = store.add(None, x, y, 180, 3, 4)
+                store.start_move(i, x + 1e6 * d, y + 1e6)
+            return (lambda: store.step_motion(dt)), store.step_animation
+
+        worlds = {"objects": old_world, "store_python": lambda: store_world(False)}
+        if numpy_module is not None:
+            worlds["store_numpy"] = lambda: store_world(True)
+        row = {"frames": frames}
+        for name, build in worlds.items():
+            motion, animation = build()
+            start = time.perf_counter()
+            for _ in range(frames):
+                motion()
+            row[f"{name}_motion_ms"] = round((time.perf_counter() - start) / frames * 1000, 4)
+            start = time.perf_counter()
+            for _ in range(frames):
+                animation()
+            row[f"{name}_anim_ms"] = round((time.perf_counter() - start) / frames * 1000, 4)
+        results[n] = row
+        print(f"{n:>7} attori  {row}", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["all", "render", "path", "contact", "entities"], default="all")
+    parser.add_argument("--size", type=int, default=200, help="lato della mappa in tile")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--actors", type=int, default=5)
+    parser.add_argument("--path-size", type=int, default=256)
+    parser.add_argument("--enemies", type=int, default=1000)
+    parser.add_argument("--max-dist", type=int, default=48, help="raggio del campo limitato")
+    parser.add_argument("--counts", default="4,40,400,4000,10000", help="numeri di nemici per contact")
+    parser.add_argument("--entity-counts", default="10,100,1000,10000,100000")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="salva i risultati in JSON")
+    args = parser.parse_args()
+
+    pygame.display.init()
+    results = {
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "numpy": numpy_module.__version__ if numpy_module is not None else None,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": vars(args),
+    }
+    if args.mode in ("all", "render"):
+        print(f"render: mappa {args.size}x{args.size}, vista {VIEW[0]}x{VIEW[1]}, {args.actors} attori")
+        results["render"] = run_render(args.size, args.frames, args.actors, args.seed)
+    if args.mode in ("all", "path"):
+        print(f"path: mappa {args.path_size}x{args.path_size}, {args.enemies} nemici")
+        results["path"] = run_path(args.path_size, args.enemies, args.seed, args.max_dist)
+    if args.mode in ("all", "contact"):
+        counts = [int(n) for n in args.counts.split(",")]
+        print(f"contact: mappa {args.path_size}x{args.path_size}, player al centro")
+        results["contact"] = run_contact(args.path_size, counts, args.seed)
+    if args.mode in ("all", "entities"):
+        counts = [int(n) for n in args.entity_counts.split(",")]
+        print(f"entities: ms per frame di movimento e per tick di animazione (numpy: {numpy_module is not None})")
+        results["entities"] = run_entities(counts, args.seed)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
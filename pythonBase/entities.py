@@ -0,0 +1,141 @@
+# entities.py — attori come colonne (struct-of-arrays) invece che come oggetti
+# -------------------------------------------------------------------------------------
+# Posizioni, destinazioni, velocità, flag di movimento e frame di animazione di
+# tutti gli attori stanno in array paralleli: interpolazione e avanzamento dei
+# frame sono un solo passo vettorizzato per tutti. AnimatedActor in main.py
+# resta come facciata sottile (legge e scrive la sua riga con entity_field).
+
+from math import hypot
+
+try:
+    import numpy as np
+except ImportError:  # numpy è opzionale: senza, gli stessi passi con un ciclo Python
+    np = None
+
+FLOAT_FIELDS = ("x", "y", "tx", "ty", "speed")
+INT_FIELDS = ("frame", "n_idle", "n_walk")
+
+
+class EntityStore:
+    """Colonne per attore; l'indice di riga (eid) resta valido fino a clear()."""
+
+    def __init__(self, capacity=16, use_numpy=True):
+        self.numpy = use_numpy and np is not None
+        self.n = 0
+        self.owners = []  # eid -> facciata, per restituire chi è arrivato
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        for name in FLOAT_FIELDS + INT_FIELDS + ("moving",):
+            old = getattr(self, name, None)
+            if self.numpy:
+                dtype = np.float64 if name in FLOAT_FIELDS else np.bool_ if name == "moving" else np.int32
+                column = np.zeros(capacity, dtype=dtype)
+                if old is not None:
+                    column[: self.n] = old[: self.n]
+            else:
+                fill = False if name == "moving" else 0
+                column = (old or [])[: self.n] + [fill] * (capacity - self.n)
+            setattr(self, name, column)
+
+    def add(self, owner, x, y, speed, n_idle, n_walk):
+        if self.n == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.n
+        self.x[i] = self.tx[i] = x
+        self.y[i] = self.ty[i] = y
+        self.speed[i] = speed
+        self.moving[i] = False
+        self.frame[i] = 0
+        self.n_idle[i] = max(n_idle, 1)
+        self.n_walk[i] = max(n_walk, 1)
+        self.owners.append(owner)
+        self.n += 1
+        return i
+
+    def clear(self):
+        self.n = 0
+        self.owners = []
+
+    def start_move(self, i, tx, ty):
+        if not self.moving[i]:
+            self.frame[i] = 0  # idle -> walk riparte dal primo frame
+        self.tx[i], self.ty[i] = tx, ty
+        self.moving[i] = True
+
+    def step_motion(self, dt, ids=None):
+        """
+        Avvicina ogni attore in movimento alla sua destinazione di speed*dt.
+        Ritorna le facciate arrivate in questo passo (già ferme, frame a 0).
+        `ids` limita il passo ad alcune righe (per update_motion di un solo attore).
+        """
+        if not self.numpy:
+            return self._step_motion_python(dt, range(self.n) if ids is None else ids)
+
+        if ids is None:
+            idx = np.flatnonzero(self.moving[: self.n])
+        else:
+            idx = np.asarray(ids, dtype=np.intp)
+            idx = idx[self.moving[idx]]
+        if not idx.size:
+            return []
+        vx = self.tx[idx] - self.x[idx]
+        vy = self.ty[idx] - self.y[idx]
+        dist = np.hypot(vx, vy)
+        step = self.speed[idx] * dt
+        arrived = dist <= step
+
+        go = idx[~arrived]
+        scale = step[~arrived] / dist[~arrived]
+        self.x[go] += vx[~arrived] * scale
+        self.y[go] += vy[~arrived] * scale
+
+        done = idx[arrived]
+        self.x[done] = self.tx[done]
+        self.y[done] = self.ty[done]
+        self.moving[done] = False
+        self.frame[done] = 0
+        return [self.owners[i] for i in done.tolist()]
+
+    def _step_motion_python(self, dt, ids):
+        x, y, tx, ty, moving = self.x, self.y, self.tx, self.ty, self.moving
+        arrived = []
+        for i in ids:
+            if not moving[i]:
+                continue
+            vx, vy = tx[i] - x[i], ty[i] - y[i]
+            dist = hypot(vx, vy)
+            step = self.speed[i] * dt
+            if dist <= step:
+                x[i], y[i] = tx[i], ty[i]
+                moving[i] = False
+                self.frame[i] = 0
+                arrived.append(self.owners[i])
+            else:
+                x[i] += (vx / dist) * step
+                y[i] += (vy / dist) * step
+        return arrived
+
+    def step_animation(self, ids=None):
+        """Frame successivo: ciclo walk per chi si muove, idle per gli altri."""
+        if not self.numpy:
+            for i in range(self.n) if ids is None else ids:
+                count = self.n_walk[i] if self.moving[i] else self.n_idle[i]
+                self.frame[i] = (self.frame[i] + 1) % count
+            return
+        idx = slice(0, self.n) if ids is None else np.asarray(ids, dtype=np.intp)
+        count = np.where(self.moving[idx], self.n_walk[idx], self.n_idle[idx])
+        self.frame[idx] = (self.frame[idx] + 1) % count
+
+
+def entity_field(name, cast=float):
+    """Proprietà di una facciata (con .store e .eid) che legge e scrive la colonna `name`."""
+
+    def get(self):
+        return cast(getattr(self.store, name)[self.eid])
+
+    def set(self, value):
+        getattr(self.store, name)[self.eid] = value
+
+    return property(get, set)
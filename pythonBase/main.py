@@ -1,6 +1,12 @@
 # main_final.py — PgZero roguelike (menu, audio, slider volume, nemici, HP, animazioni)
 # -------------------------------------------------------------------------------------
-# Librerie consentite: PgZero, math, random (+ Rect da pygame)
+# Librerie usate: PgZero, math, random, pygame (Rect, Surface e draw in tilemap.py),
+#                 numpy (opzionale, in entities.py; il gioco non lo usa: use_numpy=False)
+# Moduli del progetto: sim.py (logica di gioco senza PgZero: mondo, attori, nemici),
+#                      tilemap.py (mappa pre-renderizzata, usa Surface di pygame),
+#                      pathfinding.py (campo di flusso per i nemici),
+#                      occupancy.py (occupazione delle celle, danno da contatto),
+#                      entities.py (posizioni e animazioni in array, numpy opzionale)
 # Asset richiesti:
 #   images/hero_idle_0..3.png, images/hero_walk_0..3.png
 #   images/slime_idle_0..2.png, images/slime_walk_0..3.png
@@ -11,13 +17,14 @@
 #   pgzrun main_final.py
 
 from pygame import Rect
-from math import hypot
-from random import choice, randint
 
-# --- Config griglia ---
+import sim
+from sim import LEVEL, TILE
+from tilemap import DirtyRects, TileMap
+
+# --- Config griglia (mappa e regole in sim.py) ---
 TITLE = "Roguelike su griglia con PgZero"
-TILE = 64
-COLS, ROWS = 10, 8
+COLS, ROWS = len(LEVEL[0]), len(LEVEL)
 WIDTH, HEIGHT = COLS * TILE, ROWS * TILE
 
 # --- Stati gioco ---
@@ -42,27 +49,14 @@ BUTTONS_BASE_Y = 280  # <- più in basso per lasciare spazio a titolo + info + s
 # Slider state
 dragging_slider = False
 
-# --- Mappa semplice (# = muro, . = pavimento) ---
-LEVEL = [
-    "##########",
-    "#........#",
-    "#..##....#",
-    "#........#",
-    "#...##...#",
-    "#........#",
-    "#..#.....#",
-    "##########",
-]
-
-
-def grid_to_px(gx, gy):
-    return gx * TILE + TILE // 2, gy * TILE + TILE // 2
+# mappa cotta una volta sola; a ogni frame si ripristinano solo i rettangoli sporchi
+tilemap = TileMap(LEVEL, TILE)
+dirty = DirtyRects()
+UI_RECT = Rect(0, 0, WIDTH, 36)  # cuori + "ESC: Menu"
 
-
-def is_blocked(gx, gy):
-    if gx < 0 or gy < 0 or gx >= COLS or gy >= ROWS:
-        return True
-    return LEVEL[gy][gx] == "#"
+# la partita (mappa, attori, regole); qui sopra solo sprite, audio e input.
+# Con 5 attori le colonne numpy non fanno differenza: liste Python, niente dipendenza
+world = sim.World(LEVEL, use_numpy=False)
 
 
 def clamp(v, lo, hi):
@@ -96,134 +90,57 @@ def play_sfx(name):
         pass
 
 
-class AnimatedActor:
-    """Attore su griglia con animazione idle/walk e interpolazione."""
+class Sprite:
+    """Parte PgZero di un attore di sim.py: sprite animato e disegno."""
 
-    def __init__(self, idle_frames, walk_frames, gx, gy, speed=220):
-        self.idle_frames = idle_frames or ["hero_idle_0"]
-        self.walk_frames = walk_frames or self.idle_frames
-        self.gx, self.gy = gx, gy
-        self.x, self.y = grid_to_px(gx, gy)
-        self.tx, self.ty = self.x, self.y
-        self.speed = speed
-        self.moving = False
-        self.state = "idle"
-        self.frame_index = 0
+    def make_sprite(self):
+        self.image = self.idle_frames[0]
         try:
-            self.actor = Actor(self.idle_frames[0], anchor=("center", "center"))
+            self.actor = Actor(self.image, anchor=("center", "center"))
             self.actor.pos = (self.x, self.y)
         except Exception:
             self.actor = None
 
-    # animazione
-    def set_state(self, st):
-        if self.state != st:
-            self.state = st
-            self.frame_index = 0
-
-    def step_animation(self):
-        frames = self.walk_frames if self.moving else self.idle_frames
-        if not frames:
-            return
-        if self.actor:
-            self.frame_index = (self.frame_index + 1) % len(frames)
-            self.actor.image = frames[self.frame_index]
-
-    # movimento
-    def start_move_grid(self, dx, dy):
-        if self.moving:
-            return False
-        nx, ny = self.gx + dx, self.gy + dy
-        if is_blocked(nx, ny):
-            return False
-        self.gx, self.gy = nx, ny
-        self.tx, self.ty = grid_to_px(nx, ny)
-        self.moving = True
-        self.set_state("walk")
-        return True
-
-    def update_motion(self, dt):
-        if not self.moving:
-            self.set_state("idle")
-            return
-        vx, vy = self.tx - self.x, self.ty - self.y
-        dist = hypot(vx, vy)
-        step = self.speed * dt
-        if dist <= step:
-            self.x, self.y = self.tx, self.ty
-            self.moving = False
-            self.set_state("idle")
-        else:
-            self.x += (vx / dist) * step
-            self.y += (vy / dist) * step
-        if self.actor:
-            self.actor.pos = (self.x, self.y)
+    def bounds(self):
+        """Area dello schermo coperta dallo sprite (o dal cerchio di ripiego)."""
+        r = Rect(0, 0, TILE, TILE)
+        r.center = (int(self.x), int(self.y))
+        return r
 
     def draw(self):
+        x, y = self.x, self.y
         if self.actor:
+            frames = self.walk_frames if self.moving else self.idle_frames
+            image = frames[self.frame_index % len(frames)]
+            if image != self.image:  # cambiare immagine ricarica lo sprite: solo se serve
+                self.image = self.actor.image = image
+            self.actor.pos = (x, y)
             self.actor.draw()
         else:
-            screen.draw.filled_circle((self.x, self.y), 20, "white")
-            screen.draw.circle((self.x, self.y), 20, "black")
-
-
-class Player(AnimatedActor):
-    def __init__(self, gx, gy):
-        super().__init__(
-            idle_frames=["hero_idle_0", "hero_idle_1", "hero_idle_2", "hero_idle_3"],
-            walk_frames=["hero_walk_0", "hero_walk_1", "hero_walk_2", "hero_walk_3"],
-            gx=gx,
-            gy=gy,
-            speed=260,
-        )
-        self.hp = 5
-        self.invuln_timer = 0.0
-
-    def update(self, dt):
-        if self.invuln_timer > 0:
-            self.invuln_timer -= dt
-        self.update_motion(dt)
+            screen.draw.filled_circle((x, y), 20, "white")
+            screen.draw.circle((x, y), 20, "black")
+
+
+class Player(Sprite, sim.Player):
+    def __init__(self, world, gx, gy):
+        super().__init__(world, gx, gy)
+        self.make_sprite()
 
     def try_move(self, dx, dy):
         if self.start_move_grid(dx, dy):
             play_sfx("step")
 
     def take_hit(self, dmg=1):
-        if self.invuln_timer > 0:
-            return
-        self.hp = max(0, self.hp - dmg)
-        self.invuln_timer = 0.6
-        play_sfx("hit")
-
-
-class Enemy(AnimatedActor):
-    def __init__(self, gx, gy):
-        super().__init__(
-            idle_frames=["slime_idle_0", "slime_idle_1", "slime_idle_2"],
-            walk_frames=["slime_walk_0", "slime_walk_1", "slime_walk_2", "slime_walk_3"],
-            gx=gx,
-            gy=gy,
-            speed=180,
-        )
-        self.decide_timer = 0.0
-
-    def update(self, dt, player):
-        self.decide_timer -= dt
-        if not self.moving and self.decide_timer <= 0:
-            self.decide_timer = 0.35 + randint(0, 20) * 0.01
-            # 55% di inseguimento su un solo asse, 45% vagabondaggio
-            if randint(0, 100) < 55:
-                dx = 1 if player.gx > self.gx else -1 if player.gx < self.gx else 0
-                dy = 1 if player.gy > self.gy else -1 if player.gy < self.gy else 0
-                if dx != 0 and dy != 0:
-                    if randint(0, 1) == 0:
-                        dy = 0
-                    else:
-                        dx = 0
-            else:
-                dx, dy = choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
-            self.start_move_grid(dx, dy)
-        self.update_motion(dt)
+        if super().take_hit(dmg):
+            play_sfx("hit")
+            return True
+        return False
+
+
+class Enemy(Sprite, sim.Enemy):
+    def __init__(self, world, gx, gy):
+        super().__init__(world, gx, gy)
+        self.make_sprite()
 
 
 # --- Oggetti di gioco (creati su Start) ---
@@ -251,13 +168,8 @@ buttons = build_buttons()
 
 def start_game():
     global state, player, enemies
-    player = Player(1, 1)
-    enemies = []
-    while len(enemies) < 4:
-        gx, gy = randint(1, COLS - 2), randint(1, ROWS - 2)
-        if is_blocked(gx, gy) or (abs(gx - player.gx) + abs(gy - player.gy) < 4):
-            continue
-        enemies.append(Enemy(gx, gy))
+    world.start(Player, Enemy)
+    player, enemies = world.player, world.enemies
     state = STATE_GAME
     # musica
     try:
@@ -281,15 +193,8 @@ def back_to_menu():
 
 # --- Disegno ---
 def draw_grid():
-    for gy in range(ROWS):
-        for gx in range(COLS):
-            x, y = gx * TILE, gy * TILE
-            r = Rect(x, y, TILE, TILE)
-            if LEVEL[gy][gx] == "#":
-                screen.draw.filled_rect(r, (35, 40, 60))
-            else:
-                screen.draw.filled_rect(r, (24, 26, 36))
-            screen.draw.rect(r, (15, 15, 22))
+    # tutta la mappa con un blit, oppure solo le zone dove c'erano attori e UI
+    dirty.restore(tilemap, screen.surface)
 
 
 def draw_menu_slider():
@@ -354,17 +259,22 @@ def draw_ui():
 
 
 def draw():
-    screen.clear()
     if state == STATE_MENU:
         draw_menu()
+        dirty.invalidate()  # il menu copre la mappa: al rientro va ridisegnata tutta
         return
 
+    if player and player.hp <= 0:
+        dirty.invalidate()  # il testo del game over non ha un rettangolo tracciato
     draw_grid()
     for e in enemies:
         e.draw()
+        dirty.add(e.bounds())
     if player:
         player.draw()
+        dirty.add(player.bounds())
         draw_ui()
+        dirty.add(UI_RECT)
 
     if player and player.hp <= 0:
         screen.draw.text("GAME OVER",
@@ -379,13 +289,8 @@ def draw():
 def update(dt):
     if state != STATE_GAME or not player:
         return
-    player.update(dt)
-    for e in enemies:
-        e.update(dt, player)
-    # danno da contatto
-    for e in enemies:
-        if hypot(e.x - player.x, e.y - player.y) < 28:
-            player.take_hit(1)
+    # movimento, nemici e danno da contatto: vedi sim.World.step
+    world.step(dt)
 
 
 def on_key_down(key):
@@ -489,10 +394,7 @@ def on_mouse_move(pos, rel, buttons):
 # --- Ticker animazioni (~6-7 fps) ---
 def tick_animation():
     if state == STATE_GAME:
-        if player:
-            player.step_animation()
-        for e in enemies:
-            e.step_animation()
+        world.entities.step_animation()
 
 
 clock.schedule_interval(tick_animation, 0.15)
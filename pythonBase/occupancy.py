@@ -0,0 +1,52 @@
+# occupancy.py — griglia di occupazione (spatial hash per cella)
+# -------------------------------------------------------------------------------------
+# Ogni attore è registrato nella cella in cui si trova; durante un movimento
+# anche nella cella di arrivo, prenotata quando il passo inizia.
+# Così "la cella è libera?" costa O(1) e il danno da contatto guarda solo
+# gli attori nelle celle vicine invece di tutti i nemici.
+
+
+class OccupancyGrid:
+    """Cella (gx, gy) -> attori che la occupano o l'hanno prenotata."""
+
+    def __init__(self):
+        self.cells = {}
+        self.solid = {}  # cella -> quanti attori "solidi" (che bloccano gli altri) ci sono
+
+    def add(self, actor, cell):
+        self.cells.setdefault(cell, []).append(actor)
+        if actor.solid:
+            self.solid[cell] = self.solid.get(cell, 0) + 1
+
+    def remove(self, actor, cell):
+        actors = self.cells.get(cell)
+        if not actors or actor not in actors:
+            return
+        actors.remove(actor)
+        if not actors:
+            del self.cells[cell]
+        if actor.solid:
+            left = self.solid[cell] - 1
+            if left:
+                self.solid[cell] = left
+            else:
+                del self.solid[cell]
+
+    def is_occupied(self, gx, gy):
+        """True se un attore solido occupa o ha prenotato la cella."""
+        return (gx, gy) in self.solid
+
+    def near(self, gx, gy, radius=1):
+        """Attori nelle celle entro `radius` (quadrato), ognuno una volta sola."""
+        seen = set()
+        cells = self.cells
+        for y in range(gy - radius, gy + radius + 1):
+            for x in range(gx - radius, gx + radius + 1):
+                for actor in cells.get((x, y), ()):
+                    if id(actor) not in seen:
+                        seen.add(id(actor))
+                        yield actor
+
+    def clear(self):
+        self.cells.clear()
+        self.solid.clear()
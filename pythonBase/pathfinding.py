@@ -0,0 +1,98 @@
+# pathfinding.py — campo di flusso condiviso per l'inseguimento dei nemici
+# -------------------------------------------------------------------------------------
+# Una sola BFS dalla cella del player (non una per nemico): ogni nemico legge
+# il passo successivo in O(1) guardando le 4 celle vicine.
+
+from collections import deque
+
+# (dx, dy) nello stesso ordine usato per provare le mosse
+STEPS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class FlowField:
+    """
+    Distanze BFS (in passi) dalla cella bersaglio, su una griglia nel formato di
+    LEVEL ('#' = muro). Con max_dist la BFS si ferma a quella distanza: le celle
+    più lontane restano "sconosciute" e next_step ritorna None.
+    """
+
+    def __init__(self, level, max_dist=None):
+        self.max_dist = max_dist
+        self.target = None
+        self.set_level(level)
+
+    def set_level(self, level):
+        """Da chiamare se cambia la mappa."""
+        self.rows = len(level)
+        self.cols = len(level[0]) if level else 0
+        # griglia con un bordo di muri in più: niente controlli sui limiti nella BFS
+        self.stride = self.cols + 2
+        self.blocked = bytearray(b"\x01") * (self.stride * (self.rows + 2))
+        for gy, line in enumerate(level):
+            base = (gy + 1) * self.stride + 1
+            for gx, ch in enumerate(line):
+                if ch != "#":
+                    self.blocked[base + gx] = 0
+        self.dist = [0] * len(self.blocked)
+        # generazione della BFS per cella: niente azzeramento dell'array a ogni ricalcolo
+        self.seen = [0] * len(self.blocked)
+        self.generation = 0
+        if self.target is not None:
+            target, self.target = self.target, None
+            self.update(*target)
+
+    def _index(self, gx, gy):
+        return (gy + 1) * self.stride + gx + 1
+
+    def update(self, gx, gy):
+        """Ricalcola le distanze verso (gx, gy); niente da fare se il bersaglio non è cambiato."""
+        if self.target == (gx, gy):
+            return False
+        self.target = (gx, gy)
+        self.generation += 1
+        gen = self.generation
+        blocked, dist, seen = self.blocked, self.dist, self.seen
+        start = self._index(gx, gy)
+        if blocked[start]:
+            return True  # bersaglio dentro un muro: nessun percorso
+        offsets = (1, -1, self.stride, -self.stride)
+        limit = self.max_dist if self.max_dist is not None else len(blocked)
+        dist[start] = 0
+        seen[start] = gen
+        queue = deque((start,))
+        pop, push = queue.popleft, queue.append
+        while queue:
+            i = pop()
+            d = dist[i] + 1
+            if d > limit:
+                continue
+            for off in offsets:
+                j = i + off
+                if seen[j] != gen and not blocked[j]:
+                    seen[j] = gen
+                    dist[j] = d
+                    push(j)
+        return True
+
+    def distance(self, gx, gy):
+        """Passi fino al bersaglio, None se irraggiungibile (o oltre max_dist)."""
+        if not (0 <= gx < self.cols and 0 <= gy < self.rows):
+            return None
+        i = self._index(gx, gy)
+        return self.dist[i] if self.seen[i] == self.generation else None
+
+    def next_step(self, gx, gy):
+        """(dx, dy) verso il bersaglio, None se già arrivato o se la cella non è raggiunta."""
+        d = self.distance(gx, gy)
+        if not d:
+            return None
+        i = self._index(gx, gy)
+        dist, seen, gen = self.dist, self.seen, self.generation
+        tx, ty = self.target
+        # prima l'asse su cui il bersaglio è più lontano: percorsi meno "a scalini"
+        steps = STEPS if abs(tx - gx) >= abs(ty - gy) else STEPS[2:] + STEPS[:2]
+        for dx, dy in steps:
+            j = i + dx + dy * self.stride
+            if seen[j] == gen and dist[j] < d:
+                return dx, dy
+        return None
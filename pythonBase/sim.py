@@ -0,0 +1,398 @@
+# sim.py — logica di gioco senza PgZero + simulazioni in batch
+# -------------------------------------------------------------------------------------
+# Mondo, attori, nemici e danno da contatto non dipendono da Actor, screen,
+# sounds, music o clock: main.py li usa con sprite e audio sopra, qui girano
+# a passo fisso e alla velocità della CPU, con RNG con seed e un bot al posto
+# del giocatore.
+#
+# Esempio (dalla cartella pythonBase/):
+#   python sim.py --games 2000 --chase 40,55,70 --invuln 0.6
+#   python sim.py --games 2000 --workers 1,4        # partite/s con 1 e 4 processi
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from math import hypot
+from random import Random
+
+from entities import EntityStore, entity_field
+from occupancy import OccupancyGrid
+from pathfinding import FlowField
+
+TILE = 64
+CONTACT_DIST = 28
+CHASE_PERCENT = 55  # probabilità (su 101) che un nemico insegua invece di vagare
+INVULN_TIME = 0.6  # secondi di invulnerabilità dopo un colpo
+PLAYER_HP = 5
+ENEMY_COUNT = 4
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+# --- Mappa semplice (# = muro, . = pavimento) ---
+LEVEL = [
+    "##########",
+    "#........#",
+    "#..##....#",
+    "#........#",
+    "#...##...#",
+    "#........#",
+    "#..#.....#",
+    "##########",
+]
+
+
+def grid_to_px(gx, gy):
+    return gx * TILE + TILE // 2, gy * TILE + TILE // 2
+
+
+class AnimatedActor:
+    """
+    Attore su griglia con animazione idle/walk e interpolazione.
+    Posizione, destinazione, velocità e frame stanno in world.entities (una riga
+    per attore): World.step muove tutti insieme, questa classe è la facciata.
+    """
+
+    solid = True  # occupa la cella: gli altri attori solidi non possono entrarci
+
+    x = entity_field("x")
+    y = entity_field("y")
+    tx = entity_field("tx")
+    ty = entity_field("ty")
+    speed = entity_field("speed")
+    moving = entity_field("moving", bool)
+    frame_index = entity_field("frame", int)
+
+    def __init__(self, world, idle_frames, walk_frames, gx, gy, speed=220):
+        self.world = world
+        self.idle_frames = idle_frames or ["hero_idle_0"]
+        self.walk_frames = walk_frames or self.idle_frames
+        self.gx, self.gy = gx, gy
+        self.from_cell = None  # cella di partenza mentre si muove
+        world.occupancy.add(self, (gx, gy))
+        self.store = world.entities
+        x, y = grid_to_px(gx, gy)
+        self.eid = self.store.add(self, x, y, speed, len(self.idle_frames), len(self.walk_frames))
+
+    @property
+    def state(self):
+        return "walk" if self.moving else "idle"
+
+    # animazione (tick_animation in main.py le fa avanzare tutte insieme)
+    def step_animation(self):
+        self.store.step_animation([self.eid])
+
+    # movimento
+    def start_move_grid(self, dx, dy):
+        if self.moving:
+            return False
+        nx, ny = self.gx + dx, self.gy + dy
+        world = self.world
+        if world.is_blocked(nx, ny) or (self.solid and world.occupancy.is_occupied(nx, ny)):
+            return False
+        # prenota la cella di arrivo; quella di partenza si libera all'arrivo
+        world.occupancy.add(self, (nx, ny))
+        self.from_cell = (self.gx, self.gy)
+        self.gx, self.gy = nx, ny
+        self.store.start_move(self.eid, *grid_to_px(nx, ny))
+        return True
+
+    def update_motion(self, dt):
+        """Solo questo attore; World.step usa entities.step_motion per tutti."""
+        for actor in self.store.step_motion(dt, [self.eid]):
+            actor.arrive()
+
+    def arrive(self):
+        self.world.occupancy.remove(self, self.from_cell)
+        self.from_cell = None
+
+
+class Player(AnimatedActor):
+    solid = False  # i nemici possono entrare nella sua cella (è così che colpiscono)
+
+    def __init__(self, world, gx, gy):
+        super().__init__(
+            world,
+            idle_frames=["hero_idle_0", "hero_idle_1", "hero_idle_2", "hero_idle_3"],
+            walk_frames=["hero_walk_0", "hero_walk_1", "hero_walk_2", "hero_walk_3"],
+            gx=gx,
+            gy=gy,
+            speed=260,
+        )
+        self.hp = PLAYER_HP
+        self.invuln_timer = 0.0
+
+    def update(self, dt):
+        # il movimento lo fa entities.step_motion in World.step, per tutti gli attori
+        if self.invuln_timer > 0:
+            self.invuln_timer -= dt
+
+    def start_move_grid(self, dx, dy):
+        if not super().start_move_grid(dx, dy):
+            return False
+        self.world.flow.update(self.gx, self.gy)
+        return True
+
+    def take_hit(self, dmg=1):
+        """True se il colpo è andato a segno (non durante l'invulnerabilità)."""
+        if self.invuln_timer > 0:
+            return False
+        self.hp = max(0, self.hp - dmg)
+        self.invuln_timer = self.world.invuln
+        self.world.hits += 1
+        if self.world.first_hit is None:
+            self.world.first_hit = self.world.time
+        return True
+
+
+class Enemy(AnimatedActor):
+    def __init__(self, world, gx, gy):
+        super().__init__(
+            world,
+            idle_frames=["slime_idle_0", "slime_idle_1", "slime_idle_2"],
+            walk_frames=["slime_walk_0", "slime_walk_1", "slime_walk_2", "slime_walk_3"],
+            gx=gx,
+            gy=gy,
+            speed=180,
+        )
+        self.decide_timer = 0.0
+
+    def update(self, dt, player):
+        self.decide_timer -= dt
+        if not self.moving and self.decide_timer <= 0:
+            rng = self.world.rng
+            self.decide_timer = 0.35 + rng.randint(0, 20) * 0.01
+            # CHASE_PERCENT inseguimento lungo il campo di flusso, il resto vagabondaggio
+            if rng.randint(0, 100) < self.world.chase:
+                step = self.world.flow.next_step(self.gx, self.gy)
+                if step is not None:
+                    dx, dy = step
+                else:
+                    # già sul player o cella non raggiunta: inseguimento su un solo asse
+                    dx = 1 if player.gx > self.gx else -1 if player.gx < self.gx else 0
+                    dy = 1 if player.gy > self.gy else -1 if player.gy < self.gy else 0
+                    if dx != 0 and dy != 0:
+                        if rng.randint(0, 1) == 0:
+                            dy = 0
+                        else:
+                            dx = 0
+            else:
+                dx, dy = rng.choice(STEPS)
+            self.start_move_grid(dx, dy)
+
+
+class World:
+    """Una partita: mappa, attori e regole. Nessuna dipendenza da PgZero."""
+
+    def __init__(self, level=LEVEL, seed=None, chase=CHASE_PERCENT, invuln=INVULN_TIME,
+                 enemy_count=ENEMY_COUNT, use_numpy=True):
+        self.level = level
+        self.rows, self.cols = len(level), len(level[0])
+        self.rng = Random(seed)
+        self.chase = chase
+        self.invuln = invuln
+        self.enemy_count = enemy_count
+        # distanze dalla cella del player, ricalcolate solo quando il player cambia cella
+        self.flow = FlowField(level)
+        # chi sta (o sta arrivando) in ogni cella: niente nemici ammucchiati sulla stessa cella
+        self.occupancy = OccupancyGrid()
+        # colonne di tutti gli attori: movimento e animazione in un solo passo
+        self.entities = EntityStore(use_numpy=use_numpy)
+        self.player = None
+        self.enemies = []
+        self.time = 0.0
+        self.hits = 0
+        self.first_hit = None
+
+    def is_blocked(self, gx, gy):
+        if gx < 0 or gy < 0 or gx >= self.cols or gy >= self.rows:
+            return True
+        return self.level[gy][gx] == "#"
+
+    def start(self, player_cls=Player, enemy_cls=Enemy):
+        """Nuova partita; main.py passa le sue classi con sprite e suoni."""
+        self.occupancy.clear()
+        self.entities.clear()
+        self.time = 0.0
+        self.hits = 0
+        self.first_hit = None
+        self.player = player_cls(self, 1, 1)
+        self.flow.update(self.player.gx, self.player.gy)
+        self.enemies = []
+        rng = self.rng
+        while len(self.enemies) < self.enemy_count:
+            gx, gy = rng.randint(1, self.cols - 2), rng.randint(1, self.rows - 2)
+            if self.is_blocked(gx, gy) or (abs(gx - self.player.gx) + abs(gy - self.player.gy) < 4):
+                continue
+            if self.occupancy.is_occupied(gx, gy):
+                continue
+            self.enemies.append(enemy_cls(self, gx, gy))
+
+    @property
+    def over(self):
+        return self.player is not None and self.player.hp <= 0
+
+    def step(self, dt):
+        player = self.player
+        self.time += dt
+        player.update(dt)
+        for e in self.enemies:
+            e.update(dt, player)
+        # interpolazione di tutti gli attori in un solo passo (vettorizzato con numpy)
+        for actor in self.entities.step_motion(dt):
+            actor.arrive()
+        # danno da contatto: solo gli attori nelle 9 celle attorno al player
+        # (CONTACT_DIST < TILE, quindi un nemico a contatto è al massimo nella cella accanto)
+        px, py = player.x, player.y
+        for e in self.occupancy.near(int(px // TILE), int(py // TILE)):
+            if e is not player and hypot(e.x - px, e.y - py) < CONTACT_DIST:
+                player.take_hit(1)
+
+
+# --- Bot ---
+
+def flee_bot(world):
+    """Va nella cella (o resta) più lontana dal nemico più vicino; pareggi a caso."""
+    player = world.player
+    targets = [(e.gx, e.gy) for e in world.enemies]
+    best, best_score = [], -1
+    for dx, dy in [(0, 0)] + STEPS:
+        gx, gy = player.gx + dx, player.gy + dy
+        if (dx or dy) and world.is_blocked(gx, gy):
+            continue
+        score = min(abs(gx - ex) + abs(gy - ey) for ex, ey in targets)
+        if score > best_score:
+            best, best_score = [(dx, dy)], score
+        elif score == best_score:
+            best.append((dx, dy))
+    return world.rng.choice(best)
+
+
+def random_bot(world):
+    return world.rng.choice(STEPS)
+
+
+BOTS = {"flee": flee_bot, "random": random_bot}
+
+
+def play(seed, chase=CHASE_PERCENT, invuln=INVULN_TIME, bot="flee", dt=1 / 60,
+         max_time=120.0, reaction=0.15, use_numpy=False):
+    """
+    Una partita a passo fisso dt fino al game over (o a max_time secondi di gioco).
+    Il bot decide ogni `reaction` secondi, come un giocatore che preme un tasto.
+    """
+    world = World(seed=seed, chase=chase, invuln=invuln, use_numpy=use_numpy)
+    world.start()
+    choose = BOTS[bot]
+    decide = 0.0
+    while not world.over and world.time < max_time:
+        decide -= dt
+        if decide <= 0 and not world.player.moving:
+            decide = reaction
+            dx, dy = choose(world)
+            if dx or dy:
+                world.player.start_move_grid(dx, dy)
+        world.step(dt)
+    return {
+        "chase": chase,
+        "invuln": invuln,
+        "time": world.time,
+        "survived": not world.over,
+        "hits": world.hits,
+        "first_hit": world.first_hit,
+    }
+
+
+def _play_many(args):
+    seeds, kwargs = args
+    return [play(seed, **kwargs) for seed in seeds]
+
+
+def run_batch(jobs, workers, chunk=50):
+    """jobs: lista di (seed, kwargs). Con workers > 1 le partite vanno in un process pool."""
+    groups = {}
+    for seed, kwargs in jobs:
+        groups.setdefault(tuple(sorted(kwargs.items())), []).append(seed)
+    tasks = [
+        (seeds[i:i + chunk], dict(key))
+        for key, seeds in groups.items()
+        for i in range(0, len(seeds), chunk)
+    ]
+    if workers <= 1:
+        return [game for task in tasks for game in _play_many(task)]
+    with ProcessPoolExecutor(workers) as pool:
+        return [game for games in pool.map(_play_many, tasks) for game in games]
+
+
+def summarize(games, max_time):
+    times = sorted(g["time"] for g in games)
+    first = [g["first_hit"] for g in games if g["first_hit"] is not None]
+    minutes = sum(times) / 60
+    return {
+        "games": len(games),
+        "survival_mean_s": round(statistics.fmean(times), 2),
+        "survival_median_s": round(statistics.median(times), 2),
+        "survival_p10_s": round(times[len(times) // 10], 2),
+        f"alive_at_{max_time:g}s": round(sum(g["survived"] for g in games) / len(games), 3),
+        "hits_per_min": round(sum(g["hits"] for g in games) / minutes, 2) if minutes else None,
+        "first_hit_mean_s": round(statistics.fmean(first), 2) if first else None,
+    }
+
+
+def _floats(value):
+    return [float(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulazioni headless del roguelike.")
+    parser.add_argument("--games", type=int, default=1000, help="partite per combinazione")
+    parser.add_argument("--chase", default=str(CHASE_PERCENT), help="es. 40,55,70")
+    parser.add_argument("--invuln", default=str(INVULN_TIME), help="es. 0.3,0.6,1.0")
+    parser.add_argument("--bot", choices=sorted(BOTS), default="flee")
+    parser.add_argument("--max-time", type=float, default=120.0, help="secondi di gioco per partita")
+    parser.add_argument("--dt", type=float, default=1 / 60)
+    parser.add_argument("--workers", default=str(os.cpu_count() or 1),
+                        help="processi; con più valori (es. 1,4) si ripete il batch per confrontare")
+    parser.add_argument("--numpy", action="store_true", help="entità su numpy (più lento con 5 attori)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="salva i risultati in JSON")
+    args = parser.parse_args()
+
+    combos = list(product(_floats(args.chase), _floats(args.invuln)))
+    jobs = [
+        (args.seed * 1_000_003 + i, {"chase": chase, "invuln": invuln, "bot": args.bot, "dt": args.dt,
+                                     "max_time": args.max_time, "use_numpy": args.numpy})
+        for chase, invuln in combos
+        for i in range(args.games)
+    ]
+    results = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "params": vars(args), "speed": {}}
+    games = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        start = time.perf_counter()
+        games = run_batch(jobs, workers)
+        wall = time.perf_counter() - start
+        sim_time = sum(g["time"] for g in games)
+        results["speed"][workers] = {
+            "games_per_s": round(len(games) / wall, 1),
+            "x_realtime": round(sim_time / wall, 1),
+        }
+        print(f"{workers} processi: {results['speed'][workers]}", flush=True)
+
+    results["results"] = []
+    for chase, invuln in combos:
+        row = {"chase": chase, "invuln": invuln}
+        row.update(summarize([g for g in games if g["chase"] == chase and g["invuln"] == invuln],
+                             args.max_time))
+        results["results"].append(row)
+        print(row)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# tilemap.py — mappa pre-renderizzata a chunk + ridisegno a dirty rect
+# -------------------------------------------------------------------------------------
+# La griglia viene disegnata una sola volta su superfici di CHUNK x CHUNK tile;
+# a ogni frame si fa solo blit (tutta la vista o i rettangoli sporchi).
+# Usa Surface di pygame, che PgZero già include (screen.surface è una Surface).
+
+from pygame import Rect, Surface, error as PygameError
+from pygame import draw as pgdraw
+
+WALL_COLOR = (35, 40, 60)
+FLOOR_COLOR = (24, 26, 36)
+BORDER_COLOR = (15, 15, 22)
+CHUNK = 16
+
+
+class TileMap:
+    """LEVEL cotto su superfici a chunk, create al primo uso."""
+
+    def __init__(self, level, tile, chunk=CHUNK):
+        self.level = level
+        self.tile = tile
+        self.chunk = chunk
+        self.rows = len(level)
+        self.cols = len(level[0]) if level else 0
+        self.width, self.height = self.cols * tile, self.rows * tile
+        self._chunks = {}
+
+    def _bake(self, cx, cy):
+        tile = self.tile
+        gx0, gy0 = cx * self.chunk, cy * self.chunk
+        cols = min(self.chunk, self.cols - gx0)
+        rows = min(self.chunk, self.rows - gy0)
+        surf = Surface((cols * tile, rows * tile))
+        try:
+            surf = surf.convert()  # stesso formato del display: blit più veloce
+        except PygameError:
+            pass  # nessun display aperto (es. benchmark headless)
+        for gy in range(rows):
+            line = self.level[gy0 + gy]
+            for gx in range(cols):
+                r = Rect(gx * tile, gy * tile, tile, tile)
+                color = WALL_COLOR if line[gx0 + gx] == "#" else FLOOR_COLOR
+                pgdraw.rect(surf, color, r, 0)
+                pgdraw.rect(surf, BORDER_COLOR, r, 1)
+        return surf
+
+    def chunk_surface(self, cx, cy):
+        surf = self._chunks.get((cx, cy))
+        if surf is None:
+            surf = self._chunks[(cx, cy)] = self._bake(cx, cy)
+        return surf
+
+    def invalidate(self, gx=None, gy=None):
+        """Da chiamare se LEVEL cambia: butta il chunk della tile (o tutti)."""
+        if gx is None:
+            self._chunks.clear()
+        else:
+            self._chunks.pop((gx // self.chunk, gy // self.chunk), None)
+
+    def blit(self, target, area=None, camera=(0, 0)):
+        """
+        Copia su `target` la parte di mappa sotto `area` (coordinate schermo;
+        None = tutto il target). Ritorna il numero di blit fatti.
+        """
+        if area is None:
+            area = target.get_rect()
+        cam_x, cam_y = camera
+        world = Rect(area.x + cam_x, area.y + cam_y, area.w, area.h).clip(
+            Rect(0, 0, self.width, self.height)
+        )
+        if not world.w or not world.h:
+            return 0
+        size = self.chunk * self.tile
+        blits = 0
+        for cy in range(world.top // size, (world.bottom - 1) // size + 1):
+            for cx in range(world.left // size, (world.right - 1) // size + 1):
+                part = world.clip(Rect(cx * size, cy * size, size, size))
+                src = part.move(-cx * size, -cy * size)
+                target.blit(self.chunk_surface(cx, cy), (part.x - cam_x, part.y - cam_y), src)
+                blits += 1
+        return blits
+
+
+class DirtyRects:
+    """
+    Rettangoli disegnati nel frame precedente (attori, UI): al frame dopo si
+    ripristina la mappa solo lì invece di ridisegnare tutto lo schermo.
+    """
+
+    def __init__(self):
+        self.rects = []
+        self.full = True
+
+    def add(self, rect):
+        self.rects.append(rect)
+
+    def invalidate(self):
+        """Al prossimo frame ridisegna tutta la vista (menu, game over, cambio mappa)."""
+        self.full = True
+
+    def restore(self, tilemap, target, camera=(0, 0)):
+        if self.full:
+            w, h = target.get_size()
+            if tilemap.width - camera[0] < w or tilemap.height - camera[1] < h:
+                target.fill((0, 0, 0))  # la vista esce dalla mappa: come screen.clear()
+            blits = tilemap.blit(target, None, camera)
+            self.full = False
+        else:
+            blits = 0
+            for rect in self.rects:
+                blits += tilemap.blit(target, rect, camera)
+        self.rects = []
+        return blits
@@ -0,0 +1,156 @@
+from datetime import datetime
+
+from questions import get_question
+from users import set_score
+
+ADD_SCORE = "UPDATE users SET total_score = total_score + ? WHERE id = ? RETURNING total_score;"
+
+INSERT_ANSWER = """
+    INSERT INTO answers (user_id, question_id, selected_option, correct, answered_at)
+    VALUES (?, ?, ?, ?, ?);
+"""
+
+# aggregati incrementali: aggiornati nella stessa transazione dello storico
+UPSERT_USER_STATS = """
+    INSERT INTO user_stats (user_id, attempts, correct) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        correct = correct + excluded.correct;
+"""
+
+UPSERT_QUESTION_STATS = """
+    INSERT INTO question_stats (question_id, attempts, correct) VALUES (?, ?, ?)
+    ON CONFLICT (question_id) DO UPDATE SET
+        attempts = attempts + excluded.attempts,
+        correct = correct + excluded.correct;
+"""
+
+
+def create_schema(conn):
+    # storico delle risposte: solo INSERT, nessun indice da mantenere
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS answers (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            selected_option INTEGER NOT NULL,
+            correct INTEGER NOT NULL,
+            answered_at TEXT NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            correct INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_question_stats_attempts "
+        "ON question_stats (attempts DESC);"
+    )
+
+
+class Answer:
+    """Risposta data da un utente, da registrare con ScoreRepo.record()."""
+
+    __slots__ = ("user_id", "question_id", "selected_option", "correct", "answered_at")
+
+    def __init__(self, user_id, question_id, selected_option, correct):
+        self.user_id = user_id
+        self.question_id = question_id
+        self.selected_option = selected_option
+        self.correct = correct
+        self.answered_at = datetime.now().isoformat(timespec="seconds")
+
+
+def record_answers(conn, batch):
+    """
+    Scrive un gruppo di risposte in una sola transazione: storico, aggregati
+    per utente e per domanda e punteggi. Ritorna {user_id: nuovo punteggio}
+    per gli utenti che hanno guadagnato punti.
+    """
+    users = {}
+    questions = {}
+    for answer in batch:
+        attempts, correct = users.get(answer.user_id, (0, 0))
+        users[answer.user_id] = (attempts + 1, correct + answer.correct)
+        attempts, correct = questions.get(answer.question_id, (0, 0))
+        questions[answer.question_id] = (attempts + 1, correct + answer.correct)
+
+    totals = {}
+    try:
+        conn.executemany(
+            INSERT_ANSWER,
+            [
+                (a.user_id, a.question_id, a.selected_option, int(a.correct), a.answered_at)
+                for a in batch
+            ],
+        )
+        conn.executemany(
+            UPSERT_USER_STATS, [(uid, att, cor) for uid, (att, cor) in users.items()]
+        )
+        conn.executemany(
+            UPSERT_QUESTION_STATS, [(qid, att, cor) for qid, (att, cor) in questions.items()]
+        )
+        for user_id, (_, correct) in users.items():
+            if correct:
+                # un solo statement: aggiornamento e lettura del nuovo punteggio
+                row = conn.execute(ADD_SCORE, (correct, user_id)).fetchone()
+                totals[user_id] = row[0] if row else None
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return totals
+
+
+def submit_answer(conn, user_id, question_id, selected_option):
+    """
+    Corregge la risposta con la chiave in memoria, la registra nello storico
+    e, se è giusta, aggiunge un punto.
+    Ritorna (corretta, nuovo punteggio totale oppure None se non è cambiato).
+    """
+    question = get_question(conn, question_id)
+    if question is None:
+        return False, None
+
+    # import qui: storage importa questo modulo
+    from storage import get_storage
+
+    answer = Answer(user_id, question_id, selected_option, selected_option == question.correct_option)
+    total = get_storage().scores.record([answer]).get(user_id)
+
+    if total is not None:
+        set_score(user_id, total)
+    return answer.correct, total
+
+
+def user_stats(conn, user_id):
+    """Tentativi e risposte corrette dell'utente: una lettura per chiave primaria."""
+    row = conn.execute(
+        "SELECT attempts, correct FROM user_stats WHERE user_id = ?;", (user_id,)
+    ).fetchone()
+    return (row["attempts"], row["correct"]) if row else (0, 0)
+
+
+def top_question_stats(conn, limit=10):
+    """Domande con più tentativi, lette dall'indice su question_stats."""
+    return conn.execute(
+        "SELECT question_id, attempts, correct FROM question_stats "
+        "ORDER BY attempts DESC LIMIT ?;",
+        (limit,),
+    ).fetchall()
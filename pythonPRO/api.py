@@ -0,0 +1,152 @@
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request, session
+from flask.json.provider import DefaultJSONProvider
+
+from answers import submit_answer
+from db import get_db
+from leaderboard import get_leaderboard, get_scores_clock, parse_cursor
+from page_cache import fragment
+from questions import get_question, next_question_id
+from storage import get_storage
+from users import current_user
+
+try:
+    import orjson
+except ImportError:  # serializzazione con il modulo json della libreria standard
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() con orjson quando è installato (scrive direttamente bytes, senza indentazione)."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default), mimetype=self.mimetype
+        )
+
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+
+def api_login_required(view):
+    """Come login_required, ma risponde 401 in JSON invece di fare redirect."""
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user():
+            return jsonify(error="Devi effettuare il login."), 401
+        return view(*args, **kwargs)
+
+    return wrapped
+
+
+def question_json(question):
+    """Domanda per il client, senza la risposta corretta."""
+    if question is None:
+        return None
+    return {
+        "id": question.id,
+        "text": question.text,
+        "options": [question.option1, question.option2, question.option3, question.option4],
+    }
+
+
+def _next_question(conn):
+    """Domanda successiva del mazzo; il suo id resta in sessione come l'unica a cui si può rispondere."""
+    next_id = next_question_id(conn)
+    question = question_json(get_question(conn, next_id)) if next_id is not None else None
+    if question is None:
+        session.pop("quiz_question_id", None)
+    else:
+        session["quiz_question_id"] = question["id"]
+    return question
+
+
+@bp.route("/quiz/next")
+@api_login_required
+def quiz_next():
+    """Prossima domanda del mazzo dell'utente: {question, total_score}."""
+    conn = get_db()
+    return jsonify(question=_next_question(conn), total_score=current_user()["total_score"])
+
+
+@bp.route("/quiz/answer", methods=["POST"])
+@api_login_required
+def quiz_answer():
+    """
+    Corregge una risposta {question_id, option} e restituisce nella stessa risposta
+    l'esito, il nuovo punteggio e la domanda successiva.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        question_id = int(data["question_id"])
+        selected_option = int(data["option"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error="Servono question_id e option."), 400
+    if not 1 <= selected_option <= 4:
+        return jsonify(error="option deve essere tra 1 e 4."), 400
+    # si risponde solo alla domanda servita (da /quiz/next o nel `next` della risposta
+    # precedente), e una volta sola: niente punti ripetendo una domanda già corretta
+    if session.get("quiz_question_id") != question_id:
+        return jsonify(error="Rispondi alla domanda che ti è stata proposta."), 409
+
+    conn = get_db()
+    if get_question(conn, question_id) is None:
+        session.pop("quiz_question_id", None)
+        return jsonify(error="Domanda inesistente."), 404
+
+    user = current_user()
+    session.pop("quiz_question_id", None)
+    correct, _ = submit_answer(conn, user["id"], question_id, selected_option)
+    return jsonify(
+        correct=correct,
+        # set_score ha già aggiornato l'utente della richiesta
+        total_score=current_user()["total_score"],
+        next=_next_question(conn),
+    )
+
+
+@bp.route("/leaderboard")
+def leaderboard():
+    """Classifica: /api/leaderboard?limit=20&after=score,id"""
+    scores = get_storage().scores
+    board = get_leaderboard()
+    after = parse_cursor(request.args.get("after"))
+    limit = min(max(request.args.get("limit", board.page_size, type=int), 1), board.page_size)
+
+    version = get_scores_clock().current(scores)
+
+    def build():
+        rows, next_after, start_rank = board.page(scores, after, version)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = f"{rows[-1]['total_score']},{rows[-1]['id']}"
+        return {
+            "players": [
+                {"rank": start_rank + i, "id": row["id"], "nickname": row["nickname"],
+                 "total_score": row["total_score"]}
+                for i, row in enumerate(rows)
+            ],
+            "next": next_after,
+        }
+
+    # stessa cache a versione della tabella HTML
+    payload = fragment(("api_leaderboard", after, limit), version, build)
+    user = current_user()
+    if user:
+        payload = dict(payload, my_rank=board.rank(scores, user["total_score"], user["id"]))
+    return jsonify(payload)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(bp)
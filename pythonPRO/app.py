@@ -1,66 +1,92 @@
+import json
 import os
-import sqlite3
-import random
 from datetime import datetime
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, session, flash
+    url_for, session, flash, jsonify, Response, stream_with_context
 )
-import requests
-from werkzeug.security import generate_password_hash, check_password_hash
+
+import api
+import compression
+import db
+import leaderboard as leaderboard_engine
+import metrics
+import page_cache
+import migrations
+import passwords
+import storage
+import question_io
+import questions
+import users
+import weather
+from answers import submit_answer
+from db import get_db
+from leaderboard import get_leaderboard, get_scores_clock, parse_cursor
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
+from metrics import span
+from page_cache import cache_page, fragment
+from passwords import HashingBusy, get_password_hasher, get_rate_limiters
+from question_io import text_hash
+from questions import get_question, get_question_bank, next_question_id
+from storage import DuplicateUser, get_storage
+from users import current_user
+from weather import CITY_NOT_FOUND, get_batch_executor, get_forecast_cache
 
 app = Flask(__name__)                                                      
 app.config["SECRET_KEY"] = "ciaociao12345"
-app.config["DATABASE"] = "quiz.db"
+app.config["DATABASE"] = os.environ.get("QUIZ_DATABASE", "quiz.db")
+app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", "8"))
+# "sqlite": un file; "sharded": utenti, punteggi e statistiche divisi su STORAGE_SHARDS file
+# (il primo è DATABASE, con le domande). Gli id degli utenti dipendono dal numero di shard:
+# si sceglie su un database nuovo e poi non si cambia
+app.config["STORAGE"] = os.environ.get("QUIZ_STORAGE", "sqlite")
+app.config["STORAGE_SHARDS"] = int(os.environ.get("QUIZ_STORAGE_SHARDS", "4"))
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") != "0"
+# proxy fidati davanti all'app (su PythonAnywhere uno): l'IP del client, usato dai
+# limiti sui tentativi, viene da X-Forwarded-For invece che dall'ultimo proxy.
+# 0 = connessione diretta; mai più dei proxy reali, altrimenti l'header è falsificabile
+app.config["TRUSTED_PROXIES"] = int(os.environ.get("TRUSTED_PROXIES", "0"))
+if app.config["TRUSTED_PROXIES"]:
+    app.wsgi_app = ProxyFix(
+        app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"], x_proto=app.config["TRUSTED_PROXIES"]
+    )
+db.init_app(app)
+metrics.init_app(app)
+questions.init_app(app)
+leaderboard_engine.init_app(app)
+weather.init_app(app)
+users.init_app(app)
+question_io.init_app(app)
+passwords.init_app(app)
+migrations.init_app(app)
+storage.init_app(app)
+page_cache.init_app(app)
+# registrata dopo page_cache: comprime prima che vengano calcolati ETag e 304
+compression.init_app(app)
+api.init_app(app)
 
 
 OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY", "0fbc9381438375486301f99d38c92cc9")
 
-def get_db_connection():
-    conn = sqlite3.connect(app.config["DATABASE"])
-    conn.row_factory = sqlite3.Row
-    return conn 
-
-
 def init_db():
-    """Crea le tabelle se non esistono e inserisce alcune domande di esempio."""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    """Applica le migrazioni dello schema e inserisce alcune domande di esempio."""
+    with app.app_context():
+        conn = get_db()
+        migrations.migrate(conn)
+        _insert_sample_questions(conn)
+        # carichiamo subito le domande in memoria
+        get_question_bank().version(conn)
 
-    # Tabella utenti
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            login TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            nickname TEXT UNIQUE NOT NULL,
-            total_score INTEGER NOT NULL DEFAULT 0,
-            created_at TEXT NOT NULL
-        );
-        """
-    )
 
-    # Tabella domande
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT NOT NULL,
-            option1 TEXT NOT NULL,
-            option2 TEXT NOT NULL,
-            option3 TEXT NOT NULL,
-            option4 TEXT NOT NULL,
-            correct_option INTEGER NOT NULL
-        );
-        """
-    )
+def _insert_sample_questions(conn):
+    cur = conn.cursor()
 
     # Inseriamo qualche domanda solo se la tabella è vuota
     cur.execute("SELECT COUNT(*) AS c FROM questions;")
     count = cur.fetchone()["c"]
     if count == 0:
-        questions = [
+        sample_questions = [
             (
                 "Quale libreria Python è più usata per il machine learning classico?",
                 "NumPy",
@@ -97,27 +123,13 @@ def init_db():
 
         cur.executemany(
             """
-            INSERT INTO questions (text, option1, option2, option3, option4, correct_option)
-            VALUES (?, ?, ?, ?, ?, ?);
+            INSERT INTO questions (text, option1, option2, option3, option4, correct_option, text_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?);
             """,
-            questions,
+            [q + (text_hash(q[0]),) for q in sample_questions],
         )
 
     conn.commit()
-    conn.close()
-
-
-def current_user():
-    """Ritorna l'utente loggato come record del database (oppure None)."""
-    user_id = session.get("user_id")
-    if not user_id:
-        return None
-    conn = get_db_connection()
-    user = conn.execute(
-        "SELECT * FROM users WHERE id = ?;", (user_id,)
-    ).fetchone()
-    conn.close()
-    return user
 
 
 def login_required(view_func):
@@ -133,80 +145,53 @@ def login_required(view_func):
 
     return wrapped
 
-def get_weather_forecast(city_name):
+def request_weather_forecast(city_name):
     """
-    Ritorna una lista di 3 giorni di previsioni per la città scelta.
-    Ogni elemento è un dict: {date, weekday, temp_min, temp_max, description}
-    Usa l'API 5-day/3-hour di OpenWeatherMap.
+    Previsioni di 3 giorni per la città scelta, senza mai aspettare la rete:
+    (previsioni, errore) se in cache (anche scadute da poco: vengono aggiornate
+    in background), altrimenti None e il caricamento parte sul pool del meteo.
+    Ogni giorno è un dict: {date, weekday, temp_min, temp_max, description}
     """
     if not city_name or OPENWEATHER_API_KEY.startswith("INSERISCI_"):
         return None, "API key mancante o città non valida."
 
-    try:
-        url = (
-            "https://api.openweathermap.org/data/2.5/forecast"
-            f"?q={city_name}&units=metric&lang=it&appid={OPENWEATHER_API_KEY}"
-        )
-        resp = requests.get(url, timeout=5)
-        if resp.status_code != 200:
-            return None, "Errore nel recupero dei dati meteo."
-
-        data = resp.json()
-        if "list" not in data:
-            return None, "Formato della risposta meteo non valido."
-
-        # Raggruppiamo per data (YYYY-MM-DD)
-        daily = {}
-        for item in data["list"]:
-            dt = datetime.fromtimestamp(item["dt"])
-            date_str = dt.date().isoformat()
-            temp = item["main"]["temp"]
-            desc = item["weather"][0]["description"]
-
-            if date_str not in daily:
-                daily[date_str] = {
-                    "temps": [temp],
-                    "descriptions": [desc],
-                }
-            else:
-                daily[date_str]["temps"].append(temp)
-                daily[date_str]["descriptions"].append(desc)
-
-        # Prendiamo solo i prossimi 3 giorni
-        result = []
-        for date_str in sorted(daily.keys())[:3]:
-            temps = daily[date_str]["temps"]
-            descriptions = daily[date_str]["descriptions"]
-            temp_min = round(min(temps), 1)
-            temp_max = round(max(temps), 1)
-            # descrizione più frequente
-            description = max(set(descriptions), key=descriptions.count)
-
-            dt_date = datetime.fromisoformat(date_str)
-            weekday = dt_date.strftime("%A")  # es. Monday
-
-            result.append(
-                {
-                    "date": dt_date.strftime("%d/%m/%Y"),
-                    "weekday": weekday,
-                    "temp_min": temp_min,
-                    "temp_max": temp_max,
-                    "description": description,
-                }
-            )
-
-        return result, None
-
-    except Exception:
-        return None, "Si è verificato un errore durante la richiesta meteo."
+    with span("weather"):
+        return get_forecast_cache(OPENWEATHER_API_KEY).get_nowait(city_name)
+
+
+def get_weather_forecasts(cities, deadline=None):
+    """
+    Previsioni per molte città insieme.
+    Generatore di (città, previsioni, errore) nell'ordine in cui le risposte arrivano.
+    """
+    if OPENWEATHER_API_KEY.startswith("INSERISCI_"):
+        for city_name in cities:
+            yield city_name, None, "API key mancante o città non valida."
+        return
+
+    if deadline is None:
+        deadline = app.config["WEATHER_BATCH_DEADLINE"]
+    yield from get_forecast_cache(OPENWEATHER_API_KEY).get_many(
+        cities, get_batch_executor(), deadline
+    )
+
+
+def peek_weather_forecast(city_name):
+    """Previsioni solo se già in cache (None altrimenti): non blocca mai sulla rete."""
+    if not city_name or OPENWEATHER_API_KEY.startswith("INSERISCI_"):
+        return None
+    return get_forecast_cache(OPENWEATHER_API_KEY).peek(city_name)
 
 @app.route("/", methods=["GET", "POST"])
+@cache_page
 def home():
     """
     Home page:
     - campo per il nome della città
     - tabella con previsioni per 3 giorni
     - data odierna con nome del giorno
+    La pagina non aspetta mai OpenWeatherMap: se la città non è in cache
+    le previsioni vengono caricate dal browser tramite /api/forecast.
     """
     forecast = None
     error = None
@@ -218,7 +203,9 @@ def home():
 
     if request.method == "POST":
         city = request.form.get("city", "").strip()
-        forecast, error = get_weather_forecast(city)
+        cached = peek_weather_forecast(city)
+        if cached is not None:
+            forecast, error = cached
 
     return render_template(
         "home.html",
@@ -231,7 +218,58 @@ def home():
     )
 
 
+@app.route("/api/forecast")
+def api_forecast():
+    """
+    Previsioni di 3 giorni in JSON: /api/forecast?city=Roma
+    Se la città non è in cache risponde subito 202 (con Retry-After) mentre il
+    caricamento prosegue in background: il worker non resta fermo sulla rete.
+    """
+    city = request.args.get("city", "").strip()
+    cached = request_weather_forecast(city)
+    if cached is None:
+        return jsonify(city=city, pending=True), 202, {"Retry-After": "1"}
+    forecast, error = cached
+    if error:
+        status = 404 if error == CITY_NOT_FOUND else 400 if not city else 502
+        return jsonify(city=city, error=error), status
+    return jsonify(city=city, forecast=forecast)
+
+
+@app.route("/api/forecasts", methods=["GET", "POST"])
+def api_forecasts():
+    """
+    Previsioni per molte città, in streaming NDJSON (una riga JSON per città).
+    GET /api/forecasts?city=Roma&city=Milano oppure POST {"cities": [...]}
+    """
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        cities = body.get("cities") if isinstance(body, dict) else None
+        # una stringa verrebbe letta carattere per carattere, un dict per chiavi
+        if not isinstance(cities, list):
+            return jsonify(error="'cities' deve essere una lista di città."), 400
+    else:
+        cities = request.args.getlist("city")
+    cities = [c.strip() for c in cities if isinstance(c, str) and c.strip()]
+
+    if not cities:
+        return jsonify(error="Nessuna città indicata."), 400
+    if len(cities) > app.config["WEATHER_BATCH_MAX_CITIES"]:
+        return jsonify(error="Troppe città in una sola richiesta."), 400
+
+    def generate():
+        for city, forecast, error in get_weather_forecasts(cities):
+            if error:
+                line = {"city": city, "error": error}
+            else:
+                line = {"city": city, "forecast": forecast}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @app.route("/register", methods=["GET", "POST"])
+@cache_page
 def register():
     """
     Pagina di registrazione:
@@ -241,6 +279,10 @@ def register():
     - nickname (unico)
     """
     if request.method == "POST":
+        limiters = get_rate_limiters()
+        if limiters is not None and not limiters[0].hit(request.remote_addr):
+            return too_many_attempts()
+
         login_name = request.form.get("login", "").strip()
         password = request.form.get("password", "")
         confirm_password = request.form.get("confirm_password", "")
@@ -254,35 +296,26 @@ def register():
             flash("Le password non coincidono.", "danger")
             return redirect(url_for("register"))
 
-        conn = get_db_connection()
-        cur = conn.cursor()
+        users_repo = get_storage().users
 
-        # Verifica unicità login e nickname
-        cur.execute("SELECT id FROM users WHERE login = ?;", (login_name,))
-        if cur.fetchone():
+        # Verifica unicità login e nickname (prima di calcolare l'hash)
+        if users_repo.by_login(login_name) is not None:
             flash("Questo login è già in uso.", "danger")
-            conn.close()
             return redirect(url_for("register"))
 
-        cur.execute("SELECT id FROM users WHERE nickname = ?;", (nickname,))
-        if cur.fetchone():
+        if users_repo.nickname_taken(nickname):
             flash("Questo nickname è già in uso.", "danger")
-            conn.close()
             return redirect(url_for("register"))
 
-        password_hash = generate_password_hash(password)
-        created_at = datetime.now().isoformat(timespec="seconds")
+        with span("password_hash"):
+            password_hash = get_password_hasher().hash(password)
 
-        cur.execute(
-            """
-            INSERT INTO users (login, password_hash, nickname, total_score, created_at)
-            VALUES (?, ?, ?, 0, ?);
-            """,
-            (login_name, password_hash, nickname, created_at),
-        )
-        conn.commit()
-        user_id = cur.lastrowid
-        conn.close()
+        try:
+            user_id = users_repo.create(login_name, password_hash, nickname)
+        except DuplicateUser as exc:
+            # registrazione concorrente con gli stessi dati
+            flash(f"Questo {exc.field} è già in uso.", "danger")
+            return redirect(url_for("register"))
 
         # login automatico dopo registrazione
         session["user_id"] = user_id
@@ -293,6 +326,7 @@ def register():
 
 
 @app.route("/login", methods=["GET", "POST"])
+@cache_page
 def login():
     """
     Pagina di login: login + password
@@ -301,23 +335,60 @@ def login():
         login_name = request.form.get("login", "").strip()
         password = request.form.get("password", "")
 
-        conn = get_db_connection()
-        user = conn.execute(
-            "SELECT * FROM users WHERE login = ?;", (login_name,)
-        ).fetchone()
-        conn.close()
-
-        if user and check_password_hash(user["password_hash"], password):
+        # i limiti vengono controllati prima di fare qualsiasi hash e contano solo gli errori:
+        # per IP (i login riusciti di una classe dietro un NAT non si sommano) e per
+        # (login, IP), così chi sbaglia da altri IP non blocca il titolare
+        limiters = get_rate_limiters()
+        login_key = (login_name, request.remote_addr)
+        if limiters is not None and not (
+            limiters[0].allowed(request.remote_addr) and limiters[1].allowed(login_key)
+        ):
+            return too_many_attempts()
+
+        users_repo = get_storage().users
+        user = users_repo.by_login(login_name)
+
+        hasher = get_password_hasher()
+        with span("password_check"):
+            valid = user is not None and hasher.check(user["password_hash"], password)
+
+        if valid:
+            if limiters is not None:
+                limiters[1].reset(login_key)
+            # parametri di hashing cambiati: aggiorniamo l'hash ora che conosciamo la password
+            if hasher.needs_rehash(user["password_hash"]):
+                try:
+                    with span("password_rehash"):
+                        new_hash = hasher.rehash(password)
+                    users_repo.set_password_hash(user["id"], new_hash)
+                except HashingBusy:
+                    pass  # ci riproviamo al prossimo login
             session["user_id"] = user["id"]
             flash("Login effettuato con successo.", "success")
             return redirect(url_for("quiz"))
         else:
+            if limiters is not None:
+                limiters[0].hit(request.remote_addr)
+                limiters[1].hit(login_key)
             flash("Login o password errati.", "danger")
             return redirect(url_for("login"))
 
     return render_template("login.html", user=current_user())
 
 
+def too_many_attempts():
+    """Risposta 429 per login/registrazione oltre i limiti di tentativi."""
+    flash("Troppi tentativi. Riprova tra qualche minuto.", "danger")
+    return render_template(f"{request.endpoint}.html", user=current_user()), 429, {"Retry-After": "60"}
+
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(exc):
+    """Pool di hashing pieno: rispondiamo subito invece di accodare altre richieste."""
+    flash("Il server è molto carico, riprova tra qualche secondo.", "danger")
+    return render_template(f"{request.endpoint}.html", user=current_user()), 503, {"Retry-After": "2"}
+
+
 @app.route("/logout")
 def logout():
     """
@@ -340,13 +411,11 @@ def quiz():
     """
     user = current_user()
 
-    conn = get_db_connection()
-    # numero totale di domande
-    count_row = conn.execute("SELECT COUNT(*) AS c FROM questions;").fetchone()
-    total_questions = count_row["c"]
+    conn = get_db()
+    # prossima domanda del mazzo dell'utente (O(1), senza ripetizioni)
+    next_id = next_question_id(conn)
 
-    if total_questions == 0:
-        conn.close()
+    if next_id is None:
         flash("Non ci sono domande nel database.", "warning")
         return render_template("quiz.html", user=user, question=None)
 
@@ -354,53 +423,106 @@ def quiz():
         question_id = int(request.form.get("question_id"))
         selected_option = int(request.form.get("option"))
 
-        question = conn.execute(
-            "SELECT * FROM questions WHERE id = ?;", (question_id,)
-        ).fetchone()
-
-        if question and selected_option == question["correct_option"]:
-            # aggiorna punteggio utente
-            conn.execute(
-                "UPDATE users SET total_score = total_score + 1 WHERE id = ?;",
-                (user["id"],),
-            )
-            conn.commit()
+        correct, _ = submit_answer(conn, user["id"], question_id, selected_option)
+        if correct:
             flash("Risposta corretta! +1 punto.", "success")
+            # il nuovo punteggio arriva già dall'UPDATE ... RETURNING
+            user = current_user()
         else:
             flash("Risposta sbagliata, ritenta!", "danger")
 
-        # ricarichiamo utente aggiornato
-        user = conn.execute(
-            "SELECT * FROM users WHERE id = ?;", (user["id"],)
-        ).fetchone()
-
-    # scegliamo una domanda casuale
-    question_ids = [
-        row["id"] for row in conn.execute("SELECT id FROM questions;").fetchall()
-    ]
-    random_id = random.choice(question_ids)
-    question = conn.execute(
-        "SELECT * FROM questions WHERE id = ?;", (random_id,)
-    ).fetchone()
-    conn.close()
+    question = get_question(conn, next_id)
 
     return render_template("quiz.html", user=user, question=question)
 
 
+@app.route("/stats")
+@login_required
+def stats():
+    """
+    Statistiche del quiz, lette solo dalle tabelle aggregate:
+    - tentativi, risposte corrette e precisione dell'utente
+    - domande più giocate con la loro percentuale di risposte corrette
+    """
+    conn = get_db()
+    scores = get_storage().scores
+    user = current_user()
+    attempts, correct = scores.stats(user["id"])
+
+    question_rows = []
+    for row in scores.question_stats():
+        question = get_question(conn, row["question_id"])
+        question_rows.append(
+            {
+                "text": question.text if question else "(domanda eliminata)",
+                "attempts": row["attempts"],
+                "accuracy": round(100 * row["correct"] / row["attempts"]) if row["attempts"] else 0,
+            }
+        )
+
+    return render_template(
+        "stats.html",
+        user=user,
+        attempts=attempts,
+        correct=correct,
+        accuracy=round(100 * correct / attempts) if attempts else 0,
+        questions=question_rows,
+    )
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Metriche in formato Prometheus: latenze per route, query SQLite, cache e pool."""
+    gauges = {
+        "db_pool": db.pool_stats(),
+        "question_cache": questions.question_cache_stats(),
+        "user_cache": users.user_cache_stats(),
+        "forecast_cache": weather.forecast_cache_stats(),
+        "weather_client": weather.weather_client_stats(),
+        "passwords": passwords.password_stats(),
+        "page_cache": page_cache.page_cache_stats(),
+    }
+    return Response(metrics.render_metrics(gauges), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/leaderboard")
 def leaderboard():
     """
     Classifica del quiz: mostra nickname e punteggi.
+    - pagine da LEADERBOARD_PAGE_SIZE righe, ?after=score,id per la successiva
+    - posizione dell'utente loggato
+    La tabella è uguale per tutti: viene renderizzata una volta per versione della classifica.
     """
-    conn = get_db_connection()
-    players = conn.execute(
-        "SELECT nickname, total_score FROM users ORDER BY total_score DESC, id ASC;"
-    ).fetchall()
-    conn.close()
-    return render_template("leaderboard.html", players=players, user=current_user())
+    scores = get_storage().scores
+    user = current_user()
+    board = get_leaderboard()
+    after = parse_cursor(request.args.get("after"))
+    version = get_scores_clock().current(scores)
+
+    def render_table():
+        players, next_after, start_rank = board.page(scores, after, version)
+        return render_template(
+            "leaderboard_table.html",
+            players=players,
+            start_rank=start_rank,
+            next_after=next_after,
+        )
+
+    table = fragment(("leaderboard", after), version, render_table)
+    my_rank = board.rank(scores, user["total_score"], user["id"]) if user else None
+
+    return render_template(
+        "leaderboard.html",
+        table=Markup(table),
+        my_rank=my_rank,
+        user=user,
+    )
+
+
+# Crea o aggiorna il database se necessario (anche quando l'app gira sotto WSGI)
+init_db()
 
 
 if __name__ == "__main__":
-    # Crea il database se necessario
-    init_db()
     app.run(debug=True)
+
@@ -0,0 +1,870 @@
+"""
+Benchmark riproducibile dell'app Flask.
+
+Crea un database SQLite con N utenti e M domande (seed fisso), sostituisce
+OpenWeatherMap con un server finto locale e misura le route principali:
+- con il test client di Flask (costo in-process, un client alla volta)
+- con un vero server WSGI locale e più client in parallelo
+
+Esempio (dalla cartella pythonPRO/):
+    python bench.py --users 10000 --questions 50000 --output risultati.json
+    python bench.py --baseline risultati.json      # confronto con un run precedente
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASSWORD = "bench-password"
+
+
+# --- server meteo finto ---
+
+class FakeWeatherHandler(BaseHTTPRequestHandler):
+    """
+    OpenWeatherMap finto. I test ne fanno sottoclassi con altri `delay`/`status`
+    (404, 503...) e leggono `calls`, il numero di richieste ricevute.
+    """
+
+    delay = 0.02
+    status = 200
+    calls = 0
+    _calls_lock = threading.Lock()
+
+    def do_GET(self):
+        with self._calls_lock:
+            type(self).calls += 1
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        city = query.get("q", [""])[0]
+        time.sleep(self.delay)
+        if self.status != 200:
+            body = json.dumps({"cod": str(self.status), "message": "errore finto"}).encode()
+        else:
+            start = int(time.time()) // 86400 * 86400
+            body = json.dumps(
+                {
+                    "city": {"name": city, "timezone": 3600},
+                    "list": [
+                        {
+                            "dt": start + i * 10800,
+                            "main": {"temp": 10 + (i * 7) % 13},
+                            "weather": [{"description": ("sereno", "nuvoloso", "pioggia")[i % 3]}],
+                        }
+                        for i in range(40)
+                    ],
+                }
+            ).encode()
+        try:
+            self.send_response(self.status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # il client ha già rinunciato (timeout)
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_payload(city, rng):
+    """Risposta forecast (40 passi da 3 ore) come quella del server finto, con temperature casuali."""
+    start = int(time.time()) // 86400 * 86400
+    return {
+        "city": {"name": city, "timezone": 3600},
+        "list": [
+            {
+                "dt": start + i * 10800,
+                "main": {"temp": round(rng.uniform(-5, 30), 1)},
+                "weather": [{"description": rng.choice(("sereno", "nuvoloso", "pioggia"))}],
+            }
+            for i in range(40)
+        ],
+    }
+
+
+def start_fake_weather(handler=FakeWeatherHandler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/forecast"
+
+
+# --- database di prova ---
+
+def seed_database(path, n_users, n_questions, seed, hash_method):
+    """Popola il database (già creato da init_db) con dati deterministici."""
+    from werkzeug.security import generate_password_hash
+
+    from question_io import import_questions
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+
+    rows = (
+        {
+            "text": f"Domanda di prova numero {i}?",
+            "options": [f"Risposta {i}-{j}" for j in range(1, 5)],
+            "correct_option": rng.randint(1, 4),
+        }
+        for i in range(n_questions)
+    )
+    import_questions(conn, rows)
+
+    # stesso hash per tutti: l'hashing è volutamente lento e qui non serve ripeterlo
+    password_hash = generate_password_hash(PASSWORD, hash_method)
+    created_at = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (login, password_hash, nickname, total_score, created_at) "
+        "VALUES (?, ?, ?, ?, ?);",
+        (
+            (f"bench{i}", password_hash, f"giocatore{i}", rng.randint(0, 500), created_at)
+            for i in range(n_users)
+        ),
+    )
+    conn.commit()
+    conn.execute("ANALYZE;")
+    conn.close()
+
+
+# --- statistiche ---
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies, wall_time, errors, cpu_time=None):
+    latencies = sorted(latencies)
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / wall_time, 1) if wall_time else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+    if cpu_time is not None and latencies:
+        # tempo CPU del processo per richiesta (solo in-process: il test client)
+        result["cpu_ms"] = round(cpu_time / len(latencies) * 1000, 3)
+    return result
+
+
+# --- scenari ---
+
+def scenarios(n_users, n_questions, rng):
+    """(nome, metodo, path, funzione che genera il form) per ogni route misurata."""
+
+    def login_form(user_index):
+        return {"login": f"bench{user_index}", "password": PASSWORD}
+
+    def quiz_answer(user_index):
+        return {"question_id": str(rng.randint(1, max(1, n_questions))), "option": str(rng.randint(1, 4))}
+
+    return [
+        ("home GET", "GET", "/", None),
+        ("home POST", "POST", "/", lambda i: {"city": rng.choice(("Roma", "Milano", "Napoli", "Torino"))}),
+        ("api/forecast", "GET", "/api/forecast?city=Roma", None),
+        ("login POST", "POST", "/login", login_form),
+        ("quiz GET", "GET", "/quiz", None),
+        ("quiz POST", "POST", "/quiz", quiz_answer),
+        ("leaderboard", "GET", "/leaderboard", None),
+    ]
+
+
+def _measure(client, n_requests, method, path, make_form=None, headers=None, n_users=1,
+             make_json=None):
+    import metrics
+
+    latencies, errors, sent, queries = [], 0, 0, 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for i in range(n_requests):
+        form = make_form(i % max(1, n_users)) if make_form else None
+        body = make_json() if make_json else None
+        start = time.perf_counter()
+        resp = client.open(path, method=method, data=form, json=body, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        # il test client serve la richiesta in questo thread: i contatori sono i suoi
+        queries += metrics._local.queries
+        sent += len(resp.get_data())
+        if resp.status_code >= 400:
+            errors += 1
+    result = summarize(
+        latencies, time.perf_counter() - wall_start, errors, time.process_time() - cpu_start
+    )
+    result["bytes"] = sent // max(1, n_requests)
+    if client.application.config["METRICS_ENABLED"]:
+        result["queries"] = round(queries / max(1, n_requests), 2)
+    return result
+
+
+def run_test_client(app, n_requests, n_users, n_questions, seed):
+    results = {}
+
+    # visitatore non loggato: pagine servite dalla cache e 304 con If-None-Match
+    anonymous = app.test_client()
+    etag = anonymous.get("/").headers.get("ETag")
+    for name, path, headers in (
+        ("anon home GET", "/", None),
+        ("anon login GET", "/login", None),
+        ("anon register", "/register", None),
+        ("anon home 304", "/", {"If-None-Match": etag} if etag else None),
+    ):
+        results[name] = _measure(anonymous, n_requests, "GET", path, headers=headers)
+        print(f"  [test client] {name:14s} {results[name]}")
+
+    rng = random.Random(seed)
+    client = app.test_client()
+    # utente loggato per le pagine protette
+    client.post("/login", data={"login": "bench0", "password": PASSWORD})
+    for name, method, path, make_form in scenarios(n_users, n_questions, rng):
+        results[name] = _measure(client, n_requests, method, path, make_form, n_users=n_users)
+        print(f"  [test client] {name:14s} {results[name]}")
+
+    # stesso giro del quiz tramite l'API JSON, con compressione negoziata
+    compressed = {"Accept-Encoding": "br, gzip"}
+
+    def api_answer():
+        # l'API accetta solo la domanda servita per ultima (fuori dal tempo misurato)
+        with client.session_transaction() as sess:
+            question_id = sess.get("quiz_question_id")
+        return {"question_id": question_id, "option": rng.randint(1, 4)}
+
+    for name, method, path, make_json in (
+        ("api quiz next", "GET", "/api/quiz/next", None),
+        ("api quiz answer", "POST", "/api/quiz/answer", api_answer),
+        ("api leaderboard", "GET", "/api/leaderboard?limit=20", None),
+    ):
+        results[name] = _measure(client, n_requests, method, path, headers=compressed, make_json=make_json)
+        print(f"  [test client] {name:14s} {results[name]}")
+    return results
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _client(base_url, user_index):
+    """Opener con cookie di sessione, già loggato come bench<user_index>."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect)
+    data = urllib.parse.urlencode({"login": f"bench{user_index}", "password": PASSWORD}).encode()
+    try:
+        opener.open(base_url + "/login", data=data, timeout=30)
+    except urllib.error.HTTPError:
+        pass  # 302 verso /quiz: il cookie è già nel jar
+    return opener
+
+
+def start_app_server(app):
+    """Server WSGI locale multi-thread, senza log delle richieste."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_server(app, n_requests, concurrency, n_users, n_questions, seed):
+    server, base_url = start_app_server(app)
+
+    openers = [_client(base_url, i % max(1, n_users)) for i in range(concurrency)]
+    results = {}
+    try:
+        for name, method, path, make_form in scenarios(n_users, n_questions, random.Random(seed)):
+            latencies, errors = [], [0]
+            lock = threading.Lock()
+            per_client = max(1, n_requests // concurrency)
+
+            def worker(k):
+                rng = random.Random(seed + k)
+                local = []
+                local_errors = 0
+                for i in range(per_client):
+                    form = None
+                    if make_form:
+                        form = urllib.parse.urlencode(make_form(rng.randrange(max(1, n_users)))).encode()
+                    start = time.perf_counter()
+                    try:
+                        with openers[k].open(base_url + path, data=form if method == "POST" else None, timeout=30) as resp:
+                            resp.read()
+                    except urllib.error.HTTPError as exc:
+                        if exc.code >= 400:
+                            local_errors += 1
+                    except OSError:
+                        local_errors += 1
+                    local.append(time.perf_counter() - start)
+                with lock:
+                    latencies.extend(local)
+                    errors[0] += local_errors
+
+            wall_start = time.perf_counter()
+            threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            results[name] = summarize(latencies, time.perf_counter() - wall_start, errors[0])
+            print(f"  [server x{concurrency}] {name:14s} {results[name]}")
+    finally:
+        server.shutdown()
+    return results
+
+
+def run_mixed(app, n_requests, concurrency, n_users, seed):
+    """
+    Login e quiz insieme: metà dei client fa login, l'altra metà gioca.
+    Mostra quanto il costo dell'hashing delle password rallenta le altre route.
+    """
+    server, base_url = start_app_server(app)
+
+    openers = [_client(base_url, i % max(1, n_users)) for i in range(concurrency)]
+    latencies = {"login": [], "quiz": []}
+    errors = {"login": 0, "quiz": 0}
+    finished = {"login": 0.0, "quiz": 0.0}
+    lock = threading.Lock()
+    per_client = max(1, n_requests // concurrency)
+
+    def worker(k):
+        rng = random.Random(seed + k)
+        kind = "login" if k % 2 == 0 else "quiz"
+        local, local_errors = [], 0
+        for _ in range(per_client):
+            data = None
+            path = "/quiz"
+            if kind == "login":
+                path = "/login"
+                data = urllib.parse.urlencode(
+                    {"login": f"bench{rng.randrange(max(1, n_users))}", "password": PASSWORD}
+                ).encode()
+            start = time.perf_counter()
+            try:
+                with openers[k].open(base_url + path, data=data, timeout=30) as resp:
+                    resp.read()
+            except urllib.error.HTTPError as exc:
+                if exc.code >= 400:
+                    local_errors += 1
+            except OSError:
+                local_errors += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies[kind].extend(local)
+            errors[kind] += local_errors
+            finished[kind] = max(finished[kind], time.perf_counter())
+
+    try:
+        wall_start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        server.shutdown()
+
+    results = {}
+    for kind in ("login", "quiz"):
+        results[f"{kind} (mixed)"] = summarize(latencies[kind], finished[kind] - wall_start, errors[kind])
+        print(f"  [mixed x{concurrency}] {kind:14s} {results[f'{kind} (mixed)']}")
+    return results
+
+
+def run_answers(app, n_requests, concurrency, n_users, n_questions, seed):
+    """Risposte al quiz in parallelo (POST /api/quiz/answer su un server locale)."""
+    server, base_url = start_app_server(app)
+    openers = [_client(base_url, i % max(1, n_users)) for i in range(concurrency)]
+    per_client = max(1, n_requests // concurrency)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(k):
+        rng = random.Random(seed + k)
+        local, local_errors = [], 0
+        # ogni risposta porta la domanda successiva, l'unica a cui l'API permette di rispondere
+        with openers[k].open(base_url + "/api/quiz/next", timeout=30) as resp:
+            question = json.load(resp)["question"]
+        for _ in range(per_client):
+            body = json.dumps(
+                {"question_id": question["id"] if question else None, "option": rng.randint(1, 4)}
+            ).encode()
+            req = urllib.request.Request(
+                base_url + "/api/quiz/answer", data=body, headers={"Content-Type": "application/json"}
+            )
+            start = time.perf_counter()
+            try:
+                with openers[k].open(req, timeout=30) as resp:
+                    question = json.load(resp)["next"]
+            except OSError:
+                local_errors += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    try:
+        wall_start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        result = summarize(latencies, time.perf_counter() - wall_start, errors[0])
+    finally:
+        server.shutdown()
+    print(f"  [answers x{concurrency}] {result}")
+    return result
+
+
+def _open_storage(paths, pool_size=2):
+    from storage import open_sharded, open_sqlite
+
+    if len(paths) == 1:
+        return open_sqlite(paths[0], pool_size=pool_size)
+    return open_sharded(paths, pool_size=pool_size)
+
+
+def _storage_writer(paths, user_ids, count, seed):
+    """Processo che registra `count` risposte, una transazione ciascuna."""
+    from answers import Answer
+
+    rng = random.Random(seed)
+    storage = _open_storage(paths)
+    latencies, errors = [], 0
+    started = time.time()
+    try:
+        for _ in range(count):
+            option = rng.randint(1, 4)
+            answer = Answer(rng.choice(user_ids), rng.randint(1, 100), option, option == 1)
+            start = time.perf_counter()
+            try:
+                storage.scores.record([answer])
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    finally:
+        storage.close()
+    return latencies, errors, started, time.time()
+
+
+def run_storage(shard_counts, n_users, n_requests, concurrency, seed):
+    """
+    Throughput delle scritture (risposte registrate) con 1 file SQLite e con N shard.
+    Gli scrittori sono `concurrency` processi, come i worker di un server WSGI:
+    su un solo file si contendono il lock di scrittura, con più shard no.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    for count in shard_counts:
+        workdir = tempfile.mkdtemp(prefix="quiz-storage-")
+        paths = [os.path.join(workdir, f"shard{i}.db") for i in range(count)]
+        storage = _open_storage(paths)
+        try:
+            user_ids = [storage.users.create(f"bench{i}", "x", f"giocatore{i}") for i in range(n_users)]
+            storage.questions.add_many(
+                {"text": f"Domanda {i}?", "options": ["a", "b", "c", "d"], "correct_option": 1}
+                for i in range(100)
+            )
+        finally:
+            storage.close()
+
+        per_writer = max(1, n_requests // concurrency)
+        with ProcessPoolExecutor(max_workers=concurrency) as executor:
+            runs = list(executor.map(
+                _storage_writer,
+                [paths] * concurrency,
+                [user_ids] * concurrency,
+                [per_writer] * concurrency,
+                [seed + k for k in range(concurrency)],
+            ))
+        latencies = [value for run in runs for value in run[0]]
+        errors = sum(run[1] for run in runs)
+        wall_time = max(run[3] for run in runs) - min(run[2] for run in runs)
+        name = "sqlite" if count == 1 else f"sharded x{count}"
+        results[name] = summarize(latencies, wall_time, errors)
+        print(f"  [storage x{concurrency}] {name:14s} {results[name]}")
+    return results
+
+
+def run_deck(sizes, n_requests, seed):
+    """
+    Costo per richiesta della scelta della prossima domanda al crescere della banca:
+    mazzo con rete di Feistel (quello dell'app) contro un mescolamento completo
+    con random.Random(seed).shuffle, da rifare per ogni richiesta se in sessione
+    si tiene solo il seed.
+    """
+    from array import array
+
+    from questions import deck_position
+
+    results = {}
+    rng = random.Random(seed)
+    for n in sizes:
+        ids = array("I", range(1, n + 1))
+        key = rng.randbytes(16)
+        latencies = []
+        wall_start = time.perf_counter()
+        for pos in range(n_requests):
+            start = time.perf_counter()
+            ids[deck_position(key, n, pos % n)]
+            latencies.append(time.perf_counter() - start)
+        results[f"feistel n={n}"] = summarize(latencies, time.perf_counter() - wall_start, 0)
+        print(f"  [deck] feistel n={n:<9d} {results[f'feistel n={n}']}")
+
+        latencies = []
+        wall_start = time.perf_counter()
+        for pos in range(max(1, min(n_requests, 2_000_000 // n))):
+            start = time.perf_counter()
+            order = list(ids)
+            random.Random(seed).shuffle(order)
+            order[pos % n]
+            latencies.append(time.perf_counter() - start)
+        results[f"shuffle n={n}"] = summarize(latencies, time.perf_counter() - wall_start, 0)
+        print(f"  [deck] shuffle n={n:<9d} {results[f'shuffle n={n}']}")
+    return results
+
+
+def run_forecast(app, n_cities, concurrency, upstream_delay):
+    """
+    /api/forecast per città mai viste, con il server meteo finto lento di `upstream_delay` s:
+    quanto resta occupato il worker (prima risposta, 202) e dopo quanto arrivano i dati
+    (i client riprovano ogni 20 ms, come la pagina ma più spesso).
+    """
+    FakeWeatherHandler.delay, previous = upstream_delay, FakeWeatherHandler.delay
+    server, base_url = start_app_server(app)
+    first, ready, errors = [], [], [0]
+    lock = threading.Lock()
+    per_client = max(1, n_cities // concurrency)
+
+    def worker(k):
+        local_first, local_ready, local_errors = [], [], 0
+        for i in range(per_client):
+            url = f"{base_url}/api/forecast?city=" + urllib.parse.quote(f"Città {k}-{i}")
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as resp:
+                    resp.read()
+                    status = resp.status
+                local_first.append(time.perf_counter() - start)
+                while status == 202:
+                    time.sleep(0.02)
+                    with urllib.request.urlopen(url, timeout=30) as resp:
+                        resp.read()
+                        status = resp.status
+            except OSError:
+                local_errors += 1
+            local_ready.append(time.perf_counter() - start)
+        with lock:
+            first.extend(local_first)
+            ready.extend(local_ready)
+            errors[0] += local_errors
+
+    try:
+        wall_start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall_time = time.perf_counter() - wall_start
+    finally:
+        server.shutdown()
+        FakeWeatherHandler.delay = previous
+
+    results = {
+        "prima risposta": summarize(first, wall_time, errors[0]),
+        "dati pronti": summarize(ready, wall_time, errors[0]),
+    }
+    for name, result in results.items():
+        print(f"  [forecast x{concurrency}] {name:14s} {result}")
+    return results
+
+
+def baseline_aggregate_forecast(data):
+    """
+    Copia dell'aggregazione di partenza (dict di liste, date come stringhe e
+    max(set(...), key=list.count)), solo come riferimento per --mode aggregate.
+    """
+    daily = {}
+    for item in data["list"]:
+        dt = datetime.fromtimestamp(item["dt"])
+        date_str = dt.date().isoformat()
+        temp = item["main"]["temp"]
+        desc = item["weather"][0]["description"]
+
+        if date_str not in daily:
+            daily[date_str] = {
+                "temps": [temp],
+                "descriptions": [desc],
+            }
+        else:
+            daily[date_str]["temps"].append(temp)
+            daily[date_str]["descriptions"].append(desc)
+
+    result = []
+    for date_str in sorted(daily.keys())[:3]:
+        temps = daily[date_str]["temps"]
+        descriptions = daily[date_str]["descriptions"]
+        description = max(set(descriptions), key=descriptions.count)
+        dt_date = datetime.fromisoformat(date_str)
+        result.append(
+            {
+                "date": dt_date.strftime("%d/%m/%Y"),
+                "weekday": dt_date.strftime("%A"),
+                "temp_min": round(min(temps), 1),
+                "temp_max": round(max(temps), 1),
+                "description": description,
+            }
+        )
+    return result
+
+
+def run_aggregate(city_counts, n_requests, seed):
+    """
+    Costo dell'aggregazione per N risposte meteo, versione di partenza contro
+    aggregate_forecast. Va confrontato con la latenza di OpenWeatherMap (decine di ms
+    per città): un'aggregazione costa ~0.1 ms.
+    """
+    from forecast import aggregate_forecast
+
+    rng = random.Random(seed)
+    results = {}
+    for count in city_counts:
+        payloads = [fake_payload(f"città{i}", rng) for i in range(count)]
+        rounds = max(3, n_requests // count)
+        for label, aggregate in (("prima", baseline_aggregate_forecast), ("dopo", aggregate_forecast)):
+            latencies = []
+            wall_start = time.perf_counter()
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for data in payloads:
+                    aggregate(data)
+                latencies.append(time.perf_counter() - start)
+            name = f"{label} x{count}"
+            results[name] = summarize(latencies, time.perf_counter() - wall_start, 0)
+            print(f"  [aggregate] {name:16s} {results[name]}")
+    return results
+
+
+def _best_time(func, n=20000, rounds=5):
+    """Secondi per chiamata, il migliore di `rounds` giri."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        best = min(best, (time.perf_counter() - start) / n)
+    return best
+
+
+def run_metrics_overhead(app, db_path, testclient, target=0.02):
+    """
+    Costo della strumentazione rispetto al tempo CPU di ogni route del test client.
+    La differenza tra due processi con METRICS_ENABLED=0 e =1 sta sotto il rumore della
+    misura (qualche punto percentuale tra giri identici), quindi si misurano i pezzi: gli
+    hook di inizio/fine richiesta e il costo in più di una query su TimedConnection,
+    moltiplicato per le query della route.
+    """
+    if not app.config["METRICS_ENABLED"]:
+        print("  [metriche] METRICS_ENABLED=0: niente da misurare")
+        return {}
+    import metrics
+
+    response = app.response_class("")
+    with app.test_request_context("/bench-metrics"):
+        hooks = _best_time(lambda: (metrics._before_request(), metrics._after_request(response)))
+
+    sql = "SELECT id, nickname, total_score FROM users WHERE id = ?;"
+    plain = sqlite3.connect(db_path, check_same_thread=False)
+    timed = sqlite3.connect(db_path, check_same_thread=False, factory=metrics.TimedConnection)
+    try:
+        per_query = max(
+            0.0,
+            _best_time(lambda: timed.execute(sql, (1,)).fetchone())
+            - _best_time(lambda: plain.execute(sql, (1,)).fetchone()),
+        )
+    finally:
+        plain.close()
+        timed.close()
+    print(f"  [metriche] hook per richiesta {hooks * 1e6:.2f} us, per query {per_query * 1e6:.2f} us")
+
+    results = {"hooks_us": round(hooks * 1e6, 2), "per_query_us": round(per_query * 1e6, 2)}
+    total_cost = total_cpu = 0.0
+    for name, route in testclient.items():
+        cost = hooks + route.get("queries", 0) * per_query
+        cpu = route["cpu_ms"] / 1000
+        total_cost += cost
+        total_cpu += cpu
+        results[name] = {"cost_us": round(cost * 1e6, 2), "overhead_pct": round(cost / cpu * 100, 2)}
+        print(f"  [metriche] {name:16s} {route['cpu_ms']:.3f} ms CPU, "
+              f"{route.get('queries', 0)} query -> {results[name]['overhead_pct']:+.2f}%")
+    overhead = total_cost / total_cpu if total_cpu else 0.0
+    results["total_pct"] = round(overhead * 100, 2)
+    print(f"  [metriche] totale {overhead * 100:+.2f}% "
+          f"({'ok' if overhead <= target else 'oltre'} l'obiettivo del {target * 100:.0f}%)")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Stampa le differenze con il baseline; ritorna False se qualcosa peggiora oltre la tolleranza."""
+    ok = True
+    for mode, routes in results["results"].items():
+        for name, current in routes.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            slower = previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance)
+            fewer = previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - tolerance)
+            flag = "REGRESSIONE" if slower or fewer else "ok"
+            ok = ok and not (slower or fewer)
+            print(
+                f"{mode:12s} {name:14s} p95 {previous['p95_ms']:>9.3f} -> {current['p95_ms']:>9.3f} ms   "
+                f"req/s {previous['throughput']:>8.1f} -> {current['throughput']:>8.1f}   {flag}"
+            )
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark delle route dell'app quiz.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=300, help="richieste per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--mode",
+        choices=("all", "testclient", "server", "mixed", "answers", "storage", "deck", "aggregate", "forecast",
+                 "metrics"),
+        default="all",
+    )
+    parser.add_argument("--shards", default="1,2,4",
+                        help="numeri di shard da confrontare nello scenario storage")
+    parser.add_argument("--deck-sizes", default="10,1000,100000,1000000",
+                        help="numeri di domande per lo scenario deck")
+    parser.add_argument("--cities", default="1,10,100,1000",
+                        help="numeri di città per lo scenario aggregate")
+    parser.add_argument("--upstream-delay", type=float, default=0.5,
+                        help="latenza del server meteo finto nello scenario forecast (s)")
+    parser.add_argument("--no-page-cache", action="store_true",
+                        help="disattiva cache delle pagine e dei frammenti (per il confronto)")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="lascia attivi i limiti sui tentativi di login (di default spenti)")
+    parser.add_argument("--output", help="salva i risultati in JSON")
+    parser.add_argument("--baseline", help="JSON di un run precedente da confrontare")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="quiz-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    os.environ["QUIZ_DATABASE"] = db_path
+
+    weather_server, weather_url = start_fake_weather()
+
+    import app as quiz_app  # crea lo schema nel database di prova
+    from passwords import get_password_hasher
+    from questions import get_question_bank
+
+    app = quiz_app.app
+    app.config["OPENWEATHER_URL"] = weather_url
+    app.config["RATE_LIMIT_ENABLED"] = args.rate_limit
+    app.config["PAGE_CACHE_ENABLED"] = not args.no_page_cache
+    with app.app_context():
+        hash_method = get_password_hasher().method
+    seed_database(db_path, args.users, args.questions, args.seed, hash_method)
+    with app.app_context():
+        # domande aggiunte fuori dall'app: la versione in cache è quella di init_db
+        get_question_bank().invalidate()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "users": args.users,
+            "questions": args.questions,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "metrics_enabled": app.config["METRICS_ENABLED"],
+            "password_hash": hash_method,
+            "password_hash_workers": app.config["PASSWORD_HASH_WORKERS"],
+            "page_cache": app.config["PAGE_CACHE_ENABLED"],
+        },
+        "results": {},
+    }
+
+    print(f"Database di prova: {db_path} ({args.users} utenti, {args.questions} domande)")
+    if args.mode in ("all", "testclient", "metrics"):
+        results["results"]["testclient"] = run_test_client(
+            app, args.requests, args.users, args.questions, args.seed
+        )
+    if args.mode in ("all", "metrics"):
+        results["results"]["metrics"] = run_metrics_overhead(
+            app, db_path, results["results"]["testclient"]
+        )
+    if args.mode in ("all", "server"):
+        results["results"]["server"] = run_server(
+            app, args.requests, args.concurrency, args.users, args.questions, args.seed
+        )
+    if args.mode in ("all", "mixed"):
+        results["results"]["mixed"] = run_mixed(
+            app, args.requests, args.concurrency, args.users, args.seed
+        )
+    if args.mode in ("all", "answers"):
+        results["results"]["answers"] = run_answers(
+            app, args.requests * 4, args.concurrency, args.users, args.questions, args.seed
+        )
+    if args.mode in ("all", "storage"):
+        results["results"]["storage"] = run_storage(
+            [int(n) for n in args.shards.split(",")], args.users, args.requests * 10,
+            args.concurrency, args.seed
+        )
+    if args.mode in ("all", "deck"):
+        results["results"]["deck"] = run_deck(
+            [int(n) for n in args.deck_sizes.split(",")], args.requests * 10, args.seed
+        )
+    if args.mode in ("all", "forecast"):
+        results["results"]["forecast"] = run_forecast(
+            app, args.requests, args.concurrency, args.upstream_delay
+        )
+    if args.mode in ("all", "aggregate"):
+        results["results"]["aggregate"] = run_aggregate(
+            [int(n) for n in args.cities.split(",")], args.requests * 10, args.seed
+        )
+    weather_server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Risultati salvati in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # senza il pacchetto brotli si usa solo gzip
+    brotli = None
+
+COMPRESSIBLE = ("text/html", "text/css", "application/json", "text/plain")
+
+
+def _accepted(header):
+    """Codifiche accettate dal client (quelle con q=0 sono escluse)."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = _accepted(header or "")
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def init_app(app):
+    app.config.setdefault("COMPRESS_ENABLED", True)
+    app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+    app.config.setdefault("COMPRESS_GZIP_LEVEL", 6)
+    app.config.setdefault("COMPRESS_BROTLI_QUALITY", 4)
+
+    @app.after_request
+    def compress(response):
+        """gzip/brotli delle risposte testuali, secondo Accept-Encoding."""
+        if not app.config["COMPRESS_ENABLED"]:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE
+        ):
+            return response
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+            return response
+
+        # rappresentazioni diverse devono avere ETag diversi
+        etag, weak = response.get_etag()
+        if etag:
+            etag = f"{etag}-{encoding}"
+            response.set_etag(etag, weak)
+            if request.if_none_match.contains(etag):
+                return response  # diventerà un 304: inutile comprimere
+
+        if encoding == "br":
+            data = brotli.compress(data, quality=app.config["COMPRESS_BROTLI_QUALITY"])
+        else:
+            # mtime=0: stesso input -> stessi byte, così anche l'ETag resta stabile
+            data = gzip.compress(data, compresslevel=app.config["COMPRESS_GZIP_LEVEL"], mtime=0)
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        return response
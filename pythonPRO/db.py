@@ -0,0 +1,185 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g
+
+
+class ConnectionPool:
+    """
+    Pool limitato e thread-safe di connessioni SQLite.
+    Ogni connessione viene configurata (WAL, synchronous, busy_timeout)
+    una sola volta, quando viene aperta.
+    """
+
+    def __init__(self, database, max_size=8, busy_timeout_ms=5000, acquire_timeout=10.0,
+                 factory=sqlite3.Connection):
+        self.database = database
+        self.factory = factory
+        self.max_size = max_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+
+        # statistiche per dimensionare il pool
+        self.hits = 0  # connessione riusata dal pool
+        self.misses = 0  # nuova connessione aperta
+        self.waits = 0  # richieste che hanno dovuto aspettare
+        self.wait_time = 0.0
+        self.max_in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            factory=self.factory,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)};")
+        return conn
+
+    def acquire(self):
+        with self._cond:
+            if not self._idle and self._open >= self.max_size:
+                self.waits += 1
+                start = time.perf_counter()
+                deadline = start + self.acquire_timeout
+                while not self._idle and self._open >= self.max_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise TimeoutError("Nessuna connessione al database disponibile.")
+                    self._cond.wait(remaining)
+                self.wait_time += time.perf_counter() - start
+
+            if self._idle:
+                self.hits += 1
+                conn = self._idle.pop()
+                self._track_in_use()
+                return conn
+
+            # apriamo la connessione fuori dal lock, ma riserviamo il posto
+            self._open += 1
+            self.misses += 1
+            self._track_in_use()
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _track_in_use(self):
+        in_use = self._open - len(self._idle)
+        if in_use > self.max_in_use:
+            self.max_in_use = in_use
+
+    def release(self, conn):
+        # una transazione lasciata aperta non deve passare alla richiesta successiva
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Connessione presa in prestito fuori da una richiesta (thread, CLI...)."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "max_in_use": self.max_in_use,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 6),
+            }
+
+
+def init_app(app):
+    """Registra il pool nell'app e la restituzione della connessione a fine contesto."""
+    app.config.setdefault("DB_POOL_SIZE", 8)
+    app.config.setdefault("DB_BUSY_TIMEOUT_MS", 5000)
+    app.config.setdefault("DB_ACQUIRE_TIMEOUT", 10.0)
+    app.config.setdefault("DB_CONNECTION_FACTORY", sqlite3.Connection)
+    app.teardown_appcontext(close_db)
+
+
+_pool_lock = threading.Lock()
+
+
+def get_pool(app=None):
+    """Ritorna il pool dell'app, creandolo al primo utilizzo."""
+    app = app or current_app
+    pool = app.extensions.get("db_pool")
+    if pool is not None and pool.database == app.config["DATABASE"]:
+        return pool
+    with _pool_lock:
+        pool = app.extensions.get("db_pool")
+        if pool is None or pool.database != app.config["DATABASE"]:
+            if pool is not None:
+                pool.close_all()
+            pool = ConnectionPool(
+                app.config["DATABASE"],
+                max_size=app.config["DB_POOL_SIZE"],
+                busy_timeout_ms=app.config["DB_BUSY_TIMEOUT_MS"],
+                acquire_timeout=app.config["DB_ACQUIRE_TIMEOUT"],
+                factory=app.config["DB_CONNECTION_FACTORY"],
+            )
+            app.extensions["db_pool"] = pool
+    return pool
+
+
+def get_db():
+    """Una sola connessione per richiesta, presa dal pool e legata a flask.g."""
+    if "db" not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+def pool_stats():
+    return get_pool().stats()
@@ -0,0 +1,54 @@
+from collections import Counter
+from datetime import date, timedelta
+
+EPOCH = date(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+
+def tz_offset(data):
+    """Offset in secondi della città (campo city.timezone dell'API), 0 se assente."""
+    return (data.get("city") or {}).get("timezone") or 0
+
+
+def _day(day_number, temp_min, temp_max, description):
+    day = EPOCH + timedelta(days=int(day_number))
+    return {
+        "date": day.strftime("%d/%m/%Y"),
+        "weekday": day.strftime("%A"),  # es. Monday
+        "temp_min": round(float(temp_min), 1),
+        "temp_max": round(float(temp_max), 1),
+        "description": description,
+    }
+
+
+def aggregate_forecast(data, days=3, offset=None):
+    """
+    Riduce una risposta forecast di OpenWeatherMap (5-day/3-hour o oraria)
+    ai primi `days` giorni: {date, weekday, temp_min, temp_max, description}.
+    Un solo passaggio sui dati con min/max progressivi e un Counter per le descrizioni;
+    i giorni sono quelli locali della città (city.timezone).
+    """
+    if offset is None:
+        offset = tz_offset(data)
+
+    daily = {}
+    for item in data["list"]:
+        day = (item["dt"] + offset) // SECONDS_PER_DAY
+        temp = item["main"]["temp"]
+        desc = item["weather"][0]["description"]
+
+        acc = daily.get(day)
+        if acc is None:
+            daily[day] = [temp, temp, Counter((desc,))]
+        else:
+            if temp < acc[0]:
+                acc[0] = temp
+            elif temp > acc[1]:
+                acc[1] = temp
+            acc[2][desc] += 1
+
+    return [
+        _day(day, acc[0], acc[1], acc[2].most_common(1)[0][0])
+        for day, acc in sorted(daily.items())[:days]
+    ]
+
@@ -0,0 +1,208 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from flask import current_app
+
+from questions import VersionClock
+
+PAGE_QUERY = """
+    SELECT id, nickname, total_score FROM users
+    ORDER BY total_score DESC, id ASC
+    LIMIT ?;
+"""
+
+# keyset pagination: righe che vengono dopo (score, id) nell'ordinamento
+PAGE_AFTER_QUERY = """
+    SELECT id, nickname, total_score FROM users
+    WHERE total_score <= ? AND (total_score < ? OR id > ?)
+    ORDER BY total_score DESC, id ASC
+    LIMIT ?;
+"""
+
+RANK_QUERY = "SELECT total_score, id FROM users ORDER BY total_score DESC, id ASC;"
+
+# utenti che stanno davanti in classifica (score desc, id asc): due range sull'indice, senza OR
+COUNT_AHEAD_QUERY = """
+    SELECT (SELECT COUNT(*) FROM users WHERE total_score > ?)
+         + (SELECT COUNT(*) FROM users WHERE total_score = ? AND id < ?);
+"""
+
+
+def scores_version(conn):
+    """Contatore incrementato dai trigger quando cambia la classifica (punteggi, utenti)."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'scores_version';").fetchone()
+    return row[0] if row else 0
+
+
+def rank_key(score, user_id):
+    """Chiave crescente nello stesso ordine della classifica (score desc, id asc)."""
+    return (-score << 32) | user_id
+
+
+def parse_cursor(value):
+    """'score,id' -> (score, id); None se assente o non valido."""
+    if not value:
+        return None
+    try:
+        score, user_id = value.split(",")
+        return int(score), int(user_id)
+    except ValueError:
+        return None
+
+
+class Leaderboard:
+    """
+    Classifica materializzata, letta dal ScoreRepo dello storage (un file o più shard):
+    - snapshot della top-N, riletta solo quando avanza la versione della classifica
+    - pagine successive con keyset pagination sull'indice (total_score DESC, id)
+    - posizione di un utente in O(log N) con bisect su un array ordinato di chiavi
+      (approssimata: al più rank_ttl secondi di ritardo)
+    """
+
+    def __init__(self, app, page_size=50, rank_ttl=30.0):
+        self.app = app
+        self.page_size = page_size
+        self.rank_ttl = rank_ttl
+
+        self._top = None
+        self._top_version = None
+        self._keys = None
+        self._keys_at = 0.0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _load_keys(self, scores):
+        self._keys = array("q", (rank_key(score, user_id) for score, user_id in scores.rank_keys()))
+        self._keys_at = time.monotonic()
+
+    def _refresh_in_background(self, name, loader, scores):
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+
+        def run():
+            try:
+                # connessioni prese e rilasciate come in una richiesta
+                with self.app.app_context():
+                    loader(scores)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(name)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _fresh(self, name, scores, loaded_at, ttl, loader):
+        """Carica in modo sincrono solo la prima volta, poi stale-while-revalidate."""
+        if getattr(self, name) is None:
+            loader(scores)
+        elif time.monotonic() - loaded_at > ttl:
+            self._refresh_in_background(name, loader, scores)
+        return getattr(self, name)
+
+    def top(self, scores, version):
+        """
+        Prima pagina (page_size + 1 righe), riletta dallo storage quando `version` (della
+        classifica) è diversa da quella dello snapshot, o è None.
+        """
+        with self._lock:
+            if version is not None and version == self._top_version:
+                return self._top
+        rows = scores.top(self.page_size + 1)
+        with self._lock:
+            self._top, self._top_version = rows, version
+        return rows
+
+    def rank(self, scores, score, user_id):
+        """Posizione (1-based) di un utente con il punteggio dato."""
+        keys = self._fresh("_keys", scores, self._keys_at, self.rank_ttl, self._load_keys)
+        return bisect_left(keys, rank_key(score, user_id)) + 1
+
+    def page(self, scores, after=None, version=None):
+        """
+        Ritorna (righe, cursore della pagina successiva, posizione della prima riga).
+        Le righe hanno le colonne id, nickname, total_score.
+        `version` è la versione della classifica sotto cui il risultato verrà messo in
+        cache: righe e posizioni sono allora lette dallo storage, non dagli snapshot.
+        """
+        if after is None:
+            rows = self.top(scores, version)
+            start_rank = 1
+        else:
+            score, user_id = after
+            rows = scores.top(self.page_size + 1, after)
+            if version is None:
+                start_rank = self.rank(scores, score, user_id) + 1
+            else:
+                # utenti fino al cursore compreso
+                start_rank = scores.count_ahead(score, user_id + 1) + 1
+
+        next_after = None
+        if len(rows) > self.page_size:
+            rows = rows[: self.page_size]
+            last = rows[-1]
+            next_after = f"{last['total_score']},{last['id']}"
+        return rows, next_after, start_rank
+
+
+def init_app(app):
+    app.config.setdefault("LEADERBOARD_PAGE_SIZE", 50)
+    app.config.setdefault("LEADERBOARD_RANK_TTL", 30.0)
+    app.config.setdefault("LEADERBOARD_VERSION_CHECK_INTERVAL", 1.0)
+
+
+def create_version_triggers(conn):
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('scores_version', 0);")
+    for name, event in (
+        ("insert", "INSERT"), ("delete", "DELETE"), ("score", "UPDATE OF total_score, nickname")
+    ):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS scores_version_{name}
+            AFTER {event} ON users
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'scores_version';
+            END;
+            """
+        )
+
+
+def get_scores_clock():
+    """
+    Versione della classifica letta al massimo una volta ogni LEADERBOARD_VERSION_CHECK_INTERVAL.
+    current() vuole il ScoreRepo dello storage.
+    """
+    clock = current_app.extensions.get("scores_clock")
+    if clock is None:
+        clock = current_app.extensions.setdefault(
+            "scores_clock",
+            VersionClock(
+                current_app.config["LEADERBOARD_VERSION_CHECK_INTERVAL"], read=lambda scores: scores.version()
+            ),
+        )
+    return clock
+
+
+def create_indexes(conn):
+    # indice coprente per ordinamento, keyset pagination e calcolo delle posizioni
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_leaderboard "
+        "ON users (total_score DESC, id, nickname);"
+    )
+
+
+def get_leaderboard():
+    board = current_app.extensions.get("leaderboard")
+    if board is None:
+        app = current_app._get_current_object()
+        board = app.extensions.setdefault(
+            "leaderboard",
+            Leaderboard(
+                app,
+                page_size=app.config["LEADERBOARD_PAGE_SIZE"],
+                rank_ttl=app.config["LEADERBOARD_RANK_TTL"],
+            ),
+        )
+    return board
@@ -0,0 +1,236 @@
+import sqlite3
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import before_render_template, g, request, template_rendered
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class _RequestState(threading.local):
+    """Contatori della richiesta in corso nel thread (una richiesta alla volta per thread)."""
+
+    start = None
+    queries = 0
+    db_time = 0.0
+
+
+_local = _RequestState()
+
+# un solo lock per le metriche aggiornate a fine richiesta: un acquire invece di quattro
+_request_lock = threading.Lock()
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=(), lock=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = lock or threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._inc(label_values, amount)
+
+    def _inc(self, label_values, amount=1):
+        """Come inc(), con il lock già preso da chi chiama."""
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    """Istogramma a bucket fissi, come quelli di Prometheus (osservazione O(log bucket))."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS, lock=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            self._observe(value, label_values)
+
+    def _observe(self, value, label_values):
+        """Come observe(), con il lock già preso da chi chiama."""
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_label_text(names, values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {total:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, values)} {count}")
+        return lines
+
+
+REQUESTS = Counter(
+    "http_requests_total", "Richieste HTTP servite.", ("endpoint", "method", "status"),
+    lock=_request_lock,
+)
+REQUEST_TIME = Histogram(
+    "http_request_duration_seconds", "Durata delle richieste HTTP.", ("endpoint", "method"),
+    lock=_request_lock,
+)
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "Query SQLite eseguite per richiesta.", ("endpoint",), QUERY_BUCKETS,
+    lock=_request_lock,
+)
+REQUEST_DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Tempo passato in SQLite per richiesta.", ("endpoint",),
+    lock=_request_lock,
+)
+SPAN_TIME = Histogram("span_duration_seconds", "Durata di blocchi misurati (template, meteo...).", ("span",))
+
+ALL_METRICS = (REQUESTS, REQUEST_TIME, REQUEST_QUERIES, REQUEST_DB_TIME, SPAN_TIME)
+
+
+# fuori da una richiesta i contatori crescono senza essere letti: _before_request li azzera
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.execute(self, sql, parameters)
+        finally:
+            _local.queries += 1
+            _local.db_time += perf_counter() - start
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return sqlite3.Cursor.executemany(self, sql, seq_of_parameters)
+        finally:
+            _local.queries += 1
+            _local.db_time += perf_counter() - start
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connessione che conta le query e il tempo passato in SQLite nella richiesta corrente."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return sqlite3.Connection.execute(self, sql, parameters)
+        finally:
+            _local.queries += 1
+            _local.db_time += perf_counter() - start
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return sqlite3.Connection.executemany(self, sql, seq_of_parameters)
+        finally:
+            _local.queries += 1
+            _local.db_time += perf_counter() - start
+
+
+@contextmanager
+def span(name):
+    """Misura un blocco di codice: with span("weather"): ..."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_TIME.observe(perf_counter() - start, name)
+
+
+def _before_request():
+    state = _local
+    state.queries = 0
+    state.db_time = 0.0
+    state.start = perf_counter()
+
+
+def _after_request(response):
+    state = _local
+    start, state.start = state.start, None
+    if start is not None:
+        elapsed = perf_counter() - start
+        req = request._get_current_object()
+        endpoint = req.endpoint or "unknown"
+        method = req.method
+        with _request_lock:
+            REQUEST_TIME._observe(elapsed, (endpoint, method))
+            REQUESTS._inc((endpoint, method, response.status_code))
+            REQUEST_QUERIES._observe(state.queries, (endpoint,))
+            REQUEST_DB_TIME._observe(state.db_time, (endpoint,))
+    return response
+
+
+def _teardown_request(exc=None):
+    _local.start = None
+
+
+def _template_started(sender, template, context, **extra):
+    g.metrics_template_start = perf_counter()
+
+
+def _template_done(sender, template, context, **extra):
+    start = g.pop("metrics_template_start", None)
+    if start is not None:
+        SPAN_TIME.observe(perf_counter() - start, f"template:{template.name}")
+
+
+def init_app(app):
+    app.config.setdefault("METRICS_ENABLED", True)
+    # i segnali di Flask attorno a ogni template costano più di tutto il resto: solo a richiesta
+    app.config.setdefault("METRICS_TEMPLATE_SPANS", False)
+    if not app.config["METRICS_ENABLED"]:
+        return
+    app.config["DB_CONNECTION_FACTORY"] = TimedConnection
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    if app.config["METRICS_TEMPLATE_SPANS"]:
+        before_render_template.connect(_template_started, app)
+        template_rendered.connect(_template_done, app)
+
+
+def render_metrics(gauges):
+    """
+    Testo nel formato di esposizione di Prometheus.
+    `gauges` è {prefisso: dict di statistiche}: i valori numerici diventano gauge.
+    """
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    for prefix, stats in gauges.items():
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,226 @@
+import re
+
+import click
+from flask.cli import AppGroup
+
+import answers
+import leaderboard
+import question_io
+from db import get_db
+from questions import QUESTION_COLUMNS
+
+
+def _initial_schema(conn):
+    """Tabelle di base: idempotente, perché i database esistenti partono da user_version 0."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            login TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            nickname TEXT UNIQUE NOT NULL,
+            total_score INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            option1 TEXT NOT NULL,
+            option2 TEXT NOT NULL,
+            option3 TEXT NOT NULL,
+            option4 TEXT NOT NULL,
+            correct_option INTEGER NOT NULL
+        );
+        """
+    )
+    question_io.create_schema(conn)
+    answers.create_schema(conn)
+
+    # contatori di versione (invalidano le cache in memoria)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('questions_version', 0);")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS questions_version_{event.lower()}
+            AFTER {event} ON questions
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'questions_version';
+            END;
+            """
+        )
+
+
+def _hot_path_indexes(conn):
+    """
+    Indici per le query più frequenti:
+    - classifica (ORDER BY total_score DESC, id) senza ordinare tutta la tabella
+    - il login cerca per `login`, già coperto dall'indice implicito del vincolo UNIQUE
+    """
+    leaderboard.create_indexes(conn)
+
+
+def _nickname_registry(conn):
+    """
+    Nickname in uso, uno per riga: nel backend partizionato è il registro unico
+    (nel primo file) che impedisce lo stesso nickname su due shard.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS nicknames (nickname TEXT PRIMARY KEY);")
+    conn.execute("INSERT OR IGNORE INTO nicknames (nickname) SELECT nickname FROM users;")
+
+
+# l'indice nella lista + 1 è il valore di PRAGMA user_version dopo la migrazione;
+# le nuove migrazioni vanno solo aggiunte in fondo
+MIGRATIONS = [
+    ("schema iniziale", _initial_schema),
+    ("indici per classifica e login", _hot_path_indexes),
+    ("versione della classifica", leaderboard.create_version_triggers),
+    ("registro dei nickname", _nickname_registry),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Applica le migrazioni mancanti, ognuna nella sua transazione insieme al nuovo
+    user_version. BEGIN IMMEDIATE serializza più processi che partono insieme.
+    Ritorna i nomi delle migrazioni eseguite.
+    """
+    applied = []
+    while True:
+        version = schema_version(conn)
+        if version > len(MIGRATIONS):
+            raise RuntimeError(
+                f"Il database è alla versione {version}, il codice conosce solo fino alla {len(MIGRATIONS)}."
+            )
+        if version == len(MIGRATIONS):
+            break
+
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            # un altro processo potrebbe averla appena applicata
+            if schema_version(conn) != version:
+                conn.rollback()
+                continue
+            name, func = MIGRATIONS[version]
+            func(conn)
+            conn.execute(f"PRAGMA user_version = {version + 1};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(name)
+
+    if applied:
+        # statistiche aggiornate per il planner dopo nuovi indici
+        conn.execute("ANALYZE;")
+    conn.execute("PRAGMA optimize;")
+    return applied
+
+
+# query eseguite dalle route a ogni richiesta (gli import/export e il caricamento
+# completo della banca domande leggono tutto per scelta e non sono inclusi).
+# Le voci con un terzo elemento True sono letture complete volute: per loro la
+# scansione è attesa e si controlla solo che non serva un ordinamento a parte.
+HOT_QUERIES = [
+    ("login", "SELECT * FROM users WHERE login = ?;"),
+    ("register: login in uso", "SELECT id FROM users WHERE login = ?;"),
+    ("register: nickname in uso", "SELECT 1 FROM nicknames WHERE nickname = ?;"),
+    ("rehash password", "UPDATE users SET password_hash = ? WHERE id = ?;"),
+    ("utente corrente", "SELECT id, nickname, total_score FROM users WHERE id = ?;"),
+    ("classifica: prima pagina", leaderboard.PAGE_QUERY),
+    ("classifica: pagine successive", leaderboard.PAGE_AFTER_QUERY),
+    ("classifica: posizioni", leaderboard.RANK_QUERY, True),  # tutte le chiavi, ogni rank_ttl
+    ("classifica: posizione del cursore", leaderboard.COUNT_AHEAD_QUERY),
+    ("domanda per id", f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ?;"),
+    ("versione domande", "SELECT value FROM meta WHERE key = 'questions_version';"),
+    ("versione classifica", "SELECT value FROM meta WHERE key = 'scores_version';"),
+    ("punteggio", answers.ADD_SCORE),
+    ("storico risposte", answers.INSERT_ANSWER),
+    ("statistiche utente (scrittura)", answers.UPSERT_USER_STATS),
+    ("statistiche domanda (scrittura)", answers.UPSERT_QUESTION_STATS),
+    ("statistiche utente", "SELECT attempts, correct FROM user_stats WHERE user_id = ?;"),
+    ("domande più giocate",
+     "SELECT question_id, attempts, correct FROM question_stats ORDER BY attempts DESC LIMIT ?;"),
+    ("domande più giocate: totali negli shard",
+     "SELECT question_id, attempts, correct FROM question_stats WHERE question_id IN (?);"),
+]
+
+# tabelle che crescono con gli utenti: una scansione completa qui è un problema
+LARGE_TABLES = {"users", "questions", "answers", "user_stats", "question_stats"}
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)\b(?! USING)")
+
+
+def plan_problems(conn, sql, full_read=False):
+    """
+    Righe di EXPLAIN QUERY PLAN che indicano una scansione completa o un ordinamento.
+    Con full_read la scansione è voluta e conta solo l'ordinamento.
+    """
+    params = (1,) * sql.count("?")
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in LARGE_TABLES and not full_read:
+            problems.append(detail)
+        elif "USE TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append(detail)
+    return problems
+
+
+db_cli = AppGroup("db", help="Migrazioni e controllo delle query.")
+
+
+@db_cli.command("migrate")
+def migrate_command():
+    """Porta il database all'ultima versione dello schema."""
+    conn = get_db()
+    applied = migrate(conn)
+    for name in applied:
+        click.echo(f"Applicata: {name}")
+    click.echo(f"Schema alla versione {schema_version(conn)}.")
+
+
+@db_cli.command("status")
+def status_command():
+    """Versione dello schema e migrazioni in attesa."""
+    version = schema_version(get_db())
+    click.echo(f"Schema alla versione {version} di {len(MIGRATIONS)}.")
+    for i, (name, _) in enumerate(MIGRATIONS, start=1):
+        click.echo(f"  {'✔' if i <= version else ' '} {i}. {name}")
+
+
+@db_cli.command("check")
+def check_command():
+    """EXPLAIN QUERY PLAN delle query calde: esce con 1 se qualcuna scansiona una tabella grande."""
+    conn = get_db()
+    failed = 0
+    for name, sql, *full_read in HOT_QUERIES:
+        problems = plan_problems(conn, sql, *full_read)
+        if problems:
+            failed += 1
+            click.echo(f"✘ {name}: {'; '.join(problems)}")
+        else:
+            click.echo(f"✔ {name}")
+    if failed:
+        click.echo(f"{failed} query senza indice adatto.")
+        raise SystemExit(1)
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
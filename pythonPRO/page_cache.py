@@ -0,0 +1,215 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+
+
+class ResponseCache:
+    """
+    Cache LRU con TTL, thread-safe. Usata sia per le pagine intere sia per
+    i frammenti di template (valore qualsiasi, di solito HTML già renderizzato).
+    """
+
+    def __init__(self, max_size=256, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[1] < self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _anonymous_get():
+    # con messaggi flash in sospeso la pagina è diversa per questo visitatore
+    return request.method == "GET" and not session.get("user_id") and not session.get("_flashes")
+
+
+def cache_page(view):
+    """
+    Pagina intera in cache per le GET dei visitatori non loggati.
+    La risposta viene salvata solo se è un 200 e la view non ha toccato la sessione.
+    """
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        cache = get_page_cache()
+        if cache is None or not _anonymous_get():
+            return view(*args, **kwargs)
+
+        key = request.full_path
+        entry = cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed or session.modified:
+                return response
+            body = response.get_data()
+            entry = (body, response.mimetype, _etag(body))
+            cache.put(key, entry)
+
+        body, mimetype, etag = entry
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+        return response
+
+    return wrapped
+
+
+def fragment(name, version, render):
+    """
+    HTML di un pezzo di pagina, rigenerato solo quando cambia `version`
+    (o dopo PAGE_FRAGMENT_TTL secondi). `render` viene chiamata solo in caso di miss.
+    """
+    cache = get_fragment_cache()
+    if cache is None:
+        return render()
+    key = (name, version)
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.put(key, html)
+    return html
+
+
+def _conditional(response):
+    """ETag e Cache-Control sulle pagine e sul JSON: i client che hanno già la versione ricevono 304."""
+    if request.method not in ("GET", "HEAD"):
+        return response
+
+    if request.endpoint == "static":
+        if "v" in request.args:
+            # l'URL cambia quando cambia il file: il browser può tenerlo per sempre
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config["STATIC_MAX_AGE"]
+            response.cache_control.immutable = True
+        return response
+
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.mimetype not in ("text/html", "application/json")
+    ):
+        return response
+
+    if "Cache-Control" not in response.headers:
+        # sempre rivalidata (le pagine cambiano con login e flash), ma con 304 se uguale
+        response.cache_control.no_cache = True
+        if session.get("user_id"):
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+    if not response.get_etag()[0]:
+        response.set_etag(_etag(response.get_data()))
+    return response.make_conditional(request)
+
+
+class StaticHashes:
+    """Hash del contenuto dei file statici, ricalcolato solo se cambia la data di modifica."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        path = os.path.join(self.folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        item = self._hashes.get(filename)
+        if item is not None and item[0] == mtime:
+            return item[1]
+        with open(path, "rb") as f:
+            digest = hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
+
+
+def init_app(app):
+    app.config.setdefault("PAGE_CACHE_ENABLED", True)
+    app.config.setdefault("PAGE_CACHE_TTL", 60.0)
+    app.config.setdefault("PAGE_CACHE_SIZE", 256)
+    # limite di sicurezza: i frammenti sono già indicizzati per versione della classifica
+    app.config.setdefault("PAGE_FRAGMENT_TTL", 5.0)
+    app.config.setdefault("STATIC_MAX_AGE", 365 * 24 * 3600)
+
+    hashes = StaticHashes(app.static_folder)
+
+    @app.url_defaults
+    def static_version(endpoint, values):
+        # url_for('static', filename='style.css') -> /static/style.css?v=<hash>
+        if endpoint == "static" and "v" not in values and "filename" in values:
+            digest = hashes.get(values["filename"])
+            if digest is not None:
+                values["v"] = digest
+
+    app.after_request(_conditional)
+
+
+def get_page_cache():
+    if not current_app.config["PAGE_CACHE_ENABLED"]:
+        return None
+    cache = current_app.extensions.get("page_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "page_cache",
+            ResponseCache(current_app.config["PAGE_CACHE_SIZE"], current_app.config["PAGE_CACHE_TTL"]),
+        )
+    return cache
+
+
+def get_fragment_cache():
+    if not current_app.config["PAGE_CACHE_ENABLED"]:
+        return None
+    cache = current_app.extensions.get("fragment_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "fragment_cache",
+            ResponseCache(current_app.config["PAGE_CACHE_SIZE"], current_app.config["PAGE_FRAGMENT_TTL"]),
+        )
+    return cache
+
+
+def page_cache_stats():
+    stats = {}
+    for name in ("page_cache", "fragment_cache"):
+        cache = current_app.extensions.get(name)
+        if cache is not None:
+            for key, value in cache.stats().items():
+                stats[f"{name.split('_')[0]}_{key}"] = value
+    return stats
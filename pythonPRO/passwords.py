@@ -0,0 +1,214 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Troppi hash in coda: la richiesta va rifiutata invece di aspettare."""
+
+
+def hash_method(method, iterations):
+    """
+    Stringa del metodo per Werkzeug, con il costo esplicito:
+    ("scrypt", 32768) -> "scrypt:32768:8:1", ("pbkdf2:sha256", 600000) -> "pbkdf2:sha256:600000".
+    """
+    if method == "scrypt":
+        return f"scrypt:{iterations}:8:1"
+    if method.startswith("pbkdf2"):
+        name = method.partition(":")[2] or "sha256"
+        return f"pbkdf2:{name}:{iterations}"
+    raise ValueError(f"Metodo di hashing non supportato: {method}")
+
+
+def _process_context():
+    # non fork: il server ha già altri thread (classifica, meteo...) e un fork può copiare
+    # nel processo figlio un lock tenuto da uno di loro, che lì non verrà mai rilasciato
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def needs_rehash(stored_hash, method):
+    """True se l'hash salvato è stato calcolato con parametri diversi da quelli attuali."""
+    return stored_hash.split("$", 1)[0] != method
+
+
+class PasswordHasher:
+    """
+    Hashing delle password fuori dai thread web: i calcoli girano in un pool di processi
+    limitato, così un'ondata di login non blocca le altre route.
+    Con workers=0 l'hash viene calcolato nel thread della richiesta.
+    """
+
+    def __init__(self, method, workers=2, max_pending=16, wait=2.0):
+        self.method = method
+        self.workers = workers
+        self.wait = wait
+        self._executor = (
+            ProcessPoolExecutor(max_workers=workers, mp_context=_process_context()) if workers else None
+        )
+        # posti nella coda del pool: oltre questo limite si risponde subito "occupato"
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.hashes = 0
+        self.checks = 0
+        self.rehashes = 0
+        self.rejected = 0
+        self.busy_time = 0.0
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy()
+        start = time.perf_counter()
+        try:
+            if self._executor is None:
+                return func(*args)
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.busy_time += time.perf_counter() - start
+
+    def hash(self, password):
+        with self._lock:
+            self.hashes += 1
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, stored_hash, password):
+        with self._lock:
+            self.checks += 1
+        return self._run(check_password_hash, stored_hash, password)
+
+    def rehash(self, password):
+        """Nuovo hash con i parametri attuali, per una password appena verificata."""
+        with self._lock:
+            self.rehashes += 1
+        # non self.hash(): conterebbe la stessa operazione anche in `hashes`
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, stored_hash):
+        return needs_rehash(stored_hash, self.method)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "hashes": self.hashes,
+                "checks": self.checks,
+                "rehashes": self.rehashes,
+                "rejected": self.rejected,
+                "busy_seconds": round(self.busy_time, 3),
+            }
+
+
+class RateLimiter:
+    """
+    Token bucket per chiave (IP, login): `limit` tentativi, che si ricaricano
+    in `period` secondi. Le chiavi più vecchie vengono scartate oltre `max_keys`.
+    """
+
+    def __init__(self, limit, period, max_keys=100000):
+        self.limit = limit
+        self.rate = limit / period
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.blocked = 0
+
+    def _tokens(self, key, now):
+        tokens, last = self._buckets.get(key, (self.limit, now))
+        return min(self.limit, tokens + (now - last) * self.rate)
+
+    def allowed(self, key):
+        """C'è ancora almeno un tentativo disponibile (senza consumarlo)?"""
+        with self._lock:
+            if self._tokens(key, time.monotonic()) >= 1:
+                return True
+            self.blocked += 1
+            return False
+
+    def hit(self, key):
+        """Consuma un tentativo; False se la chiave ha esaurito i tentativi."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                self.blocked += 1
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return True
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._buckets), "blocked": self.blocked}
+
+
+def init_app(app):
+    app.config.setdefault("PASSWORD_HASH_METHOD", "scrypt")
+    app.config.setdefault("PASSWORD_HASH_ITERATIONS", 32768)
+    app.config.setdefault("PASSWORD_HASH_WORKERS", 2)
+    app.config.setdefault("PASSWORD_HASH_MAX_PENDING", 16)
+    app.config.setdefault("PASSWORD_HASH_WAIT", 2.0)
+    app.config.setdefault("RATE_LIMIT_ENABLED", True)
+    # (tentativi, secondi). Per IP contano le registrazioni e i login sbagliati, non quelli
+    # riusciti: una classe dietro un solo NAT deve poter entrare tutta insieme
+    app.config.setdefault("RATE_LIMIT_PER_IP", (60, 60))
+    app.config.setdefault("RATE_LIMIT_PER_LOGIN", (5, 300))
+
+
+def get_password_hasher():
+    hasher = current_app.extensions.get("password_hasher")
+    if hasher is None:
+        config = current_app.config
+        hasher = current_app.extensions.setdefault(
+            "password_hasher",
+            PasswordHasher(
+                hash_method(config["PASSWORD_HASH_METHOD"], config["PASSWORD_HASH_ITERATIONS"]),
+                workers=config["PASSWORD_HASH_WORKERS"],
+                max_pending=config["PASSWORD_HASH_MAX_PENDING"],
+                wait=config["PASSWORD_HASH_WAIT"],
+            ),
+        )
+    return hasher
+
+
+def get_rate_limiters():
+    """
+    (limite per IP su registrazioni e login sbagliati, limite sugli errori per login e IP),
+    oppure None se il rate limiting è disattivato. L'IP è request.remote_addr (vedi TRUSTED_PROXIES in app.py).
+    """
+    if not current_app.config["RATE_LIMIT_ENABLED"]:
+        return None
+    limiters = current_app.extensions.get("rate_limiters")
+    if limiters is None:
+        limiters = current_app.extensions.setdefault(
+            "rate_limiters",
+            (
+                RateLimiter(*current_app.config["RATE_LIMIT_PER_IP"]),
+                RateLimiter(*current_app.config["RATE_LIMIT_PER_LOGIN"]),
+            ),
+        )
+    return limiters
+
+
+def password_stats():
+    hasher = current_app.extensions.get("password_hasher")
+    stats = dict(hasher.stats()) if hasher is not None else {}
+    limiters = current_app.extensions.get("rate_limiters")
+    if limiters is not None:
+        stats["blocked_ip"] = limiters[0].stats()["blocked"]
+        stats["blocked_login"] = limiters[1].stats()["blocked"]
+    return stats
@@ -0,0 +1,225 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+
+import click
+from flask.cli import AppGroup
+
+from db import get_db
+from questions import get_question_bank
+
+FIELDS = ("text", "option1", "option2", "option3", "option4", "correct_option")
+
+INSERT_QUESTION = """
+    INSERT OR IGNORE INTO questions
+        (text, option1, option2, option3, option4, correct_option, text_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+
+# indice usato per la deduplica: resta attivo anche durante l'import
+HASH_INDEX = "idx_questions_text_hash"
+
+
+def text_hash(text):
+    """Hash a 64 bit del testo normalizzato (spazi e maiuscole non contano)."""
+    digest = hashlib.blake2b(" ".join(text.split()).casefold().encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "big", signed=True)
+
+
+def create_schema(conn):
+    """Aggiunge text_hash (con indice UNIQUE) alle tabelle create prima dell'import."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(questions);")]
+    if "text_hash" not in columns:
+        conn.execute("ALTER TABLE questions ADD COLUMN text_hash INTEGER;")
+        seen = set()
+        for question_id, text in conn.execute("SELECT id, text FROM questions;").fetchall():
+            h = text_hash(text)
+            # eventuali doppioni già presenti restano senza hash
+            conn.execute(
+                "UPDATE questions SET text_hash = ? WHERE id = ?;",
+                (h if h not in seen else None, question_id),
+            )
+            seen.add(h)
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {HASH_INDEX} ON questions (text_hash);")
+
+
+def read_rows(path):
+    """Legge CSV (con intestazione) o JSONL una riga alla volta."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+    else:
+        raise click.BadParameter("Formato non supportato: usa .csv o .jsonl")
+
+
+def validate(raw):
+    """Riga grezza -> tupla pronta per l'INSERT, oppure None se non valida."""
+    if not isinstance(raw, dict):
+        return None
+    options = raw.get("options")
+    if options is None:
+        options = [raw.get(f"option{i}") for i in range(1, 5)]
+    if not isinstance(options, list) or len(options) != 4:
+        return None
+
+    # testo e opzioni solo stringhe: numeri, liste o null nel JSONL sono righe non valide
+    text = raw.get("text")
+    if not isinstance(text, str) or not all(isinstance(o, str) for o in options):
+        return None
+    text = text.strip()
+    options = [o.strip() for o in options]
+    if not text or not all(options):
+        return None
+    correct_option = raw.get("correct_option")
+    # "2" dal CSV o 2 dal JSONL; True/False no (bool è un int)
+    if isinstance(correct_option, bool) or not isinstance(correct_option, (int, str)):
+        return None
+    try:
+        correct_option = int(correct_option)
+    except ValueError:
+        return None
+    if not 1 <= correct_option <= 4:
+        return None
+    return (text, *options, correct_option, text_hash(text))
+
+
+def _drop_secondary_indexes(conn):
+    """
+    Toglie gli indici di questions (tranne quello di deduplica) e ne ritorna l'SQL.
+    I trigger restano: se l'import si interrompe a metà un indice mancante rallenta,
+    un trigger di versione mancante lascerebbe le cache vecchie per sempre.
+    """
+    objects = conn.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE tbl_name = 'questions' AND type = 'index' AND sql IS NOT NULL AND name != ?;",
+        (HASH_INDEX,),
+    ).fetchall()
+    for obj in objects:
+        conn.execute(f"DROP INDEX {obj['name']};")
+    return [obj["sql"] for obj in objects]
+
+
+def import_questions(conn, rows, chunk_size=5000, commit_every=200000):
+    """
+    Carica le domande a blocchi con executemany, in transazioni grandi.
+    Gli indici secondari vengono tolti durante il caricamento e ricreati alla fine,
+    anche se l'import fallisce (dopo aver annullato il blocco non ancora salvato);
+    i trigger restano attivi e fanno avanzare la versione delle domande.
+    Memoria costante: solo un blocco di righe alla volta.
+    """
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    start = time.perf_counter()
+    # righe inserite (rowcount: senza le modifiche fatte dai trigger)
+    committed = inserted = 0
+
+    # DROP fuori da una transazione: autocommit, va sempre ricreato nel finally
+    saved_sql = _drop_secondary_indexes(conn)
+    ok = False
+    try:
+        chunk = []
+        pending = 0
+        for raw in rows:
+            stats["read"] += 1
+            row = validate(raw)
+            if row is None:
+                stats["invalid"] += 1
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                inserted += conn.executemany(INSERT_QUESTION, chunk).rowcount
+                pending += len(chunk)
+                chunk = []
+                if pending >= commit_every:
+                    conn.commit()
+                    committed = inserted
+                    pending = 0
+        if chunk:
+            inserted += conn.executemany(INSERT_QUESTION, chunk).rowcount
+        conn.commit()
+        committed = inserted
+        ok = True
+    finally:
+        if not ok:
+            # le righe non salvate non devono finire nel commit dei CREATE qui sotto
+            conn.rollback()
+        stats["inserted"] = committed
+        for sql in saved_sql:
+            conn.execute(sql)
+        conn.commit()
+
+    stats["duplicates"] = stats["read"] - stats["invalid"] - stats["inserted"]
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def export_questions(conn, out, fmt):
+    """Scrive tutte le domande su `out` in CSV o JSONL, leggendole in streaming."""
+    cursor = conn.execute(f"SELECT {', '.join(FIELDS)} FROM questions ORDER BY id;")
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(FIELDS)
+        for row in cursor:
+            writer.writerow(tuple(row))
+            count += 1
+    else:
+        for row in cursor:
+            out.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+questions_cli = AppGroup("questions", help="Import/export della banca domande.")
+
+
+@questions_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=5000, show_default=True)
+def import_command(path, chunk_size):
+    """Importa domande da un file .csv o .jsonl."""
+    conn = get_db()
+    stats = import_questions(conn, read_rows(path), chunk_size=chunk_size)
+    get_question_bank().invalidate()
+    rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    click.echo(
+        f"Lette {stats['read']} righe: {stats['inserted']} inserite, "
+        f"{stats['duplicates']} duplicate, {stats['invalid']} non valide "
+        f"in {stats['seconds']:.1f}s ({rate:.0f} righe/s)."
+    )
+
+
+@questions_cli.command("export")
+@click.argument("path", default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Formato di uscita (di default dall'estensione del file, altrimenti jsonl).")
+def export_command(path, fmt):
+    """Esporta le domande in .csv o .jsonl (- per lo standard output)."""
+    if fmt is None:
+        fmt = "csv" if path.endswith(".csv") else "jsonl"
+    start = time.perf_counter()
+    if path == "-":
+        count = export_questions(get_db(), sys.stdout, fmt)
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as out:
+            count = export_questions(get_db(), out, fmt)
+    elapsed = time.perf_counter() - start
+    if path != "-":
+        rate = count / elapsed if elapsed else 0
+        click.echo(f"Esportate {count} domande in {os.path.basename(path)} "
+                   f"in {elapsed:.1f}s ({rate:.0f} righe/s).")
+
+
+def init_app(app):
+    app.cli.add_command(questions_cli)
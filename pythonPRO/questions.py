@@ -0,0 +1,263 @@
+import hashlib
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from flask import current_app, session
+
+
+def questions_version(conn):
+    """Contatore incrementato dai trigger a ogni INSERT/UPDATE/DELETE su questions."""
+    row = conn.execute(
+        "SELECT value FROM meta WHERE key = 'questions_version';"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+class VersionClock:
+    """
+    Legge la versione delle domande (o un altro contatore, con `read`) al massimo
+    una volta ogni `interval` secondi, così nella maggior parte delle richieste
+    non serve interrogare SQLite.
+    """
+
+    def __init__(self, interval=1.0, read=questions_version):
+        self.interval = interval
+        self.read = read
+        self.value = None
+        self.checked_at = 0.0
+
+    def current(self, conn):
+        now = time.monotonic()
+        if self.value is None or now - self.checked_at >= self.interval:
+            self.value = self.read(conn)
+            self.checked_at = now
+        return self.value
+
+    def expire(self):
+        self.value = None
+
+
+class Question:
+    """Domanda in memoria: record compatto, accessibile anche come question['text']."""
+
+    __slots__ = ("id", "text", "option1", "option2", "option3", "option4", "correct_option")
+
+    def __init__(self, row):
+        (
+            self.id,
+            self.text,
+            self.option1,
+            self.option2,
+            self.option3,
+            self.option4,
+            self.correct_option,
+        ) = row
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+QUESTION_COLUMNS = "id, text, option1, option2, option3, option4, correct_option"
+
+
+class QuestionIndex:
+    """
+    Indice compatto (array('I')) degli id delle domande.
+    Viene ricostruito solo quando cambia la versione delle domande,
+    quindi la scelta di una domanda costa O(1) e non O(N).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.ids = array("I")
+        self._lock = threading.Lock()
+
+    def refresh(self, conn, version):
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    self.ids = array(
+                        "I", (row[0] for row in conn.execute("SELECT id FROM questions ORDER BY id;"))
+                    )
+                    self.version = version
+        return self.ids
+
+
+class QuestionStore:
+    """
+    Cache in memoria delle domande, indicizzata per id.
+    - max_size=None: tutta la banca domande viene caricata in un colpo solo
+    - max_size=N: LRU limitata, le domande mancanti si leggono da SQLite
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.version = None
+        self._items = OrderedDict()
+        self._complete = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def sync(self, conn, version):
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            self._items = OrderedDict()
+            self._complete = False
+            if self.max_size is None:
+                for row in conn.execute(f"SELECT {QUESTION_COLUMNS} FROM questions;"):
+                    self._items[row[0]] = Question(row)
+                self._complete = True
+            self.loads += 1
+            self.version = version
+
+    def get(self, conn, question_id):
+        with self._lock:
+            question = self._items.get(question_id)
+            if question is not None:
+                self.hits += 1
+                if self.max_size is not None:
+                    self._items.move_to_end(question_id)
+                return question
+            self.misses += 1
+            if self._complete:
+                return None
+
+        row = conn.execute(
+            f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ?;", (question_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        question = Question(row)
+        with self._lock:
+            self._items[question_id] = question
+            while self.max_size is not None and len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        return question
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+class QuestionBank:
+    """Indice + store delle domande dell'app, sincronizzati sulla stessa versione."""
+
+    def __init__(self, max_size=None, check_interval=1.0):
+        self.clock = VersionClock(check_interval)
+        self.index = QuestionIndex()
+        self.store = QuestionStore(max_size)
+
+    def version(self, conn):
+        version = self.clock.current(conn)
+        self.store.sync(conn, version)
+        return version
+
+    def invalidate(self):
+        """Da chiamare dopo aver modificato le domande da questo processo."""
+        self.clock.expire()
+
+
+def init_app(app):
+    app.config.setdefault("QUESTION_CACHE_SIZE", None)
+    app.config.setdefault("QUESTION_VERSION_CHECK_INTERVAL", 1.0)
+
+
+def get_question_bank():
+    bank = current_app.extensions.get("question_bank")
+    if bank is None:
+        bank = current_app.extensions.setdefault(
+            "question_bank",
+            QuestionBank(
+                max_size=current_app.config["QUESTION_CACHE_SIZE"],
+                check_interval=current_app.config["QUESTION_VERSION_CHECK_INTERVAL"],
+            ),
+        )
+    return bank
+
+
+def get_question(conn, question_id):
+    """Domanda per id servita dalla cache (None se non esiste)."""
+    bank = get_question_bank()
+    bank.version(conn)
+    return bank.store.get(conn, question_id)
+
+
+def question_cache_stats():
+    return get_question_bank().store.stats()
+
+
+FEISTEL_ROUNDS = 4
+
+
+def deck_position(key, n, pos):
+    """
+    pos-esimo elemento di una permutazione pseudocasuale di range(n), in O(1):
+    rete di Feistel (round con blake2b e chiave `key`) su un dominio di 2**k >= n
+    elementi, ripetuta finché il risultato non cade sotto n (in media meno di 4 giri).
+    """
+    half = max(1, ((n - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    x = pos
+    while True:
+        left, right = x >> half, x & mask
+        for r in range(FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(
+                right.to_bytes(8, "big"), key=key, digest_size=8, person=bytes((r,))
+            ).digest()
+            left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+        x = (left << half) | right
+        if x < n:
+            return x
+
+
+def _deck_key(nonce):
+    """
+    Chiave del mazzo: il cookie di sessione è leggibile dal client, per questo contiene
+    solo un nonce e la chiave dipende anche da SECRET_KEY (ordine non prevedibile).
+    """
+    secret = str(current_app.config["SECRET_KEY"]).encode("utf-8")
+    return hashlib.blake2b(nonce.to_bytes(8, "big"), key=secret[:64], digest_size=16).digest()
+
+
+def _new_deck(version, n):
+    """Mazzo mescolato per utente: in sessione solo versione, n, nonce e posizione."""
+    return [version, n, secrets.randbits(63), 0]
+
+
+def next_question_id(conn):
+    """Prossima domanda del mazzo dell'utente: nessuna ripetizione finché il mazzo non finisce."""
+    bank = get_question_bank()
+    version = bank.version(conn)
+    ids = bank.index.refresh(conn, version)
+    n = len(ids)
+    if n == 0:
+        return None
+
+    deck = session.get("quiz_deck")
+    if not deck or len(deck) != 4 or deck[0] != version or deck[1] != n or deck[3] >= n:
+        deck = _new_deck(version, n)
+
+    _, _, nonce, pos = deck
+    question_id = ids[deck_position(_deck_key(nonce), n, pos)]
+    deck[3] = pos + 1
+    session["quiz_deck"] = deck
+    return question_id
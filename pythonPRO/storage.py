@@ -0,0 +1,518 @@
+import heapq
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+
+from flask import current_app, g
+
+from answers import record_answers, top_question_stats, user_stats
+from db import ConnectionPool, get_db
+from leaderboard import COUNT_AHEAD_QUERY, PAGE_AFTER_QUERY, PAGE_QUERY, RANK_QUERY, scores_version
+from migrations import migrate
+from question_io import import_questions
+from questions import QUESTION_COLUMNS, Question
+
+INSERT_USER = """
+    INSERT INTO users (login, password_hash, nickname, total_score, created_at)
+    VALUES (?, ?, ?, 0, ?);
+"""
+
+# negli shard l'id viene scelto in modo che id % shard_count == shard
+INSERT_USER_IN_SHARD = """
+    INSERT INTO users (id, login, password_hash, nickname, total_score, created_at)
+    VALUES ((SELECT COALESCE(MAX(id), ?) + ? FROM users), ?, ?, ?, 0, ?);
+"""
+
+# registro dei nickname: la PRIMARY KEY li rende unici su tutti gli shard
+RESERVE_NICKNAME = "INSERT INTO nicknames (nickname) VALUES (?);"
+
+
+class DuplicateUser(Exception):
+    """Login o nickname già usati; `field` dice quale."""
+
+    def __init__(self, field):
+        super().__init__(f"{field} già in uso")
+        self.field = field
+
+
+# --- interfacce ---
+
+class UserRepo:
+    def create(self, login, password_hash, nickname):
+        """Nuovo utente con punteggio 0; ritorna l'id. DuplicateUser se login/nickname esistono."""
+        raise NotImplementedError
+
+    def by_login(self, login):
+        """Riga completa dell'utente (id, login, password_hash, nickname, total_score) o None."""
+        raise NotImplementedError
+
+    def by_id(self, user_id):
+        """{id, nickname, total_score} oppure None."""
+        raise NotImplementedError
+
+    def nickname_taken(self, nickname):
+        raise NotImplementedError
+
+    def set_password_hash(self, user_id, password_hash):
+        raise NotImplementedError
+
+
+class QuestionRepo:
+    def add_many(self, rows):
+        """Importa domande (dict come in question_io); ritorna le statistiche dell'import."""
+        raise NotImplementedError
+
+    def get(self, question_id):
+        """Question oppure None."""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+
+class ScoreRepo:
+    def record(self, batch):
+        """Registra una lista di Answer; ritorna {user_id: nuovo punteggio} per chi ha fatto punti."""
+        raise NotImplementedError
+
+    def top(self, limit, after=None):
+        """Righe della classifica (id, nickname, total_score), dopo il cursore (score, id) se dato."""
+        raise NotImplementedError
+
+    def count_ahead(self, score, user_id):
+        """Utenti prima di (score, id) in classifica."""
+        raise NotImplementedError
+
+    def rank_keys(self):
+        """(total_score, id) di tutti gli utenti, nell'ordine della classifica."""
+        raise NotImplementedError
+
+    def rank(self, user_id):
+        """Posizione in classifica (1-based) oppure None se l'utente non esiste."""
+        raise NotImplementedError
+
+    def stats(self, user_id):
+        """(tentativi, risposte corrette)."""
+        raise NotImplementedError
+
+    def question_stats(self, limit=10):
+        """Domande con più tentativi: dict {question_id, attempts, correct}."""
+        raise NotImplementedError
+
+    def version(self):
+        """Contatore che cresce a ogni cambiamento della classifica."""
+        raise NotImplementedError
+
+
+class Storage:
+    """I tre repository di un backend, più le risorse da chiudere."""
+
+    def __init__(self, users, questions, scores, pools=()):
+        self.users = users
+        self.questions = questions
+        self.scores = scores
+        self.pools = list(pools)
+
+    def close(self):
+        for pool in self.pools:
+            pool.close_all()
+
+
+# --- backend SQLite (un file) ---
+
+class SQLiteUserRepo(UserRepo):
+    def __init__(self, connection, shard=0, shard_count=1):
+        self.connection = connection
+        self.shard = shard
+        self.shard_count = shard_count
+
+    def create(self, login, password_hash, nickname):
+        created_at = datetime.now().isoformat(timespec="seconds")
+        with self.connection() as conn:
+            try:
+                if self.shard == 0:
+                    # il registro dei nickname sta nel primo file: stessa transazione dell'utente
+                    conn.execute(RESERVE_NICKNAME, (nickname,))
+                if self.shard_count == 1:
+                    cur = conn.execute(INSERT_USER, (login, password_hash, nickname, created_at))
+                else:
+                    cur = conn.execute(
+                        INSERT_USER_IN_SHARD,
+                        (self.shard, self.shard_count, login, password_hash, nickname, created_at),
+                    )
+                conn.commit()
+            except sqlite3.IntegrityError as exc:
+                conn.rollback()
+                raise DuplicateUser("login" if "users.login" in str(exc) else "nickname") from exc
+            return cur.lastrowid
+
+    def by_login(self, login):
+        with self.connection() as conn:
+            return conn.execute("SELECT * FROM users WHERE login = ?;", (login,)).fetchone()
+
+    def by_id(self, user_id):
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT id, nickname, total_score FROM users WHERE id = ?;", (user_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def nickname_taken(self, nickname):
+        with self.connection() as conn:
+            row = conn.execute("SELECT 1 FROM nicknames WHERE nickname = ?;", (nickname,)).fetchone()
+        return row is not None
+
+    def reserve_nickname(self, nickname):
+        """Riserva il nickname nel registro di questo file; DuplicateUser se è già preso."""
+        with self.connection() as conn:
+            try:
+                conn.execute(RESERVE_NICKNAME, (nickname,))
+                conn.commit()
+            except sqlite3.IntegrityError as exc:
+                conn.rollback()
+                raise DuplicateUser("nickname") from exc
+
+    def release_nickname(self, nickname):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM nicknames WHERE nickname = ?;", (nickname,))
+            conn.commit()
+
+    def set_password_hash(self, user_id, password_hash):
+        with self.connection() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?;", (password_hash, user_id))
+            conn.commit()
+
+
+class SQLiteQuestionRepo(QuestionRepo):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def add_many(self, rows):
+        with self.connection() as conn:
+            return import_questions(conn, rows)
+
+    def get(self, question_id):
+        with self.connection() as conn:
+            row = conn.execute(
+                f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ?;", (question_id,)
+            ).fetchone()
+        return Question(row) if row else None
+
+    def count(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM questions;").fetchone()[0]
+
+
+class SQLiteScoreRepo(ScoreRepo):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def record(self, batch):
+        with self.connection() as conn:
+            return record_answers(conn, batch)
+
+    def top(self, limit, after=None):
+        with self.connection() as conn:
+            if after is None:
+                rows = conn.execute(PAGE_QUERY, (limit,)).fetchall()
+            else:
+                score, user_id = after
+                rows = conn.execute(PAGE_AFTER_QUERY, (score, score, user_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_ahead(self, score, user_id):
+        with self.connection() as conn:
+            return conn.execute(COUNT_AHEAD_QUERY, (score, score, user_id)).fetchone()[0]
+
+    def rank_keys(self):
+        with self.connection() as conn:
+            yield from conn.execute(RANK_QUERY)
+
+    def score(self, user_id):
+        with self.connection() as conn:
+            row = conn.execute("SELECT total_score FROM users WHERE id = ?;", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def rank(self, user_id):
+        score = self.score(user_id)
+        if score is None:
+            return None
+        return self.count_ahead(score, user_id) + 1
+
+    def stats(self, user_id):
+        with self.connection() as conn:
+            return user_stats(conn, user_id)
+
+    def question_stats(self, limit=10):
+        with self.connection() as conn:
+            return [dict(row) for row in top_question_stats(conn, limit)]
+
+    def question_stats_by_id(self, question_ids):
+        """{question_id: (tentativi, corrette)} delle domande date che hanno tentativi."""
+        if not question_ids:
+            return {}
+        placeholders = ",".join("?" * len(question_ids))
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT question_id, attempts, correct FROM question_stats "
+                f"WHERE question_id IN ({placeholders});",
+                list(question_ids),
+            )
+            return {row[0]: (row[1], row[2]) for row in rows}
+
+    def version(self):
+        with self.connection() as conn:
+            return scores_version(conn)
+
+
+def sqlite_storage(connection, shard=0, shard_count=1, pools=()):
+    return Storage(
+        SQLiteUserRepo(connection, shard, shard_count),
+        SQLiteQuestionRepo(connection),
+        SQLiteScoreRepo(connection),
+        pools,
+    )
+
+
+def _open_pool(path, pool_size, **kwargs):
+    pool = ConnectionPool(path, max_size=pool_size, **kwargs)
+    with pool.connection() as conn:
+        migrate(conn)
+    return pool
+
+
+def open_sqlite(path, pool_size=8):
+    """Backend su un solo file SQLite (schema migrato all'apertura)."""
+    pool = _open_pool(path, pool_size)
+    return sqlite_storage(pool.connection, pools=[pool])
+
+
+# --- backend SQLite partizionato ---
+
+def shard_for_login(login, shard_count):
+    # crc32 e non hash(): deve dare lo stesso shard in tutti i processi
+    return zlib.crc32(login.encode("utf-8")) % shard_count
+
+
+class ShardedUserRepo(UserRepo):
+    """
+    Utenti partizionati su più file: lo shard si ricava dall'id (id % shard) e,
+    alla registrazione, dal login. Il login è quindi unico dentro il suo shard;
+    i nickname stanno nel registro del primo shard, dove la PRIMARY KEY decide
+    chi vince tra due registrazioni concorrenti.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.registry = shards[0].users
+
+    def _by_id(self, user_id):
+        return self.shards[user_id % len(self.shards)].users
+
+    def create(self, login, password_hash, nickname):
+        shard = shard_for_login(login, len(self.shards))
+        if shard == 0:
+            return self.registry.create(login, password_hash, nickname)
+        # con WAL una transazione su più file non è atomica (neanche con ATTACH): il nickname
+        # viene riservato prima e liberato se l'utente non viene creato. Un crash tra i due
+        # passi lascia al più un nickname riservato senza utente, mai due utenti con lo stesso
+        self.registry.reserve_nickname(nickname)
+        try:
+            return self.shards[shard].users.create(login, password_hash, nickname)
+        except BaseException:
+            self.registry.release_nickname(nickname)
+            raise
+
+    def by_login(self, login):
+        return self.shards[shard_for_login(login, len(self.shards))].users.by_login(login)
+
+    def by_id(self, user_id):
+        return self._by_id(user_id).by_id(user_id)
+
+    def nickname_taken(self, nickname):
+        return self.registry.nickname_taken(nickname)
+
+    def set_password_hash(self, user_id, password_hash):
+        self._by_id(user_id).set_password_hash(user_id, password_hash)
+
+
+class ShardedScoreRepo(ScoreRepo):
+    """Punteggi e statistiche nello shard dell'utente; classifica unendo le top-N degli shard."""
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    def _scores(self, user_id):
+        return self.shards[user_id % len(self.shards)].scores
+
+    def record(self, batch):
+        groups = {}
+        for answer in batch:
+            groups.setdefault(answer.user_id % len(self.shards), []).append(answer)
+        totals = {}
+        for shard, group in groups.items():
+            totals.update(self.shards[shard].scores.record(group))
+        return totals
+
+    def top(self, limit, after=None):
+        # ogni shard è già ordinato (score desc, id asc): basta un merge delle prime `limit` righe
+        per_shard = [shard.scores.top(limit, after) for shard in self.shards]
+        merged = heapq.merge(*per_shard, key=lambda row: (-row["total_score"], row["id"]))
+        return [row for _, row in zip(range(limit), merged)]
+
+    def count_ahead(self, score, user_id):
+        return sum(shard.scores.count_ahead(score, user_id) for shard in self.shards)
+
+    def rank_keys(self):
+        per_shard = [shard.scores.rank_keys() for shard in self.shards]
+        return heapq.merge(*per_shard, key=lambda row: (-row[0], row[1]))
+
+    def rank(self, user_id):
+        score = self._scores(user_id).score(user_id)
+        if score is None:
+            return None
+        return self.count_ahead(score, user_id) + 1
+
+    def stats(self, user_id):
+        return self._scores(user_id).stats(user_id)
+
+    def question_stats(self, limit=10):
+        """
+        Le statistiche di una domanda sono divise tra gli shard dei suoi utenti. Si leggono le
+        prime `fetch` di ogni shard e si completano i totali delle candidate; una domanda mai
+        vista ha al più la somma degli ultimi valori letti: se la `limit`-esima candidata ne ha
+        almeno altrettanti il risultato è esatto, altrimenti si raddoppia `fetch`.
+        """
+        fetch = limit
+        while True:
+            per_shard = [shard.scores.question_stats(fetch) for shard in self.shards]
+            candidates = {row["question_id"] for rows in per_shard for row in rows}
+            totals = dict.fromkeys(candidates, (0, 0))
+            for shard in self.shards:
+                for question_id, (attempts, correct) in shard.scores.question_stats_by_id(candidates).items():
+                    total = totals[question_id]
+                    totals[question_id] = (total[0] + attempts, total[1] + correct)
+            ranked = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+            threshold = sum(rows[-1]["attempts"] for rows in per_shard if rows and len(rows) == fetch)
+            if not threshold or (len(ranked) == limit and ranked[-1][1][0] >= threshold):
+                return [
+                    {"question_id": question_id, "attempts": attempts, "correct": correct}
+                    for question_id, (attempts, correct) in ranked
+                ]
+            fetch *= 2
+
+    def version(self):
+        # ogni shard ha il suo contatore, che cresce soltanto: la somma cresce a ogni cambiamento
+        return sum(shard.scores.version() for shard in self.shards)
+
+
+def sharded_storage(shards, pools=()):
+    return Storage(ShardedUserRepo(shards), shards[0].questions, ShardedScoreRepo(shards), pools)
+
+
+def open_sharded(paths, pool_size=4):
+    """
+    Backend partizionato: gli utenti (con risposte e statistiche) sono divisi sui file
+    in `paths`, le domande stanno nel primo. Ogni file ha il suo lock di scrittura,
+    quindi le scritture su utenti diversi procedono in parallelo.
+    """
+    pools = [_open_pool(path, pool_size) for path in paths]
+    shards = [
+        sqlite_storage(pool.connection, shard=i, shard_count=len(pools))
+        for i, pool in enumerate(pools)
+    ]
+    return sharded_storage(shards, pools)
+
+
+# --- storage dell'app ---
+
+def shard_paths(database, shard_count):
+    """File degli shard: il primo è il database dell'app (con le domande), poi quiz.shard1.db..."""
+    root, ext = os.path.splitext(database)
+    return [database] + [f"{root}.shard{i}{ext}" for i in range(1, shard_count)]
+
+
+_shard_pools_lock = threading.Lock()
+
+
+def get_shard_pools(app=None):
+    """Pool degli shard dopo il primo (che usa get_pool()), migrati al primo utilizzo."""
+    app = app or current_app
+    database = app.config["DATABASE"]
+    pools = app.extensions.get("shard_pools")
+    if pools is not None and pools[0] == database:
+        return pools[1]
+    with _shard_pools_lock:
+        pools = app.extensions.get("shard_pools")
+        if pools is None or pools[0] != database:
+            if pools is not None:
+                for pool in pools[1]:
+                    pool.close_all()
+            pools = app.extensions["shard_pools"] = (
+                database,
+                [
+                    _open_pool(
+                        path,
+                        app.config["DB_POOL_SIZE"],
+                        busy_timeout_ms=app.config["DB_BUSY_TIMEOUT_MS"],
+                        acquire_timeout=app.config["DB_ACQUIRE_TIMEOUT"],
+                        factory=app.config["DB_CONNECTION_FACTORY"],
+                    )
+                    for path in shard_paths(database, app.config["STORAGE_SHARDS"])[1:]
+                ],
+            )
+    return pools[1]
+
+
+def get_shard_db(shard):
+    """Come get_db(), per lo shard dato: una connessione per richiesta e per shard."""
+    if shard == 0:
+        return get_db()
+    conns = g.setdefault("shard_dbs", {})
+    if shard not in conns:
+        conns[shard] = get_shard_pools()[shard - 1].acquire()
+    return conns[shard]
+
+
+def close_shard_dbs(exc=None):
+    conns = g.pop("shard_dbs", None)
+    if conns:
+        pools = get_shard_pools()
+        for shard, conn in conns.items():
+            pools[shard - 1].release(conn)
+
+
+@contextmanager
+def _request_connection(shard=0):
+    yield get_shard_db(shard)
+
+
+def _app_storage(config):
+    if config["STORAGE"] == "sqlite":
+        return sqlite_storage(_request_connection)
+    if config["STORAGE"] != "sharded":
+        raise ValueError(f"STORAGE sconosciuto: {config['STORAGE']!r} (sqlite o sharded)")
+    count = config["STORAGE_SHARDS"]
+    return sharded_storage(
+        [sqlite_storage(partial(_request_connection, i), shard=i, shard_count=count) for i in range(count)]
+    )
+
+
+def get_storage():
+    """Repository dell'app (STORAGE: sqlite o sharded), sulle connessioni della richiesta corrente."""
+    storage = current_app.extensions.get("storage")
+    if storage is None:
+        storage = current_app.extensions.setdefault("storage", _app_storage(current_app.config))
+    return storage
+
+
+# --- contratto comune ai backend ---
+
+def init_app(app):
+    app.config.setdefault("STORAGE", "sqlite")
+    app.config.setdefault("STORAGE_SHARDS", 4)
+    app.teardown_appcontext(close_shard_dbs)
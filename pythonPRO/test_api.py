@@ -0,0 +1,64 @@
+"""
+Test dell'API del quiz: si risponde solo alla domanda servita, e una volta sola.
+
+Dalla cartella pythonPRO/:
+    python -m unittest test_api
+"""
+
+import os
+import tempfile
+import unittest
+
+# database di prova, da scegliere prima di importare l'app (che lo crea all'import)
+os.environ.setdefault("QUIZ_DATABASE", os.path.join(tempfile.mkdtemp(prefix="quiz-test-"), "test.db"))
+
+import app as quiz_app  # noqa: E402
+
+
+class QuizAnswerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        quiz_app.app.config.update(RATE_LIMIT_ENABLED=False)
+        cls.client = quiz_app.app.test_client()
+        cls.client.post(
+            "/register",
+            data={"login": "api-tester", "password": "password-di-prova",
+                  "confirm_password": "password-di-prova", "nickname": "api-tester"},
+        )
+        resp = cls.client.post("/login", data={"login": "api-tester", "password": "password-di-prova"})
+        assert resp.status_code < 400, resp.status_code
+
+    def answer(self, question_id, option=1):
+        return self.client.post("/api/quiz/answer", json={"question_id": question_id, "option": option})
+
+    def test_only_the_served_question_is_graded(self):
+        served = self.client.get("/api/quiz/next").get_json()["question"]["id"]
+        other = next(qid for qid in range(1, 10) if qid != served)
+        self.assertEqual(self.answer(other).status_code, 409)
+
+        resp = self.answer(served)
+        self.assertEqual(resp.status_code, 200)
+        # la domanda successiva arriva nella risposta ed è quella da usare
+        following = resp.get_json()["next"]["id"]
+        self.assertEqual(self.answer(following).status_code, 200)
+
+    def test_a_question_is_graded_once(self):
+        served = self.client.get("/api/quiz/next").get_json()["question"]["id"]
+        resp = self.answer(served)
+        self.assertEqual(resp.status_code, 200)
+        score = resp.get_json()["total_score"]
+        if resp.get_json()["next"]["id"] == served:
+            self.skipTest("mazzo rimescolato: la stessa domanda è di nuovo quella servita")
+
+        # ritentare la stessa domanda con tutte le opzioni non fa punti
+        for option in range(1, 5):
+            self.assertEqual(self.answer(served, option).status_code, 409)
+        self.assertEqual(self.client.get("/api/quiz/next").get_json()["total_score"], score)
+
+    def test_anonymous_answers_are_rejected(self):
+        resp = quiz_app.app.test_client().post("/api/quiz/answer", json={"question_id": 1, "option": 1})
+        self.assertEqual(resp.status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
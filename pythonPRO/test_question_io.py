@@ -0,0 +1,156 @@
+"""
+Test di import ed export delle domande (question_io) su database SQLite temporanei.
+
+Dalla cartella pythonPRO/:
+    python -m unittest test_question_io
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from migrations import migrate
+from question_io import FIELDS, export_questions, import_questions, read_rows, validate
+
+QUESTIONS = [
+    {"text": "Capitale d'Italia?", "options": ["Roma", "Milano", "Napoli", "Torino"], "correct_option": 1},
+    {"text": "2 + 2?", "options": ["3", "4", "5", "22"], "correct_option": 2},
+    {"text": "Colore del cielo?", "options": ["Verde", "Rosso", "Blu", "Giallo"], "correct_option": 3},
+]
+
+VERSION_TRIGGERS = {"questions_version_insert", "questions_version_update", "questions_version_delete"}
+
+
+def question(i):
+    return {"text": f"Domanda {i}?", "options": ["a", "b", "c", "d"], "correct_option": 1 + i % 4}
+
+
+class QuestionIOTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="quiz-test-")
+        self.conn = self.open("quiz.db")
+        # indice secondario: l'import lo toglie e lo deve ricreare
+        self.conn.execute("CREATE INDEX idx_test_questions_text ON questions (text);")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.workdir)
+
+    def open(self, name):
+        conn = sqlite3.connect(os.path.join(self.workdir, name))
+        conn.row_factory = sqlite3.Row
+        migrate(conn)
+        return conn
+
+    def questions(self, conn=None):
+        return [tuple(row) for row in (conn or self.conn).execute(
+            f"SELECT {', '.join(FIELDS)} FROM questions ORDER BY id;"
+        )]
+
+    def version(self):
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'questions_version';").fetchone()[0]
+
+    def assertSchemaIntact(self):
+        names = {row[0] for row in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE tbl_name = 'questions';"
+        )}
+        self.assertLessEqual(VERSION_TRIGGERS | {"idx_test_questions_text", "idx_questions_text_hash"}, names)
+
+    def test_csv_and_jsonl_round_trip(self):
+        import_questions(self.conn, QUESTIONS)
+        for fmt in ("csv", "jsonl"):
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.workdir, f"domande.{fmt}")
+                with open(path, "w", newline="", encoding="utf-8") as out:
+                    self.assertEqual(export_questions(self.conn, out, fmt), 3)
+                other = self.open(f"copia-{fmt}.db")
+                try:
+                    stats = import_questions(other, read_rows(path))
+                    self.assertEqual((stats["read"], stats["inserted"], stats["invalid"]), (3, 3, 0))
+                    self.assertEqual(self.questions(other), self.questions())
+                finally:
+                    other.close()
+
+    def test_invalid_rows_are_rejected(self):
+        rows = [
+            None,
+            "non un oggetto",
+            {"text": "", "options": ["a", "b", "c", "d"], "correct_option": 1},
+            {"text": "Tre opzioni?", "options": ["a", "b", "c"], "correct_option": 1},
+            {"text": "Opzione vuota?", "options": ["a", " ", "c", "d"], "correct_option": 1},
+            {"text": 42, "options": ["a", "b", "c", "d"], "correct_option": 1},
+            {"text": "Opzione numerica?", "options": ["a", 2, "c", "d"], "correct_option": 1},
+            {"text": "Fuori intervallo?", "options": ["a", "b", "c", "d"], "correct_option": 5},
+            {"text": "Booleano?", "options": ["a", "b", "c", "d"], "correct_option": True},
+            {"text": "Non un numero?", "options": ["a", "b", "c", "d"], "correct_option": "due"},
+        ]
+        for raw in rows:
+            with self.subTest(raw=raw):
+                self.assertIsNone(validate(raw))
+        # dal CSV arrivano stringhe, con le opzioni in colonne separate
+        csv_row = {"text": " Dal CSV? ", "option1": "a", "option2": "b", "option3": "c", "option4": "d",
+                   "correct_option": "2"}
+        self.assertEqual(validate(csv_row)[:6], ("Dal CSV?", "a", "b", "c", "d", 2))
+
+        stats = import_questions(self.conn, rows + [csv_row])
+        self.assertEqual((stats["read"], stats["inserted"], stats["invalid"]), (11, 1, 10))
+
+    def test_duplicates_by_normalized_text(self):
+        import_questions(self.conn, QUESTIONS)
+        stats = import_questions(self.conn, [
+            dict(QUESTIONS[0], text="  capitale   D'ITALIA?  "),
+            dict(QUESTIONS[1], correct_option=4),
+            question(1),
+            question(1),
+        ])
+        self.assertEqual((stats["inserted"], stats["duplicates"]), (1, 3))
+        self.assertEqual(len(self.questions()), 4)
+
+    def test_import_bumps_the_version_and_keeps_the_schema(self):
+        before = self.version()
+        stats = import_questions(self.conn, (question(i) for i in range(50)), chunk_size=7)
+        self.assertEqual(stats["inserted"], 50)
+        self.assertGreater(self.version(), before)
+        self.assertSchemaIntact()
+
+    def test_version_triggers_stay_during_the_import(self):
+        # un import interrotto a metà (processo ucciso) non deve lasciare il database senza trigger
+        seen = []
+
+        def rows():
+            for i in range(20):
+                if i == 10:
+                    seen.extend(row[0] for row in self.conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'questions';"
+                    ))
+                yield question(i)
+
+        import_questions(self.conn, rows(), chunk_size=4)
+        self.assertEqual(set(seen), VERSION_TRIGGERS)
+
+    def test_failed_chunk_is_rolled_back(self):
+        def rows():
+            for i in range(10):
+                yield question(i)
+            raise RuntimeError("file troncato")
+
+        before = self.version()
+        # blocchi da 2, commit ogni 4 righe: le righe 0-7 sono salvate, 8-9 no
+        with self.assertRaises(RuntimeError):
+            import_questions(self.conn, rows(), chunk_size=2, commit_every=4)
+        self.assertEqual([q[0] for q in self.questions()], [f"Domanda {i}?" for i in range(8)])
+        self.assertGreater(self.version(), before)
+        self.assertSchemaIntact()
+
+        # i trigger ci sono ancora: una modifica successiva fa avanzare la versione
+        before = self.version()
+        self.conn.execute("UPDATE questions SET correct_option = 1 WHERE id = 1;")
+        self.conn.commit()
+        self.assertGreater(self.version(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
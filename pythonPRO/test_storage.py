@@ -0,0 +1,142 @@
+"""
+Contratto dei repository di storage: lo stesso scenario sul backend SQLite e su quello
+partizionato, con uno e con più shard.
+
+Dalla cartella pythonPRO/:
+    python -m unittest test_storage
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from answers import Answer
+from storage import DuplicateUser, open_sharded, open_sqlite
+
+BACKENDS = {
+    "sqlite": lambda workdir: open_sqlite(os.path.join(workdir, "single.db")),
+    "sharded x1": lambda workdir: open_sharded([os.path.join(workdir, "shard0.db")]),
+    "sharded x4": lambda workdir: open_sharded([os.path.join(workdir, f"shard{i}.db") for i in range(4)]),
+}
+
+
+class StorageContractTest(unittest.TestCase):
+    def backends(self):
+        """Un backend vuoto alla volta, ciascuno in un subTest."""
+        for name, opener in BACKENDS.items():
+            with self.subTest(backend=name):
+                workdir = tempfile.mkdtemp(prefix="quiz-test-")
+                storage = opener(workdir)
+                try:
+                    yield storage
+                finally:
+                    storage.close()
+                    shutil.rmtree(workdir)
+
+    def create_users(self, users, n=6):
+        return [users.create(f"utente{i}", f"hash{i}", f"nick{i}") for i in range(n)]
+
+    def test_users(self):
+        for storage in self.backends():
+            users = storage.users
+            ids = self.create_users(users)
+            self.assertEqual(len(set(ids)), 6)
+            self.assertTrue(all(ids))
+
+            row = users.by_login("utente3")
+            self.assertEqual((row["id"], row["password_hash"]), (ids[3], "hash3"))
+            self.assertIsNone(users.by_login("nessuno"))
+            self.assertEqual(users.by_id(ids[2]), {"id": ids[2], "nickname": "nick2", "total_score": 0})
+            self.assertIsNone(users.by_id(max(ids) + 1000))
+            self.assertTrue(users.nickname_taken("nick5"))
+            self.assertFalse(users.nickname_taken("nick9"))
+
+            users.set_password_hash(ids[0], "nuovo")
+            self.assertEqual(users.by_login("utente0")["password_hash"], "nuovo")
+
+    def test_duplicates(self):
+        for storage in self.backends():
+            users = storage.users
+            self.create_users(users, 2)
+            for login, nickname, field in (("utente1", "altro", "login"), ("altro", "nick1", "nickname")):
+                with self.assertRaises(DuplicateUser) as raised:
+                    users.create(login, "x", nickname)
+                self.assertEqual(raised.exception.field, field)
+            # il nickname riservato viene liberato se la registrazione fallisce
+            self.assertFalse(users.nickname_taken("altro"))
+
+    def test_concurrent_registrations_with_the_same_nickname(self):
+        # login diversi (quindi su shard diversi): ne deve passare una sola
+        for storage in self.backends():
+            created, duplicates = [], []
+            barrier = threading.Barrier(8)
+
+            def register(i):
+                barrier.wait()
+                try:
+                    created.append(storage.users.create(f"concorrente{i}", "x", "conteso"))
+                except DuplicateUser as exc:
+                    duplicates.append(exc.field)
+
+            threads = [threading.Thread(target=register, args=(i,)) for i in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(created), 1)
+            self.assertEqual(duplicates, ["nickname"] * 7)
+
+    def test_questions(self):
+        for storage in self.backends():
+            questions = storage.questions
+            result = questions.add_many([
+                {"text": "Uno?", "options": ["a", "b", "c", "d"], "correct_option": 1},
+                {"text": "Due?", "options": ["a", "b", "c", "d"], "correct_option": 2},
+                {"text": " uno? ", "options": ["a", "b", "c", "d"], "correct_option": 3},
+                {"text": "", "options": ["a", "b", "c", "d"], "correct_option": 1},
+            ])
+            self.assertEqual((result["inserted"], result["duplicates"], result["invalid"]), (2, 1, 1))
+            self.assertEqual(questions.count(), 2)
+            question = questions.get(1)
+            self.assertEqual((question.text, question.correct_option), ("Uno?", 1))
+            self.assertIsNone(questions.get(999))
+
+    def test_scores_and_ranking(self):
+        for storage in self.backends():
+            scores = storage.scores
+            ids = self.create_users(storage.users)
+            a, b, c = ids[:3]
+
+            version = scores.version()
+            totals = scores.record([Answer(a, 1, 1, True), Answer(b, 1, 2, False), Answer(c, 2, 2, True)])
+            self.assertEqual(totals, {a: 1, c: 1})
+            self.assertEqual(scores.record([Answer(a, 2, 2, True)]), {a: 2})
+            self.assertEqual(scores.stats(a), (2, 2))
+            self.assertEqual(scores.stats(b), (1, 0))
+            self.assertEqual(scores.stats(ids[5]), (0, 0))
+            self.assertGreater(scores.version(), version)
+            self.assertEqual(
+                sorted((r["question_id"], r["attempts"], r["correct"]) for r in scores.question_stats(10)),
+                [(1, 2, 1), (2, 2, 2)],
+            )
+            self.assertEqual(len(scores.question_stats(1)), 1)
+
+            expected = [a, c] + sorted(set(ids) - {a, c})
+            top = scores.top(10)
+            self.assertEqual([r["id"] for r in top], expected)
+            self.assertEqual((top[0]["nickname"], top[0]["total_score"]), ("nick0", 2))
+            after = (top[1]["total_score"], top[1]["id"])
+            self.assertEqual([r["id"] for r in scores.top(2, after=after)], expected[2:4])
+            self.assertEqual([scores.rank(uid) for uid in expected], list(range(1, len(expected) + 1)))
+            self.assertIsNone(scores.rank(max(ids) + 1000))
+            self.assertEqual(
+                [tuple(key) for key in scores.rank_keys()], [(r["total_score"], r["id"]) for r in top]
+            )
+            # utenti fino al cursore compreso
+            self.assertEqual(scores.count_ahead(after[0], after[1] + 1), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Test di current_user(): l'utente loggato viene letto da SQLite al massimo una volta
+per richiesta, anche senza la cache tra richieste.
+
+Dalla cartella pythonPRO/:
+    python -m unittest test_users
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+# database di prova, da scegliere prima di importare l'app (che lo crea all'import)
+os.environ["QUIZ_DATABASE"] = os.path.join(tempfile.mkdtemp(prefix="quiz-test-"), "test.db")
+
+import app as quiz_app  # noqa: E402
+from metrics import TimedConnection  # noqa: E402
+
+USER_LOOKUP = "SELECT id, nickname, total_score FROM users WHERE id ="
+
+# statement eseguiti dal thread del test (il test client serve le richieste qui);
+# quelli dei refresh in background della classifica non contano
+_statements = []
+_test_thread = threading.get_ident()
+
+
+def _trace(sql):
+    if threading.get_ident() == _test_thread:
+        _statements.append(sql)
+
+
+class TracedConnection(TimedConnection):
+    """Connessione del pool che registra ogni statement con set_trace_callback."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_trace)
+
+
+class CurrentUserQueriesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        app = quiz_app.app
+        app.config.update(
+            RATE_LIMIT_ENABLED=False, USER_CACHE=False, DB_CONNECTION_FACTORY=TracedConnection
+        )
+        # il pool creato all'import usa l'altra factory
+        pool = app.extensions.pop("db_pool", None)
+        if pool is not None:
+            pool.close_all()
+
+        cls.client = app.test_client()
+        resp = cls.client.post(
+            "/register",
+            data={"login": "tester", "password": "password-di-prova", "confirm_password": "password-di-prova",
+                  "nickname": "tester"},
+        )
+        assert resp.status_code < 400, resp.status_code
+        cls.client.post("/login", data={"login": "tester", "password": "password-di-prova"})
+
+    def user_lookups(self, method, path, **kwargs):
+        del _statements[:]
+        resp = self.client.open(path, method=method, **kwargs)
+        self.assertLess(resp.status_code, 400, f"{method} {path}")
+        return sum(USER_LOOKUP in sql for sql in _statements)
+
+    def test_pages_read_the_user_once(self):
+        for path in ("/", "/quiz", "/stats", "/leaderboard"):
+            with self.subTest(path=path):
+                self.assertEqual(self.user_lookups("GET", path), 1)
+
+    def test_answer_reads_the_user_once(self):
+        # il nuovo punteggio arriva dall'UPDATE ... RETURNING, non da una seconda lettura
+        for option in range(1, 5):
+            with self.subTest(option=option):
+                lookups = self.user_lookups("POST", "/quiz", data={"question_id": "1", "option": str(option)})
+                self.assertEqual(lookups, 1)
+
+    def test_api_reads_the_user_at_most_once(self):
+        self.assertLessEqual(self.user_lookups("GET", "/api/quiz/next"), 1)
+        # l'API accetta solo la domanda servita per ultima
+        for option in (1, 2):
+            with self.client.session_transaction() as sess:
+                body = {"question_id": sess["quiz_question_id"], "option": option}
+            with self.subTest(body=body):
+                self.assertLessEqual(self.user_lookups("POST", "/api/quiz/answer", json=body), 1)
+        self.assertLessEqual(self.user_lookups("GET", "/api/leaderboard?limit=5"), 1)
+
+    def test_anonymous_requests_do_not_read_users(self):
+        anonymous = quiz_app.app.test_client()
+        for path in ("/", "/login", "/leaderboard"):
+            with self.subTest(path=path):
+                del _statements[:]
+                anonymous.get(path)
+                self.assertFalse([sql for sql in _statements if USER_LOOKUP in sql])
+
+
+if __name__ == "__main__":
+    unittest.main()
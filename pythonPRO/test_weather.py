@@ -0,0 +1,179 @@
+"""
+Test di WeatherClient e CircuitBreaker contro il server meteo finto di bench.py.
+
+Dalla cartella pythonPRO/:
+    python -m unittest test_weather
+"""
+
+import threading
+import time
+import unittest
+
+from bench import FakeWeatherHandler, start_fake_weather
+from weather import CITY_NOT_FOUND, WEATHER_UNAVAILABLE, CircuitBreaker, WeatherClient
+
+
+class StubServerTest(unittest.TestCase):
+    """Un server finto per test, con latenza e stato HTTP scelti dal test."""
+
+    delay = 0.0
+    status = 200
+
+    def setUp(self):
+        self.handler = type(
+            "Handler", (FakeWeatherHandler,), {"delay": self.delay, "status": self.status, "calls": 0}
+        )
+        self.server, self.url = start_fake_weather(self.handler)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs):
+        kwargs.setdefault("retries", 0)
+        kwargs.setdefault("backoff", 0)
+        kwargs.setdefault("timeout", 2)
+        return WeatherClient("chiave", url=self.url, **kwargs)
+
+
+class ForecastTest(StubServerTest):
+    def test_forecast_is_aggregated_by_day(self):
+        forecast, error = self.client().forecast("Roma")
+        self.assertIsNone(error)
+        self.assertEqual(len(forecast), 3)
+        self.assertEqual(set(forecast[0]), {"date", "weekday", "temp_min", "temp_max", "description"})
+
+    def test_city_not_found_is_not_a_failure(self):
+        self.handler.status = 404
+        client = self.client(breaker=CircuitBreaker(failure_threshold=1))
+        self.assertEqual(client.forecast("Nessuna"), (None, CITY_NOT_FOUND))
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual(client.failures, 0)
+
+
+class TimeoutTest(StubServerTest):
+    delay = 0.5
+
+    def test_timeout_returns_an_error(self):
+        client = self.client(timeout=0.1)
+        start = time.monotonic()
+        forecast, error = client.forecast("Roma")
+        self.assertIsNone(forecast)
+        self.assertIsNotNone(error)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(client.failures, 1)
+
+    def test_timeout_is_retried(self):
+        client = self.client(timeout=0.1, retries=1)
+        client.forecast("Roma")
+        self.assertEqual(self.handler.calls, 2)
+
+
+class RetryTest(StubServerTest):
+    status = 503
+
+    def test_server_errors_are_retried(self):
+        client = self.client(retries=2)
+        forecast, error = client.forecast("Roma")
+        self.assertIsNone(forecast)
+        self.assertIsNotNone(error)
+        self.assertEqual(self.handler.calls, 3)
+        # i tentativi interni contano come un solo errore per il breaker
+        self.assertEqual(client.breaker.failures, 1)
+
+    def test_recovers_after_retry(self):
+        do_get = self.handler.do_GET
+
+        def flaky(handler):
+            # il primo tentativo fallisce, il secondo no
+            type(handler).status = 503 if type(handler).calls == 0 else 200
+            do_get(handler)
+
+        self.handler.do_GET = flaky
+        forecast, error = self.client(retries=1).forecast("Roma")
+        self.assertIsNone(error)
+        self.assertEqual(len(forecast), 3)
+        self.assertEqual(self.handler.calls, 2)
+
+
+class CircuitBreakerTest(StubServerTest):
+    status = 500
+
+    def test_opens_after_threshold_and_rejects_without_calling(self):
+        client = self.client(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        client.forecast("Roma")
+        client.forecast("Roma")
+        self.assertEqual(client.breaker.state, "open")
+        self.assertEqual(client.forecast("Roma"), (None, WEATHER_UNAVAILABLE))
+        self.assertEqual(self.handler.calls, 2)
+        self.assertEqual(client.rejected, 1)
+
+    def test_half_open_lets_one_probe_through(self):
+        client = self.client(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.2))
+        client.forecast("Roma")
+        self.assertFalse(client.breaker.allow())
+        time.sleep(0.25)
+        # dopo reset_timeout passa una sola richiesta di prova
+        self.assertTrue(client.breaker.allow())
+        self.assertFalse(client.breaker.allow())
+
+    def test_successful_probe_closes_the_breaker(self):
+        client = self.client(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.2))
+        client.forecast("Roma")
+        self.assertEqual(client.breaker.state, "open")
+        time.sleep(0.25)
+        self.handler.status = 200
+        forecast, error = client.forecast("Roma")
+        self.assertIsNone(error)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_failed_probe_opens_it_again(self):
+        client = self.client(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.2))
+        client.forecast("Roma")
+        time.sleep(0.25)
+        client.forecast("Roma")
+        self.assertEqual(self.handler.calls, 2)
+        self.assertEqual(client.forecast("Roma"), (None, WEATHER_UNAVAILABLE))
+        self.assertEqual(self.handler.calls, 2)
+
+
+class CoalescingTest(StubServerTest):
+    delay = 0.3
+
+    def test_concurrent_requests_share_one_call(self):
+        client = self.client()
+        results = []
+        barrier = threading.Barrier(5)
+
+        def ask(name):
+            barrier.wait()
+            results.append(client.forecast(name))
+
+        threads = [
+            threading.Thread(target=ask, args=(name,))
+            for name in ("Roma", "roma", " ROMA ", "Roma", "rOMA")
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.handler.calls, 1)
+        self.assertEqual(client.coalesced, 4)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertIsNone(results[0][1])
+
+    def test_different_cities_are_not_coalesced(self):
+        client = self.client()
+        threads = [threading.Thread(target=client.forecast, args=(name,)) for name in ("Roma", "Milano")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.handler.calls, 2)
+        self.assertEqual(client.coalesced, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, session
+
+_MISSING = object()
+
+
+class UserCache:
+    """
+    Cache tra richieste dei soli campi usati dai template (nickname, punteggio).
+    Limitata (LRU) e con TTL, così anche i punteggi aggiornati da altri processi
+    vengono riletti dopo al massimo `ttl` secondi.
+    """
+
+    def __init__(self, max_size=10000, ttl=30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is not None and time.monotonic() - item[1] < self.ttl:
+                self._items.move_to_end(user_id)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+            return None
+
+    def put(self, user):
+        with self._lock:
+            self._items[user["id"]] = (user, time.monotonic())
+            self._items.move_to_end(user["id"])
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def set_score(self, user_id, total_score):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is not None:
+                user = dict(item[0], total_score=total_score)
+                self._items[user_id] = (user, item[1])
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def init_app(app):
+    app.config.setdefault("USER_CACHE", True)
+    app.config.setdefault("USER_CACHE_SIZE", 10000)
+    app.config.setdefault("USER_CACHE_TTL", 30.0)
+
+
+def get_user_cache():
+    if not current_app.config["USER_CACHE"]:
+        return None
+    cache = current_app.extensions.get("user_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "user_cache",
+            UserCache(current_app.config["USER_CACHE_SIZE"], current_app.config["USER_CACHE_TTL"]),
+        )
+    return cache
+
+
+def _load_user(user_id):
+    cache = get_user_cache()
+    if cache is not None:
+        user = cache.get(user_id)
+        if user is not None:
+            return user
+
+    # import qui: storage importa answers, che importa questo modulo
+    from storage import get_storage
+
+    user = get_storage().users.by_id(user_id)
+    if user is None:
+        return None
+    if cache is not None:
+        cache.put(user)
+    return user
+
+
+def current_user():
+    """
+    Utente loggato come dict {id, nickname, total_score} (oppure None).
+    Letto al massimo una volta per richiesta: il risultato resta su flask.g.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return None
+    memo = g.get("user_memo", _MISSING)
+    if memo is not _MISSING and memo[0] == user_id:
+        return memo[1]
+    user = _load_user(user_id)
+    g.user_memo = (user_id, user)
+    return user
+
+
+def set_score(user_id, total_score):
+    """Write-through del nuovo punteggio nella richiesta corrente e nella cache."""
+    memo = g.get("user_memo", _MISSING)
+    if memo is not _MISSING and memo[0] == user_id and memo[1] is not None:
+        g.user_memo = (user_id, dict(memo[1], total_score=total_score))
+    cache = get_user_cache()
+    if cache is not None:
+        cache.set_score(user_id, total_score)
+
+
+def user_cache_stats():
+    cache = get_user_cache()
+    return cache.stats() if cache is not None else {}
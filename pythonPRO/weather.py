@@ -0,0 +1,543 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from forecast import aggregate_forecast
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/forecast"
+CITY_NOT_FOUND = "Città non trovata."
+WEATHER_UNAVAILABLE = "Servizio meteo temporaneamente non disponibile."
+WEATHER_TIMEOUT = "Tempo scaduto per la richiesta meteo."
+
+
+def normalize_city(city_name):
+    """'  new   York ' -> 'new york': stessa chiave di cache per la stessa città."""
+    return " ".join(city_name.split()).casefold()
+
+
+class CircuitBreaker:
+    """
+    Dopo `failure_threshold` errori consecutivi smette di chiamare il servizio
+    per `reset_timeout` secondi, poi lascia passare una richiesta di prova.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half-open: una sola richiesta di prova, le altre aspettano un altro giro
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        return "closed" if self.opened_at is None else "open"
+
+
+class _Call:
+    """Richiesta in corso verso OpenWeatherMap, condivisa tra richieste uguali."""
+
+    __slots__ = ("event", "value")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = (None, "Si è verificato un errore durante la richiesta meteo.")
+
+
+class WeatherClient:
+    """
+    Client OpenWeatherMap:
+    - requests.Session condivisa (keep-alive) con pool di connessioni dimensionato
+    - retry con backoff su 5xx/429
+    - circuit breaker che risponde subito quando il servizio è giù
+    - coalescing: N richieste contemporanee per la stessa città fanno una sola chiamata
+    """
+
+    def __init__(self, api_key, url=OPENWEATHER_URL, timeout=5, pool_size=10,
+                 retries=2, backoff=0.3, breaker=None, latency_window=1000, days=3):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.days = days
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def forecast(self, city_name):
+        """Ritorna (previsioni, errore) per la città."""
+        key = normalize_city(city_name)
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            return call.value
+
+        try:
+            call.value = self._fetch(city_name)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.event.set()
+        return call.value
+
+    def _fetch(self, city_name):
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            return None, WEATHER_UNAVAILABLE
+
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(
+                self.url,
+                params={"q": city_name, "units": "metric", "lang": "it", "appid": self.api_key},
+                timeout=self.timeout,
+            )
+        except requests.RequestException:
+            self._failed()
+            return None, "Si è verificato un errore durante la richiesta meteo."
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.requests += 1
+                self._latencies.append(elapsed)
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            self._failed()
+            return None, "Errore nel recupero dei dati meteo."
+        self.breaker.record_success()
+
+        if resp.status_code == 404:
+            return None, CITY_NOT_FOUND
+        if resp.status_code != 200:
+            return None, "Errore nel recupero dei dati meteo."
+
+        try:
+            data = resp.json()
+            if "list" not in data:
+                return None, "Formato della risposta meteo non valido."
+            return aggregate_forecast(data, self.days), None
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None, "Formato della risposta meteo non valido."
+
+    def _failed(self):
+        self.breaker.record_failure()
+        with self._lock:
+            self.failures += 1
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "failures": self.failures,
+                "in_flight": len(self._inflight),
+                "breaker": self.breaker.state,
+            }
+        for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"latency_{name}"] = (
+                round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 6) if latencies else 0.0
+            )
+        return stats
+
+
+class _Entry:
+    __slots__ = ("result", "error", "stored_at", "expires_at")
+
+    def __init__(self, result, error, stored_at, expires_at):
+        self.result = result
+        self.error = error
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+
+
+class ForecastCache:
+    """
+    Cache delle previsioni già aggregate, per città normalizzata.
+    - TTL configurabile e limite LRU sul numero di città
+    - stale-while-revalidate: una voce scaduta da poco viene servita subito
+      e aggiornata in background
+    - caching negativo delle città inesistenti, e per pochi secondi degli altri
+      errori (chi interroga di continuo non rilancia la chiamata a ogni richiesta)
+    - caricamenti in background su `executor` (un thread per volta se manca)
+    - opzionale: copia su file SQLite per sopravvivere ai riavvii
+    """
+
+    def __init__(self, loader, ttl=600, stale_ttl=1800, negative_ttl=300, error_ttl=5,
+                 max_size=1024, path=None, executor=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.max_size = max_size
+        self.executor = executor
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                """
+                CREATE TABLE IF NOT EXISTS forecast_cache (
+                    key TEXT PRIMARY KEY,
+                    result TEXT,
+                    error TEXT,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                """
+            )
+            self._disk.commit()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_time = 0.0
+        self.load_time_max = 0.0
+
+    def get(self, city_name):
+        """Ritorna (previsioni, errore) come il loader, dalla cache quando possibile."""
+        key = normalize_city(city_name)
+        cached = self._cached(key, city_name)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        return self._load(key, city_name)
+
+    def peek(self, city_name):
+        """Come get(), ma senza mai chiamare il servizio: None se la città non è in cache."""
+        return self._cached(normalize_city(city_name), city_name)
+
+    def get_nowait(self, city_name):
+        """
+        Come peek(), ma se la città non è in cache ne avvia il caricamento in background:
+        None finché il risultato (o l'errore) non arriva.
+        """
+        key = normalize_city(city_name)
+        cached = self._cached(key, city_name)
+        if cached is None and self._refresh_in_background(key, city_name):
+            with self._lock:
+                self.misses += 1
+        return cached
+
+    def _cached(self, key, city_name):
+        now = time.time()
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+
+        if now < entry.expires_at:
+            with self._lock:
+                if entry.result is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+            return entry.result, entry.error
+        if entry.result is not None and now < entry.expires_at + self.stale_ttl:
+            with self._lock:
+                self.stale_hits += 1
+            self._refresh_in_background(key, city_name)
+            return entry.result, entry.error
+        return None
+
+    def get_many(self, cities, executor, deadline=10.0):
+        """
+        Generatore di (città, previsioni, errore) per molte città, nell'ordine in cui arrivano.
+        Le città duplicate vengono chieste una volta sola, quelle in cache escono subito,
+        le altre vengono caricate in parallelo su `executor`. Dopo `deadline` secondi
+        le città ancora in attesa escono con un errore di timeout.
+        """
+        start = time.monotonic()
+        unique = {}
+        for city_name in cities:
+            key = normalize_city(city_name)
+            if key and key not in unique:
+                unique[key] = city_name
+
+        pending = {}
+        for key, city_name in unique.items():
+            cached = self._cached(key, city_name)
+            if cached is not None:
+                yield (city_name,) + cached
+                continue
+            with self._lock:
+                self.misses += 1
+            pending[executor.submit(self._load, key, city_name)] = city_name
+
+        done = set()
+        try:
+            for future in as_completed(pending, timeout=max(0.0, deadline - (time.monotonic() - start))):
+                done.add(future)
+                try:
+                    result, error = future.result()
+                except Exception:
+                    result, error = None, "Si è verificato un errore durante la richiesta meteo."
+                yield pending[future], result, error
+        except FutureTimeout:
+            for future, city_name in pending.items():
+                if future not in done:
+                    future.cancel()
+                    yield city_name, None, WEATHER_TIMEOUT
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if self._disk is None:
+            return None
+
+        with self._lock:
+            row = self._disk.execute(
+                "SELECT result, error, stored_at, expires_at FROM forecast_cache WHERE key = ?;",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[0]) if row[0] is not None else None
+        entry = _Entry(result, row[1], row[2], row[3])
+        with self._lock:
+            self.disk_hits += 1
+            self._store_memory(key, entry)
+        return entry
+
+    def _load(self, key, city_name):
+        start = time.perf_counter()
+        result, error = self.loader(city_name)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.loads += 1
+            self.load_time += elapsed
+            self.load_time_max = max(self.load_time_max, elapsed)
+            if error is not None:
+                self.load_errors += 1
+
+        now = time.time()
+        if result is not None:
+            self._store(key, _Entry(result, None, now, now + self.ttl))
+        elif error == CITY_NOT_FOUND:
+            self._store(key, _Entry(None, error, now, now + self.negative_ttl))
+        elif self.error_ttl:
+            with self._lock:
+                previous = self._entries.get(key)
+            # una voce scaduta ma ancora servibile vale più dell'errore
+            if previous is None or previous.result is None:
+                self._store(key, _Entry(None, error, now, now + self.error_ttl))
+        return result, error
+
+    def _refresh_in_background(self, key, city_name):
+        """Avvia _load senza aspettarlo; False se per la città ce n'è già uno in corso."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._load(key, city_name)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        if self.executor is not None:
+            self.executor.submit(run)
+        else:
+            threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def _store_memory(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._store_memory(key, entry)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO forecast_cache (key, result, error, stored_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?);",
+                    (
+                        key,
+                        json.dumps(entry.result) if entry.result is not None else None,
+                        entry.error,
+                        entry.stored_at,
+                        entry.expires_at,
+                    ),
+                )
+                self._disk.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "negative_hits": self.negative_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "load_time_avg": round(self.load_time / self.loads, 6) if self.loads else 0.0,
+                "load_time_max": round(self.load_time_max, 6),
+            }
+
+
+def init_app(app):
+    app.config.setdefault("OPENWEATHER_URL", OPENWEATHER_URL)
+    app.config.setdefault("WEATHER_DAYS", 3)
+    app.config.setdefault("WEATHER_TIMEOUT", 5)
+    app.config.setdefault("WEATHER_POOL_SIZE", 10)
+    app.config.setdefault("WEATHER_RETRIES", 2)
+    app.config.setdefault("WEATHER_BACKOFF", 0.3)
+    app.config.setdefault("WEATHER_BREAKER_THRESHOLD", 5)
+    app.config.setdefault("WEATHER_BREAKER_RESET", 30.0)
+    app.config.setdefault("WEATHER_CACHE_TTL", 600)
+    app.config.setdefault("WEATHER_CACHE_STALE_TTL", 1800)
+    app.config.setdefault("WEATHER_CACHE_NEGATIVE_TTL", 300)
+    app.config.setdefault("WEATHER_CACHE_ERROR_TTL", 5)
+    app.config.setdefault("WEATHER_CACHE_SIZE", 1024)
+    app.config.setdefault("WEATHER_CACHE_PATH", None)
+    app.config.setdefault("WEATHER_BATCH_WORKERS", 16)
+    app.config.setdefault("WEATHER_BATCH_DEADLINE", 10.0)
+    app.config.setdefault("WEATHER_BATCH_MAX_CITIES", 500)
+
+
+def get_weather_client(api_key):
+    client = current_app.extensions.get("weather_client")
+    if client is None:
+        config = current_app.config
+        client = current_app.extensions.setdefault(
+            "weather_client",
+            WeatherClient(
+                api_key,
+                url=config["OPENWEATHER_URL"],
+                timeout=config["WEATHER_TIMEOUT"],
+                pool_size=config["WEATHER_POOL_SIZE"],
+                retries=config["WEATHER_RETRIES"],
+                backoff=config["WEATHER_BACKOFF"],
+                breaker=CircuitBreaker(
+                    config["WEATHER_BREAKER_THRESHOLD"], config["WEATHER_BREAKER_RESET"]
+                ),
+                days=config["WEATHER_DAYS"],
+            ),
+        )
+    return client
+
+
+def get_forecast_cache(api_key):
+    cache = current_app.extensions.get("forecast_cache")
+    if cache is None:
+        config = current_app.config
+        cache = current_app.extensions.setdefault(
+            "forecast_cache",
+            ForecastCache(
+                get_weather_client(api_key).forecast,
+                ttl=config["WEATHER_CACHE_TTL"],
+                stale_ttl=config["WEATHER_CACHE_STALE_TTL"],
+                negative_ttl=config["WEATHER_CACHE_NEGATIVE_TTL"],
+                error_ttl=config["WEATHER_CACHE_ERROR_TTL"],
+                max_size=config["WEATHER_CACHE_SIZE"],
+                path=config["WEATHER_CACHE_PATH"],
+                executor=get_batch_executor(),
+            ),
+        )
+    return cache
+
+
+def get_batch_executor():
+    """
+    Pool di thread condiviso: limita le chiamate contemporanee verso OpenWeatherMap
+    dei batch e dei caricamenti in background della cache.
+    """
+    executor = current_app.extensions.get("weather_executor")
+    if executor is None:
+        executor = current_app.extensions.setdefault(
+            "weather_executor",
+            ThreadPoolExecutor(
+                max_workers=current_app.config["WEATHER_BATCH_WORKERS"],
+                thread_name_prefix="weather",
+            ),
+        )
+    return executor
+
+
+def forecast_cache_stats():
+    cache = current_app.extensions.get("forecast_cache")
+    return cache.stats() if cache is not None else {}
+
+
+def weather_client_stats():
+    client = current_app.extensions.get("weather_client")
+    return client.stats() if client is not None else {}